@@ -4,6 +4,7 @@ from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
 from flask_socketio import SocketIO  # 新增
 from config import config
+import logging
 import os
 
 # 初始化扩展
@@ -27,23 +28,64 @@ def create_app(config_name='default'):
         static_folder=os.path.join(base_dir, 'static')
     )
     app.config.from_object(config[config_name])
+    # app.* 模块的日志（logging.getLogger(__name__)）经 app.logger 输出；非调试模式默认 INFO 级别
+    if not app.logger.level:
+        app.logger.setLevel(logging.INFO)
 
     # 必须设置 SECRET_KEY
     if not app.config.get('SECRET_KEY'):
         app.config['SECRET_KEY'] = 'dev-secret-key-123456'
 
+    # 请求延迟/状态码指标（/metrics）：最先注册，请求钩子最早执行、覆盖被其他钩子拦截的请求
+    from app.utils.metrics import metrics
+    metrics.init_app(app, socketio)
+
     # 初始化扩展
     csrf.init_app(app)
     db.init_app(app)
     login_manager.init_app(app)
-    # 初始化SocketIO（关键：启用eventlet异步+跨域）
-    socketio.init_app(app, cors_allowed_origins="*", async_mode="eventlet")
+    # 初始化SocketIO（关键：启用eventlet异步+跨域；配置消息队列后多进程共享房间广播）
+    from app.utils.socket_queue import socketio_queue_options
+    socketio.init_app(app, cors_allowed_origins="*", async_mode="eventlet",
+                      **socketio_queue_options(app.config))
+
+    # 聊天消息写后缓冲（批量持久化）
+    from app.utils.chat_writer import chat_writer
+    chat_writer.init_app(app, socketio)
+    # 聊天热点房间最近消息缓存
+    from app.utils.chat_cache import recent_messages, room_members
+    recent_messages.init_app(app)
+    # 聊天房间成员缓存（Socket 事件鉴权）
+    room_members.init_app(app)
+    # 聊天未读计数（进程内合并后批量写入）
+    from app.utils.chat_unread import chat_unread
+    chat_unread.init_app(app, socketio)
+
+    # 购物圈/代购圈卡片片段缓存（模板中的 cached_fragment）
+    from app.utils.fragment_cache import fragment_cache
+    fragment_cache.init_app(app)
+    # 代购行程 / 购物圈匹配索引（会话事件增量维护）
+    from app.utils.matching import matching_index
+    matching_index.init_app(app)
+    # 请求级 SQL 统计（查询次数/耗时响应头、N+1 检测；未开启时不注册任何钩子）
+    from app.utils.query_stats import query_stats
+    query_stats.init_app(app)
+    # 慢查询日志（附执行计划，未开启时不注册任何事件）
+    from app.utils.slow_query_log import slow_query_log
+    slow_query_log.init_app(app)
 
     # 路径配置
     upload_dir = os.path.join(base_dir, app.config.get('UPLOAD_FOLDER', 'uploads'))
     os.makedirs(upload_dir, exist_ok=True)
     app.config['UPLOAD_FOLDER'] = upload_dir
 
+    # 商品图片：内容寻址存储 + 后台生成缩略图（模板中的 image_url）
+    from app.utils.image_store import image_store
+    image_store.init_app(app)
+    # 商品图片分块上传（断点续传）
+    from app.utils.chunked_upload import chunked_uploads
+    chunked_uploads.init_app(app)
+
     # 打印路径日志
     print(f"=== 应用初始化路径验证 ===")
     print(f"项目根目录：{base_dir}")
@@ -59,12 +101,16 @@ def create_app(config_name='default'):
     from app.routes.shopping import shopping_bp
     from app.routes.binding import binding_bp
     from app.routes.chat import chat_bp  # 新增聊天蓝图
+    from app.routes.ops import ops_bp  # 运行状态（队列深度、写入耗时等）
+    from app.routes.uploads import uploads_bp  # 商品图片分块上传
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(agent_bp, url_prefix='/agent')
     app.register_blueprint(shopping_bp, url_prefix='/shopping')
     app.register_blueprint(binding_bp, url_prefix='/binding')
     app.register_blueprint(chat_bp, url_prefix='/chat')  # 注册聊天蓝图
+    app.register_blueprint(ops_bp, url_prefix='/ops')
+    app.register_blueprint(uploads_bp, url_prefix='/uploads')
 
     # 用户加载器
     from app.models.user import User
@@ -74,14 +120,26 @@ def create_app(config_name='default'):
 
     # 创建数据库表
     with app.app_context():
-        # 先检查 user 表是否存在，不存在再创建所有表
-        from sqlalchemy import inspect
-        inspector = inspect(db.engine)
-        if not inspector.has_table("user"):  # 检查 user 表是否存在
-            db.create_all()
+        # 建缺失的表，并为已有表补建新增索引（如聊天分页用的复合索引）
+        from app.utils.schema import ensure_schema
+        if ensure_schema(db):
             print("数据库表首次创建完成")
         else:
-            print("数据库表已存在，跳过创建")
+            print("数据库表已存在，已检查并补建缺失的表/索引")
+
+    # 命令行工具
+    from app.utils.chat_search import rebuild_chat_search_command
+    from app.utils.chat_archive import archive_chat_command
+    app.cli.add_command(rebuild_chat_search_command)
+    app.cli.add_command(archive_chat_command)
+    from app.utils.demand_feed import rebuild_demand_feed_command
+    app.cli.add_command(rebuild_demand_feed_command)
+    from app.utils.image_store import generate_renditions_command
+    app.cli.add_command(generate_renditions_command)
+    from app.utils.chunked_upload import cleanup_uploads_command
+    app.cli.add_command(cleanup_uploads_command)
+    from app.utils.slow_query_log import slow_queries_command
+    app.cli.add_command(slow_queries_command)
 
     # 首页路由
     @app.route('/')
@@ -1,4 +1,4 @@
 # 导出所有表单，便于路由导入
 from app.forms.auth_forms import RegistrationForm, LoginForm, AgentChoiceForm
 from app.forms.agent_forms import AgentInfoForm, AgentSubmitForm, AgentDeleteForm
-from app.forms.shopping_forms import ShoppingInfoForm, ShoppingSubmitForm, DeleteShoppingItemForm
\ No newline at end of file
+from app.forms.shopping_forms import ShoppingInfoForm, ShoppingSubmitForm, DeleteShoppingItemForm, ShoppingImportForm
\ No newline at end of file
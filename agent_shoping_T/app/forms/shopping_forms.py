@@ -1,18 +1,28 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, FileField, TextAreaField, SubmitField
+from wtforms import StringField, FileField, TextAreaField, SubmitField, HiddenField
+from flask_wtf.file import FileRequired
 from wtforms.validators import DataRequired, Length, Regexp
 
+# 价格格式：整数或最多两位小数（批量导入复用同一规则）
+PRICE_PATTERN = r'^\d+(\.\d{1,2})?$'
+
 class ShoppingInfoForm(FlaskForm):
     serial_number = StringField('序号', validators=[DataRequired(), Length(max=20)])
     product_name = StringField('名称', validators=[DataRequired(), Length(max=100)])
     price = StringField('价格（元）', validators=[
         DataRequired(),
-        Regexp(r'^\d+(\.\d{1,2})?$', message='请输入有效的价格（最多两位小数）')
+        Regexp(PRICE_PATTERN, message='请输入有效的价格（最多两位小数）')
     ])
     product_image = FileField('图片')
+    # 已通过分块上传完成的图片会话（页面脚本填写，与 product_image 二选一）
+    upload_id = HiddenField()
     description = TextAreaField('描述')
     submit = SubmitField('添加商品', name='add_product')
 
+class ShoppingImportForm(FlaskForm):
+    import_file = FileField('导入文件（CSV / JSON）', validators=[FileRequired(message='请选择要导入的文件')])
+    submit = SubmitField('批量导入', name='import_products')
+
 class ShoppingSubmitForm(FlaskForm):
     submit = SubmitField('加入购物圈', name='submit_shopping')
 
@@ -1,7 +1,7 @@
 # 导出所有模型，便于其他模块导入
 from app.models.user import User
 from app.models.agent import AgentInfo, ContactedTrip
-from app.models.shopping import ShoppingInfo, ShoppingCircle
+from app.models.shopping import ShoppingInfo, ShoppingCircle, OpenDemandFeed, StoredImage
 from app.models.binding import Binding
 # 新增
-from app.models.chat import ChatMessage
\ No newline at end of file
+from app.models.chat import ChatMessage, ChatArchive, ChatReadState
\ No newline at end of file
@@ -16,6 +16,12 @@ class AgentInfo(db.Model):
         backref=db.backref('agent_itinerary', uselist=False, lazy='joined')
     )
 
+    # 代购圈/代购列表：已提交行程按 (time, id) 倒序游标分页；地点前缀筛选走 location 索引
+    __table_args__ = (
+        db.Index('ix_agent_info_is_submitted_time_id', 'is_submitted', 'time', 'id'),
+        db.Index('ix_agent_info_location', 'location'),
+    )
+
 class ContactedTrip(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     agent_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
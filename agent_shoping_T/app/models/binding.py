@@ -13,7 +13,12 @@ class Binding(db.Model):
     agent = db.relationship('User', foreign_keys=[agent_id], backref='bindings_as_agent')
 
     # 唯一约束：一个用户不能重复绑定同一个代购
-    __table_args__ = (db.UniqueConstraint('buyer_id', 'agent_id', name='unique_buyer_agent'),)
+    # 复合索引：「我的绑定」按 代购id OR 买家id 过滤、按创建时间倒序，两侧各走一个索引
+    __table_args__ = (
+        db.UniqueConstraint('buyer_id', 'agent_id', name='unique_buyer_agent'),
+        db.Index('ix_binding_agent_id_created_at', 'agent_id', 'created_at'),
+        db.Index('ix_binding_buyer_id_created_at', 'buyer_id', 'created_at'),
+    )
 
     # 别名：模板用create_time访问
     @property
@@ -13,5 +13,43 @@ class ChatMessage(db.Model):
     # 关联发送者
     sender = db.relationship('User', backref='chat_messages')
 
+    # 复合索引：按房间做 id 游标分页（WHERE room_id=? AND id<? ORDER BY id DESC）
+    __table_args__ = (db.Index('ix_chat_message_room_id_id', 'room_id', 'id'),)
+
+    def __repr__(self):
+        return f"<ChatMessage {self.room_id} - {self.sender_name}>"
+
+class ChatArchive(db.Model):
+    """聊天归档块：某房间一段连续的冷消息，压缩后整体存储（JSON + zlib）"""
+    id = db.Column(db.Integer, primary_key=True)
+    room_id = db.Column(db.String(50), nullable=False, comment='聊天房间ID（=绑定ID）')
+    first_message_id = db.Column(db.Integer, nullable=False, comment='块内最小消息ID')
+    last_message_id = db.Column(db.Integer, nullable=False, comment='块内最大消息ID')
+    message_count = db.Column(db.Integer, nullable=False, comment='块内消息条数')
+    raw_bytes = db.Column(db.Integer, nullable=False, comment='压缩前字节数')
+    compressed_bytes = db.Column(db.Integer, nullable=False, comment='压缩后字节数')
+    payload = db.Column(db.LargeBinary, nullable=False, comment='压缩后的消息列表')
+    archived_at = db.Column(db.DateTime, default=datetime.now, comment='归档时间')
+
+    # 按房间 + 消息ID范围定位归档块；单列索引供分配新消息id时取全表最大已用id
+    __table_args__ = (db.Index('ix_chat_archive_room_id_last_message_id', 'room_id', 'last_message_id'),
+                      db.Index('ix_chat_archive_last_message_id', 'last_message_id'))
+
+    def __repr__(self):
+        return f"<ChatArchive {self.room_id} [{self.first_message_id}-{self.last_message_id}]>"
+
+class ChatReadState(db.Model):
+    """聊天已读状态：每个用户在每个房间的未读计数（收到消息时递增，mark_read 时清零）"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, comment='用户ID')
+    room_id = db.Column(db.String(50), nullable=False, comment='聊天房间ID（=绑定ID）')
+    unread_count = db.Column(db.Integer, nullable=False, default=0, comment='未读消息数')
+    last_read_message_id = db.Column(db.Integer, nullable=False, default=0, comment='已读到的最大消息ID')
+    last_message_id = db.Column(db.Integer, nullable=False, default=0, comment='已计入未读的最大消息ID')
+    updated_at = db.Column(db.DateTime, default=datetime.now, comment='最后更新时间')
+
+    # 每个用户每个房间一行；列表页按 (user_id, room_id IN (...)) 一次批量读取
+    __table_args__ = (db.UniqueConstraint('user_id', 'room_id', name='uq_chat_read_state_user_room'),)
+
     def __repr__(self):
-        return f"<ChatMessage {self.room_id} - {self.sender_name}>"
\ No newline at end of file
+        return f"<ChatReadState user={self.user_id} room={self.room_id} unread={self.unread_count}>"
@@ -1,5 +1,6 @@
 from app import db
 from datetime import datetime
+from app.utils.money import to_cents, from_cents
 
 class ShoppingInfo(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -7,11 +8,67 @@ class ShoppingInfo(db.Model):
     product_name = db.Column(db.String(100), nullable=False)
     product_image = db.Column(db.String(100), nullable=True)
     description = db.Column(db.Text, nullable=True)
-    price = db.Column(db.Float, nullable=False)
+    price_cents = db.Column(db.Integer, nullable=False, comment='价格（分）')
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    # 价格（元，Decimal）：读写都换算为整数分，避免浮点误差
+    @property
+    def price(self):
+        return from_cents(self.price_cents)
+
+    @price.setter
+    def price(self, value):
+        self.price_cents = to_cents(value)
+
 class ShoppingCircle(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), unique=True, nullable=False)
-    total_price = db.Column(db.Float, nullable=False)
-    submit_time = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    total_price_cents = db.Column(db.Integer, nullable=False, default=0, comment='商品总价（分）')
+    item_count = db.Column(db.Integer, nullable=False, default=0, comment='商品数')
+    submit_time = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # 购物圈列表按 (submit_time, id) 倒序游标分页
+    __table_args__ = (db.Index('ix_shopping_circle_submit_time_id', 'submit_time', 'id'),)
+
+    # 总价（元，Decimal）
+    @property
+    def total_price(self):
+        return from_cents(self.total_price_cents)
+
+class StoredImage(db.Model):
+    """
+    按内容哈希存储的商品图片：相同内容只落盘一份
+
+    filename 即 ShoppingInfo.product_image 中保存的相对路径（<哈希前2位>/<sha256>.<扩展名>），
+    ref_count 为引用该文件的商品数，降为 0 时删除记录与文件（见 app.utils.image_store）。
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(100), unique=True, nullable=False, comment='相对上传目录的路径')
+    sha256 = db.Column(db.String(64), nullable=False, comment='内容哈希')
+    size_bytes = db.Column(db.Integer, nullable=True, comment='文件大小（字节）')
+    ref_count = db.Column(db.Integer, nullable=False, default=0, comment='引用该图片的商品数')
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+class OpenDemandFeed(db.Model):
+    """
+    购物圈物化表：每个「开放」的买家购物圈一行（非代购用户、已提交购物圈、尚未被任何代购绑定）
+
+    由 app.utils.demand_feed 在购物圈/商品/绑定写操作的同一事务内维护，购物圈页面只需按索引扫描本表。
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    circle_id = db.Column(db.Integer, db.ForeignKey('shopping_circle.id'), unique=True, nullable=False, comment='购物圈ID')
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), unique=True, nullable=False, comment='买家ID')
+    username = db.Column(db.String(20), nullable=False, comment='买家昵称')
+    phone = db.Column(db.String(11), nullable=True, comment='买家电话')
+    submit_time = db.Column(db.DateTime, nullable=False, comment='购物圈提交时间')
+    total_price_cents = db.Column(db.Integer, nullable=False, comment='购物圈总价（分）')
+    product_count = db.Column(db.Integer, nullable=False, default=0, comment='商品数')
+    thumbnail = db.Column(db.String(100), nullable=True, comment='缩略图（第一张商品图片）')
+    products_json = db.Column(db.Text, nullable=False, default='[]', comment='商品快照（JSON）')
+    updated_at = db.Column(db.DateTime, default=datetime.now, comment='最后维护时间')
+
+    # 购物圈页面按 (submit_time, circle_id) 倒序游标分页；价格区间筛选
+    __table_args__ = (
+        db.Index('ix_open_demand_feed_submit_time_circle_id', 'submit_time', 'circle_id'),
+        db.Index('ix_open_demand_feed_total_price_cents', 'total_price_cents'),
+    )
@@ -4,6 +4,12 @@ from app import db
 from app.forms import AgentInfoForm, AgentSubmitForm, AgentDeleteForm
 from app.models import AgentInfo, User, ShoppingCircle, ShoppingInfo, Binding
 from app.forms.binding_forms import UnbindForm
+from app.utils.batch_loader import batch_loader
+from app.utils.chat_cache import invalidate_chat_room
+from app.utils.chat_unread import chat_unread
+from app.utils.feed_queries import agent_feed, parse_feed_args, filter_query_args
+from app.utils.fragment_cache import fragment_cache
+from app.utils.demand_feed import refresh_buyer_feed
 
 agent_bp = Blueprint('agent', __name__)
 
@@ -81,8 +87,14 @@ def agent_info():
             related_bindings = Binding.query.filter_by(agent_id=current_user.id).all()
             for binding in related_bindings:
                 db.session.delete(binding)
+            chat_unread.discard_rooms([binding.id for binding in related_bindings])
+            # 绑定删除后买家可能重新开放，同一事务内更新购物圈物化表
+            refresh_buyer_feed([binding.buyer_id for binding in related_bindings])
             db.session.delete(existing_info)
             db.session.commit()
+            # 绑定已删除，清除对应聊天房间的缓存
+            for binding in related_bindings:
+                invalidate_chat_room(binding.id)
             flash(f'代购行程已删除，解除了 {len(related_bindings)} 个绑定关系', 'success')
         except Exception as e:
             db.session.rollback()
@@ -103,34 +115,55 @@ def agent_info():
 @agent_bp.route('/agent-circle')
 @login_required
 def agent_circle():
-    agent_users = User.query.filter_by(is_agent=True).all()
-    agent_data = []
-    for user in agent_users:
-        agent_info = AgentInfo.query.filter_by(user_id=user.id).first()
-        if agent_info and agent_info.is_submitted and agent_info.itinerary.strip():
-            agent_data.append({
-                "user": user,
-                "agent_info": agent_info
-            })
+    # 已提交行程的代购（按行程时间游标分页，地点/日期筛选下推到SQL）
+    feed_args = parse_feed_args(request.args)
+    agent_data, next_cursor = agent_feed(feed_args, require_itinerary=True)
+    fragment_cache.prefetch('agent_card', [entry['user'].id for entry in agent_data])
     messages = get_flashed_messages(with_categories=True)
-    return render_template('agent_circle.html', agent_data=agent_data, messages=messages)
+    return render_template('agent_circle.html', agent_data=agent_data, messages=messages,
+                           next_cursor=next_cursor, filter_args=filter_query_args(feed_args))
 
 # 代购列表（非代购用户绑定代购）
 @agent_bp.route('/agent_list')
 def agent_list():
-    agent_data = db.session.query(User, AgentInfo).join(
-        AgentInfo,
-        User.id == AgentInfo.user_id
-    ).filter(AgentInfo.is_submitted == True).all()
-
-    agent_data = [
-        {
-            'user': user,
-            'agent_info': info,
-            'agent_name': user.username
-        } for user, info in agent_data
-    ]
-    return render_template('agent_list.html', agent_data=agent_data)
+    feed_args = parse_feed_args(request.args)
+    agent_data, next_cursor = agent_feed(feed_args)
+    agent_data = [dict(entry, agent_name=entry['user'].username) for entry in agent_data]
+    return render_template('agent_list.html', agent_data=agent_data,
+                           next_cursor=next_cursor, filter_args=filter_query_args(feed_args))
+
+# 为买家匹配代购行程（API）：?location=<地点>&date_from=&date_to=&limit=，按地点相似度、出发日期排序
+@agent_bp.route('/matches')
+@login_required
+def match_agents():
+    from app.utils.matching import matching_index
+    feed_args = parse_feed_args(request.args)
+    matching_index.ensure_loaded()
+    matches = matching_index.match_trips(
+        location=feed_args['location'],
+        date_from=feed_args['date_from'],
+        date_to=feed_args['date_to'],
+        limit=feed_args['limit'],
+        exclude_user_id=current_user.id
+    )
+
+    # 展示所需的用户名一次查询取出
+    user_ids = [match['user_id'] for match in matches]
+    usernames = dict(db.session.query(User.id, User.username).filter(User.id.in_(user_ids)).all()) if user_ids else {}
+    return {
+        'code': 200,
+        'data': [
+            {
+                'agent_id': match['user_id'],
+                'agent_name': usernames.get(match['user_id']),
+                'agent_info_id': match['trip_id'],
+                'location': match['location_key'],
+                'time': match['time'].strftime('%Y-%m-%d %H:%M'),
+                'score': match['score']
+            }
+            for match in matches
+        ]
+    }
 
 # 代购已联系行程页面
 @agent_bp.route('/contacted_trips')
@@ -147,10 +180,17 @@ def contacted_trips():
         .all()
 
     agent_itinerary = AgentInfo.query.filter_by(user_id=current_user.id).first()
+
+    # 买家的购物圈、商品各一次 IN 查询取出，查询次数与绑定数无关
+    buyer_ids = [buyer.id for _, buyer in bindings]
+    loader = batch_loader()
+    loader.queue(ShoppingCircle, buyer_ids, key='user_id')
+    loader.queue(ShoppingInfo, buyer_ids, key='user_id', many=True)
+
     enriched_trips = []
     for binding, buyer in bindings:
-        buyer_circle = ShoppingCircle.query.filter_by(user_id=buyer.id).first()
-        buyer_products = ShoppingInfo.query.filter_by(user_id=buyer.id).all() if buyer_circle else []
+        buyer_circle = loader.get(ShoppingCircle, buyer.id, key='user_id')
+        buyer_products = loader.get_many(ShoppingInfo, buyer.id, key='user_id') if buyer_circle else []
         enriched_trips.append({
             "binding": binding,
             "buyer": buyer,
@@ -159,6 +199,9 @@ def contacted_trips():
             "agent_itinerary": agent_itinerary
         })
 
+    # 所有绑定（聊天房间）的未读数一次查询取出
+    unread_counts = chat_unread.unread_counts(current_user.id, [binding.id for binding, _ in bindings])
 
     unbind_form = UnbindForm()
-    return render_template('contacted_trips.html', trips=enriched_trips, form=unbind_form)
\ No newline at end of file
+    return render_template('contacted_trips.html', trips=enriched_trips, form=unbind_form,
+                           unread_counts=unread_counts)
\ No newline at end of file
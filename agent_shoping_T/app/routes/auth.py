@@ -184,6 +184,9 @@ def choose_identity():
         current_user.is_agent = (identity_type == 'agent')  # True=代购用户，False=普通用户
 
         try:
+            # 身份变化影响购物圈是否展示，同一事务内更新物化表
+            from app.utils.demand_feed import refresh_buyer_feed
+            refresh_buyer_feed([current_user.id])
             db.session.commit()
             flash(f'成为{"代购（可以发布行程，绑定需求商品）" if identity_type == "agent" else "买家（可以推荐或添加需求商品）"}', 'success')
             return redirect(url_for('home'))
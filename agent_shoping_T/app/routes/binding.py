@@ -1,13 +1,22 @@
 from flask import Blueprint, render_template, redirect, url_for, flash
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
 from app import db
 from app.models import Binding, User
 from app.forms.binding_forms import ConfirmBindingForm  # 导入确认绑定表单
 
 from app.forms.binding_forms import UnbindForm  # 需创建空表单类（仅用于 CSRF 保护）
+from app.utils.chat_cache import invalidate_chat_room
+from app.utils.chat_unread import chat_unread
+from app.utils.demand_feed import refresh_buyer_feed
 
 binding_bp = Blueprint('binding', __name__)
 
+
+def _with_users(query):
+    """同一条查询 JOIN 出绑定双方的用户（模板中 binding.agent / binding.buyer 不再逐条查询）"""
+    return query.options(joinedload(Binding.agent), joinedload(Binding.buyer))
+
 # ------------------------------
 # 1. 代购用户绑定买家（代购发起）
 # ------------------------------
@@ -43,6 +52,8 @@ def bind_buyer(buyer_id):
     )
     db.session.add(new_binding)
     try:
+        # 买家已被绑定，从购物圈物化表移除（同一事务）
+        refresh_buyer_feed([buyer_id])
         db.session.commit()
         flash(f'绑定请求已发送给买家「{buyer_user.username}」，等待对方确认', 'success')
     except Exception as e:
@@ -86,6 +97,7 @@ def bind_agent(agent_id):
     )
     db.session.add(new_binding)
     try:
+        refresh_buyer_feed([current_user.id])
         db.session.commit()
         flash(f'绑定请求已发送给代购「{agent_user.username}」，等待对方确认', 'success')
     except Exception as e:
@@ -102,7 +114,7 @@ def bind_agent(agent_id):
 @login_required
 def confirm_binding(binding_id):
     form = ConfirmBindingForm()  # 实例化表单，启用 CSRF 保护
-    binding = Binding.query.get_or_404(binding_id)
+    binding = _with_users(Binding.query).filter_by(id=binding_id).first_or_404()
 
     # 表单验证通过（携带有效 CSRF 令牌）
     if form.validate_on_submit():
@@ -120,14 +132,14 @@ def confirm_binding(binding_id):
         # 更新绑定状态为已确认
         binding.status = 'confirmed'
         db.session.commit()
+        # 绑定已变更，清除聊天房间缓存
+        invalidate_chat_room(binding.id)
 
         # 区分用户身份提示
         if current_user.id == binding.agent_id:
-            buyer = User.query.get(binding.buyer_id)
-            flash(f'已确认与买家「{buyer.username}」的绑定', 'success')
+            flash(f'已确认与买家「{binding.buyer.username}」的绑定', 'success')
         else:
-            agent = User.query.get(binding.agent_id)
-            flash(f'已确认与代购「{agent.username}」的绑定', 'success')
+            flash(f'已确认与代购「{binding.agent.username}」的绑定', 'success')
 
         return redirect(url_for('binding.binding_detail_by_id', binding_id=binding.id))
 
@@ -149,8 +161,8 @@ def binding_detail_by_buyer(buyer_id):
         flash('只有代购用户可查看该绑定详情', 'danger')
         return redirect(url_for('shopping.shopping_circle'))
 
-    # 查询当前代购与该买家的绑定
-    binding = Binding.query.filter_by(
+    # 查询当前代购与该买家的绑定（连同双方用户信息，供模板使用）
+    binding = _with_users(Binding.query).filter_by(
         agent_id=current_user.id,
         buyer_id=buyer_id
     ).first()
@@ -159,10 +171,6 @@ def binding_detail_by_buyer(buyer_id):
         flash('未找到与该买家的绑定信息', 'danger')
         return redirect(url_for('shopping.shopping_circle'))
 
-    # 关联查询代购和买家信息（供模板使用）
-    binding.agent = User.query.get(binding.agent_id)
-    binding.buyer = User.query.get(binding.buyer_id)
-
     # 实例化表单（用于详情页确认按钮的 CSRF 令牌）
     form = ConfirmBindingForm()
 
@@ -174,10 +182,8 @@ def binding_detail_by_buyer(buyer_id):
 @binding_bp.route('/binding-detail/<int:binding_id>')
 @login_required
 def binding_detail_by_id(binding_id):
-    # 查询绑定记录 + 关联用户信息（避免模板 N+1 查询）
-    binding = Binding.query.get_or_404(binding_id)
-    binding.agent = User.query.get(binding.agent_id)
-    binding.buyer = User.query.get(binding.buyer_id)
+    # 查询绑定记录 + 关联用户信息（一条 JOIN 查询，避免模板 N+1 查询）
+    binding = _with_users(Binding.query).filter_by(id=binding_id).first_or_404()
 
     # 权限校验：仅绑定的代购或买家可查看
     if current_user.id not in [binding.agent_id, binding.buyer_id]:
@@ -195,20 +201,18 @@ def binding_detail_by_id(binding_id):
 @binding_bp.route('/binding-list')
 @login_required
 def binding_list():
-    # 查询当前用户作为代购或买家的所有绑定（按时间倒序）
-    bindings = Binding.query.filter(
+    # 查询当前用户作为代购或买家的所有绑定（按时间倒序），双方用户信息随同一条查询取出
+    bindings = _with_users(Binding.query).filter(
         (Binding.agent_id == current_user.id) | (Binding.buyer_id == current_user.id)
     ).order_by(Binding.created_at.desc()).all()
 
-    # 关联查询每个绑定的用户信息（供模板渲染）
-    for binding in bindings:
-        binding.agent = User.query.get(binding.agent_id)
-        binding.buyer = User.query.get(binding.buyer_id)
+    # 所有绑定（聊天房间）的未读数一次查询取出
+    unread_counts = chat_unread.unread_counts(current_user.id, [binding.id for binding in bindings])
 
     # 实例化表单（用于列表页确认按钮的 CSRF 令牌）
     form = ConfirmBindingForm()
 
-    return render_template('binding_list.html', bindings=bindings, form=form)
+    return render_template('binding_list.html', bindings=bindings, form=form, unread_counts=unread_counts)
 
 # 解除绑定路由（与模板 form 对应）
 # ------------------------------
@@ -216,7 +220,7 @@ def binding_list():
 @login_required
 def unbind(binding_id):
     form = UnbindForm()  # 空表单，仅用于 CSRF 验证
-    binding = Binding.query.get_or_404(binding_id)
+    binding = _with_users(Binding.query).filter_by(id=binding_id).first_or_404()
 
     # 1. CSRF 验证 + 权限校验
     if form.validate_on_submit():
@@ -229,16 +233,21 @@ def unbind(binding_id):
         try:
             # 先查询买家/代购信息（Python 正确的容错写法）
             if current_user.id == binding.agent_id:
-                buyer = User.query.get(binding.buyer_id)
+                buyer = binding.buyer
                 # Python 容错：用 or 替代 Jinja2 的 |default
                 buyer_name = buyer.username if (buyer and buyer.username) else "未知用户"
             else:
-                agent = User.query.get(binding.agent_id)
+                agent = binding.agent
                 agent_name = agent.username if (agent and agent.username) else "未知代购"
 
-            # 删除绑定记录
+            # 删除绑定记录（连同该聊天房间的已读状态）
             db.session.delete(binding)
+            chat_unread.discard_rooms([binding_id])
+            # 买家没有其他绑定时重新出现在购物圈
+            refresh_buyer_feed([binding.buyer_id])
             db.session.commit()
+            # 清除该绑定聊天房间的缓存
+            invalidate_chat_room(binding_id)
 
         except Exception as e:
             db.session.rollback()
@@ -280,6 +289,7 @@ def bind_buyer_direct_confirm(buyer_id):
     )
     db.session.add(new_binding)
     try:
+        refresh_buyer_feed([buyer_id])
         db.session.commit()
 
         # 核心修改2：绑定成功后跳转至 contacted_trips
@@ -1,5 +1,6 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for
 from flask_login import login_required, current_user
+from app import db
 from app.models.binding import Binding
 
 chat_bp = Blueprint('chat', __name__)
@@ -34,23 +35,45 @@ def chat_room(binding_id):
 
 
 # 获取聊天历史（API接口，可选）
+# 分页参数：?before_id=<消息id>&limit=<条数>，返回 id < before_id 的一页（按时间升序）
 @chat_bp.route('/history/<int:binding_id>')
 @login_required
 def chat_history(binding_id):
-    from app.models.chat import ChatMessage
+    from app.utils.chat_history import parse_page_args, fetch_history_page, serialize_message
     # 校验权限
     binding = Binding.query.get_or_404(binding_id)
     if current_user.id not in [binding.agent_id, binding.buyer_id]:
         flash('无权查看该聊天记录', 'danger')
         return redirect(url_for('binding.binding_list'))
 
-    # 查询历史消息
-    history = ChatMessage.query.filter_by(room_id=str(binding_id)).order_by(ChatMessage.created_at.asc()).all()
+    # 查询历史消息（游标分页）
+    before_id, limit = parse_page_args(request.args.get('before_id'), request.args.get('limit'))
+    history, has_more = fetch_history_page(str(binding_id), before_id=before_id, limit=limit)
     return {
         'code': 200,
-        'data': [{
-            'sender': msg.sender_name,
-            'content': msg.content,
-            'time': msg.created_at.strftime("%Y-%m-%d %H:%M:%S")
-        } for msg in history]
-    }
\ No newline at end of file
+        'data': [serialize_message(msg, time_format="%Y-%m-%d %H:%M:%S") for msg in history],
+        'has_more': has_more,
+        # 下一页（更早消息）的游标
+        'next_before_id': history[0].id if (history and has_more) else None
+    }
+
+
+# 聊天消息全文检索（仅检索当前用户参与的房间）：?q=<关键词>&limit=<条数>
+# 只检索 chat_message 热表：已归档（flask chat-archive）的消息不在结果中，仍可通过历史记录翻页查看
+@chat_bp.route('/search')
+@login_required
+def chat_search():
+    from app.utils.chat_search import search_messages
+    keyword = request.args.get('q', '').strip()
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 100))
+    except ValueError:
+        limit = 20
+
+    if not keyword:
+        return {'code': 400, 'msg': '请输入搜索关键词', 'data': []}, 400
+
+    return {
+        'code': 200,
+        'data': search_messages(db, current_user.id, keyword, limit=limit)
+    }
@@ -0,0 +1,171 @@
+# app/routes/chat_events.py
+"""
+聊天 Socket.IO 事件：加入房间、发送消息、已读、历史消息
+
+处理函数不绑定具体的 SocketIO 实例，由 register_chat_events 注册：
+run.py 注册到全局 socketio；测试中每个模拟 worker（各自的 SocketIO + 共享消息队列）各注册一份。
+emit / join_room 总是作用于当前应用的 SocketIO 实例。
+"""
+import logging
+
+from flask_socketio import emit, join_room
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+@metrics.socket_event('join_chat')  # 事件耗时/异常计数
+def handle_join_chat(data):
+    from app.utils.chat_cache import room_members
+    from flask_login import current_user
+    import datetime
+
+    room_id = str(data['room_id'])  # 聊天房间ID（绑定ID）
+    # 权限校验：仅绑定的代购/买家可加入
+    if not current_user.is_authenticated:
+        emit('chat_error', {'msg': '请先登录'})
+        return
+    if not room_members.is_member(room_id, current_user.id):
+        emit('chat_error', {'msg': '您无权进入该聊天房间'})
+        return
+
+    # 加入房间（依赖join_room方法）
+    join_room(room_id)
+    # 发送系统欢迎消息
+    emit('chat_message', {
+        'sender': '系统',
+        'content': f'{current_user.username}已加入聊天',
+        'time': datetime.datetime.now().strftime("%H:%M:%S")
+    }, room=room_id)
+
+
+@metrics.socket_event('send_message')  # 事件耗时/异常计数
+def handle_send_message(data):
+    from app import db
+    from app.utils.chat_writer import chat_writer
+    from app.utils.chat_cache import recent_messages, room_members
+    from app.utils.chat_unread import chat_unread
+    from flask_login import current_user
+    import datetime
+
+    room_id = str(data['room_id'])
+    content = data.get('content', '').strip()
+
+    # 基础校验（房间成员走缓存，每条消息只需一次字典查找；取一次，后面计算未读接收方时复用）
+    if not current_user.is_authenticated:
+        emit('chat_error', {'msg': '请先登录'})
+        return
+    members = room_members.members(room_id)
+    if members is None or current_user.id not in (members['agent_id'], members['buyer_id']):
+        emit('chat_error', {'msg': '您无权在该聊天房间发言'})
+        return
+    if not content:
+        emit('chat_error', {'msg': '消息内容不能为空'})
+        return
+
+    # 1. 持久化（写后模式下只入队并分配id，由后台协程批量写入；同步模式立即commit）
+    now = datetime.datetime.now()
+    try:
+        saved = chat_writer.save(
+            room_id=room_id,
+            sender_id=current_user.id,
+            sender_name=current_user.username,
+            content=content,
+            created_at=now
+        )
+    except Exception:
+        db.session.rollback()
+        emit('chat_error', {'msg': '消息保存失败'})
+        logger.exception('消息持久化失败')
+        return
+
+    # 2. 构造消息数据（带上持久化后的消息id，客户端据此做重连增量同步）
+    message_data = {
+        'id': saved['id'],
+        'sender': current_user.username,
+        'sender_id': current_user.id,
+        'content': content,
+        'time': now.strftime("%H:%M:%S"),
+        'room_id': room_id
+    }
+
+    # 3. 追加到房间最近消息缓存，再广播消息到房间内所有用户
+    recent_messages.append(room_id, message_data)
+    emit('chat_message', message_data, room=room_id)
+
+    # 4. 未读计数：对方 +1；发送者视为已读到自己这条消息（同一窗口内合并写入）
+    recipients = [uid for uid in (members['agent_id'], members['buyer_id']) if uid != current_user.id]
+    chat_unread.bump(room_id, saved['id'], recipients)
+    chat_unread.mark_read(current_user.id, room_id, saved['id'])
+
+
+@metrics.socket_event('mark_read')  # 事件耗时/异常计数
+def handle_mark_read(data):
+    from app.utils.chat_cache import room_members
+    from app.utils.chat_history import parse_since_id
+    from app.utils.chat_unread import chat_unread
+    from flask_login import current_user
+
+    room_id = str(data['room_id'])
+    if not current_user.is_authenticated or not room_members.is_member(room_id, current_user.id):
+        return
+    # last_id：客户端已渲染的最大消息id
+    last_id = parse_since_id(data.get('last_id'))
+    if last_id is None:
+        return
+    chat_unread.mark_read(current_user.id, room_id, last_id)
+
+
+@metrics.socket_event('load_history')  # 事件耗时/异常计数
+def handle_load_history(data):
+    from app.utils.chat_history import (
+        parse_page_args, parse_since_id, fetch_history_page, fetch_messages_since, serialize_message
+    )
+    from app.utils.chat_cache import recent_messages, room_members
+    from flask_login import current_user
+    room_id = str(data['room_id'])
+    if not current_user.is_authenticated or not room_members.is_member(room_id, current_user.id):
+        emit('chat_error', {'msg': '您无权查看该聊天记录'})
+        return
+    # before_id：只返回比该id更早的消息；为空则返回最新一页
+    before_id, limit = parse_page_args(data.get('before_id'), data.get('limit'))
+    # since_id：客户端已渲染的最大消息id，重连时只补发错过的消息
+    since_id = parse_since_id(data.get('since_id'))
+
+    if since_id is not None:
+        # 优先由最近消息缓存回答，缓存覆盖不到时查库
+        cached = recent_messages.messages_since(room_id, since_id, limit)
+        if cached is not None:
+            messages, has_more = cached
+        else:
+            history_msgs, has_more = fetch_messages_since(room_id, since_id, limit=limit)
+            messages = [serialize_message(msg) for msg in history_msgs]
+        emit('history_messages', {
+            'messages': messages,
+            'since_id': since_id,
+            'has_more': has_more
+        })
+        return
+
+    # 最新一页优先由最近消息缓存回答（不查库），翻更早的页时查库
+    cached = recent_messages.latest_page(room_id, limit) if before_id is None else None
+    if cached is not None:
+        messages, has_more = cached
+    else:
+        history_msgs, has_more = fetch_history_page(room_id, before_id=before_id, limit=limit)
+        messages = [serialize_message(msg) for msg in history_msgs]
+
+    emit('history_messages', {
+        'messages': messages,
+        'before_id': before_id,
+        'has_more': has_more
+    })
+
+
+def register_chat_events(socketio):
+    """注册聊天事件处理函数"""
+    socketio.on_event('join_chat', handle_join_chat)  # 客户端加入聊天房间
+    socketio.on_event('send_message', handle_send_message)  # 客户端发送消息
+    socketio.on_event('mark_read', handle_mark_read)  # 客户端已看到消息：清零该房间的未读计数
+    socketio.on_event('load_history', handle_load_history)  # 加载历史消息（游标分页，最新一页优先；重连时按since_id增量同步）
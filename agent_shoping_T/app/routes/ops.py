@@ -0,0 +1,40 @@
+from flask import Blueprint, jsonify, request
+from app.utils.admin import admin_required
+
+ops_bp = Blueprint('ops', __name__)
+
+
+# 运行状态：聊天写后队列深度、批量写入耗时、最近消息缓存命中率、归档节省空间等（仅管理员）
+@ops_bp.route('/stats')
+@admin_required
+def stats():
+    from app.utils.chat_writer import chat_writer
+    from app.utils.chat_cache import recent_messages, room_members
+    from app.utils.chat_archive import archive_totals
+    from app.utils.chat_unread import chat_unread
+    from app.utils.fragment_cache import fragment_cache
+    from app.utils.image_store import image_store
+    from app.utils.matching import matching_index
+    from app.utils.query_stats import query_stats
+    from app.utils.slow_query_log import slow_query_log
+    return jsonify({
+        'chat_writer': chat_writer.stats(),
+        'chat_recent_cache': recent_messages.stats(),
+        'chat_room_members': room_members.stats(),
+        'chat_archive': archive_totals(),
+        'chat_unread': chat_unread.stats(),
+        'fragment_cache': fragment_cache.stats(),
+        'image_store': image_store.stats(),
+        'matching': matching_index.stats(),
+        'query_stats': query_stats.stats(),
+        'slow_query_log': slow_query_log.stats()
+    })
+
+
+# SQL 统计报告：查询最多的请求（含疑似 N+1 的重复语句）与按端点汇总（仅管理员）；?limit=
+@ops_bp.route('/queries')
+@admin_required
+def queries():
+    from app.utils.query_stats import query_stats
+    limit = request.args.get('limit', type=int)
+    return jsonify(query_stats.report(limit=limit))
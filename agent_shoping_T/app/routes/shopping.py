@@ -1,9 +1,15 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app  # 导入 current_app
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify  # 导入 current_app
 from flask_login import login_required, current_user
 from app import db  # 仅导入扩展，不导入 app
-from app.forms import ShoppingInfoForm, ShoppingSubmitForm, DeleteShoppingItemForm
+from app.forms import ShoppingInfoForm, ShoppingSubmitForm, DeleteShoppingItemForm, ShoppingImportForm
 from app.forms.binding_forms import UnbindForm  # 关键：从binding_forms导入UnbindForm
 from app.models import ShoppingInfo, ShoppingCircle, User, AgentInfo, Binding
+from app.utils.batch_loader import batch_loader
+from app.utils.demand_feed import refresh_buyer_feed
+from app.utils.fragment_cache import fragment_cache
+from app.utils.image_store import image_store, InvalidImage
+from app.utils.money import from_cents
+from app.utils.shopping_totals import cart_totals, apply_item_delta
 import os
 from datetime import datetime
 
@@ -16,7 +22,9 @@ def shopping_info():
         return redirect(url_for('auth.choice'))
 
     shopping_items = current_user.shopping_info
-    total_price = sum(item.price for item in shopping_items) if shopping_items else 0.0
+    # 合计由 SQL 计算（分），展示时换算为元
+    total_cents, item_count = cart_totals(current_user.id)
+    total_price = from_cents(total_cents)
 
     form = ShoppingInfoForm()
     submit_form = ShoppingSubmitForm()
@@ -30,43 +38,58 @@ def shopping_info():
     # 添加商品
     if 'add_product' in request.form and form.validate_on_submit():
         image_filename = None
-        if form.product_image.data:
-            image = form.product_image.data
-            image_filename = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{image.filename.replace(' ', '_')[:50]}"
-            if len(image_filename) > 100:
-                image_filename = image_filename[:97] + '...'
-            image.save(os.path.join(upload_folder, image_filename))
+        if form.upload_id.data:
+            # 图片已分块上传完成，直接入库
+            from app.utils.chunked_upload import chunked_uploads, UploadError
+            try:
+                image_filename = chunked_uploads.finish(form.upload_id.data, current_user.id)
+            except UploadError as e:
+                flash(f'图片上传失败：{e.message}，请重新选择图片', 'danger')
+                return redirect(url_for('shopping.shopping_info'), code=303)
+        elif form.product_image.data:
+            # 按内容哈希存储（相同图片只存一份），缩略图由后台生成
+            try:
+                image_filename = image_store.store_upload(form.product_image.data)
+            except InvalidImage as e:
+                flash(f'图片上传失败：{str(e)}', 'danger')
+                return redirect(url_for('shopping.shopping_info'), code=303)
 
         new_item = ShoppingInfo(
             serial_number=form.serial_number.data,
             product_name=form.product_name.data,
-            price=float(form.price.data),
+            price=form.price.data,  # 字符串直接转为精确的分，不经过浮点数
             product_image=image_filename,
             description=form.description.data,
             user=current_user
         )
         db.session.add(new_item)
+        # 同一事务内增加购物圈总价/商品数，并更新购物圈物化表
+        apply_item_delta(current_user.id, new_item.price_cents, 1)
+        refresh_buyer_feed([current_user.id])
         db.session.commit()
         flash(f'商品【{form.product_name.data}】添加成功', 'success')
         return redirect(url_for('shopping.shopping_info'), code=303)
 
     # 提交购物圈
     if 'submit_shopping' in request.form and submit_form.validate_on_submit():
-        if not shopping_items:
+        if not item_count:
             flash('请先添加商品再提交', 'warning')
             return redirect(url_for('shopping.shopping_info'), code=303)
 
         existing_circle = current_user.shopping_circle
         if existing_circle:
-            existing_circle.total_price = total_price
+            existing_circle.total_price_cents = total_cents
+            existing_circle.item_count = item_count
             existing_circle.submit_time = datetime.utcnow()
         else:
             new_circle = ShoppingCircle(
                 user=current_user,
-                total_price=total_price
+                total_price_cents=total_cents,
+                item_count=item_count
             )
             db.session.add(new_circle)
 
+        refresh_buyer_feed([current_user.id])
         db.session.commit()
         return redirect(url_for('agent.agent_circle'), code=303)
 
@@ -83,17 +106,19 @@ def shopping_info():
             flash('删除失败：商品不存在或无权删除', 'danger')
             return redirect(url_for('shopping.shopping_info'), code=303)
 
-        # 删除图片
-        if item.product_image:
-            image_path = os.path.join(upload_folder, item.product_image)
-            if os.path.exists(image_path):
-                try:
-                    os.remove(image_path)
-                except Exception as e:
-                    flash(f'商品删除成功，但图片清理失败：{str(e)}', 'warning')
+        # 图片引用数 -1，无其他商品引用时提交后删除文件
+        image_unreferenced = image_store.release(item.product_image) if item.product_image else False
 
         db.session.delete(item)
+        apply_item_delta(current_user.id, -item.price_cents, -1)
+        refresh_buyer_feed([current_user.id])
         db.session.commit()
+
+        if image_unreferenced:
+            try:
+                image_store.remove_files([item.product_image])
+            except Exception as e:
+                flash(f'商品删除成功，但图片清理失败：{str(e)}', 'warning')
         flash(f'商品【{item.product_name}】已删除', 'success')
         return redirect(url_for('shopping.shopping_info'), code=303)
 
@@ -102,10 +127,53 @@ def shopping_info():
         form=form,
         submit_form=submit_form,
         delete_form=delete_form,
+        import_form=ShoppingImportForm(),
         shopping_items=shopping_items,
         total_price=total_price
     )
 
+# 批量导入商品（CSV / JSON），浏览器提交返回购物信息页，Accept: application/json 时返回导入报告
+@shopping_bp.route('/shopping-info/import', methods=['POST'])
+@login_required
+def import_shopping_info():
+    from app.utils.product_import import iter_import_rows, import_products
+
+    wants_json = request.accept_mimetypes.best == 'application/json'
+    if current_user.is_agent:
+        if wants_json:
+            return jsonify({"success": False, "message": "代购用户不能导入商品"}), 403
+        return redirect(url_for('auth.choice'))
+
+    form = ShoppingImportForm()
+    if not form.validate_on_submit():
+        message = next(iter(form.errors.values()), ['导入失败：表单无效'])[0]
+        if wants_json:
+            return jsonify({"success": False, "message": message}), 400
+        flash(message, 'danger')
+        return redirect(url_for('shopping.shopping_info'), code=303)
+
+    try:
+        rows = iter_import_rows(form.import_file.data)
+    except ValueError as e:
+        if wants_json:
+            return jsonify({"success": False, "message": str(e)}), 400
+        flash(f'导入失败：{str(e)}', 'danger')
+        return redirect(url_for('shopping.shopping_info'), code=303)
+
+    report = import_products(current_user.id, rows)
+    if wants_json:
+        return jsonify(dict(report.to_dict(), success=True)), 200
+
+    if report.imported:
+        flash(f'成功导入 {report.imported} 件商品，当前合计 {from_cents(report.total_cents)} 元', 'success')
+    if report.failed:
+        details = '；'.join(f'第 {line_no} 行：{message}' for line_no, message in report.errors[:10])
+        more = f'（另有 {report.failed - 10} 行错误未列出）' if report.failed > 10 else ''
+        flash(f'{report.failed} 行未导入 — {details}{more}', 'warning')
+    if not report.imported and not report.failed:
+        flash('导入文件中没有商品', 'warning')
+    return redirect(url_for('shopping.shopping_info'), code=303)
+
 # 代购查看购物圈页面
 @shopping_bp.route('/shopping-circle')
 @login_required
@@ -116,18 +184,11 @@ def shopping_circle():
         flash('仅代购用户可访问购物圈', 'warning')
         return redirect(url_for('auth.choice'))
 
-    # 查询非代购用户的购物圈
-    non_agent_users = User.query.filter_by(is_agent=False).all()
-    shopping_data = [
-        {
-            "user": user,
-            "circle_info": shopping_circle,
-            "products": ShoppingInfo.query.filter_by(user_id=user.id).all(),
-        }
-        for user in non_agent_users
-        if (shopping_circle := ShoppingCircle.query.filter_by(user_id=user.id).first())
-           and not Binding.query.filter_by(buyer_id=user.id).first()
-    ]
+    # 查询未被绑定的买家购物圈（反连接 + 批量加载商品，按提交时间游标分页，筛选条件下推到SQL）
+    from app.utils.feed_queries import open_shopping_feed, parse_feed_args, filter_query_args
+    feed_args = parse_feed_args(request.args)
+    shopping_data, next_cursor = open_shopping_feed(feed_args)
+    fragment_cache.prefetch('shopping_card', [data['user']['id'] for data in shopping_data])
 
     # 检查代购是否有有效行程
     has_valid_itinerary = False
@@ -139,9 +200,49 @@ def shopping_circle():
     return render_template(
         'shopping_circle.html',
         shopping_data=shopping_data,
-        has_valid_itinerary=has_valid_itinerary
+        has_valid_itinerary=has_valid_itinerary,
+        next_cursor=next_cursor,
+        filter_args=filter_query_args(feed_args)
     )
 
+# 为代购匹配开放购物圈（API）：按当前行程地点与商品名称/描述的匹配度、提交时间排序；?limit=
+@shopping_bp.route('/matches')
+@login_required
+def match_circles():
+    from app.models import OpenDemandFeed
+    from app.utils.feed_queries import parse_feed_args
+    from app.utils.matching import matching_index
+
+    if not current_user.is_agent:
+        return {'code': 403, 'msg': '仅代购用户可匹配购物圈', 'data': []}, 403
+    agent_itinerary = current_user.agent_itinerary
+    if not agent_itinerary or not agent_itinerary.is_submitted:
+        return {'code': 400, 'msg': '请先提交代购行程', 'data': []}, 400
+
+    feed_args = parse_feed_args(request.args)
+    matching_index.ensure_loaded()
+    matches = matching_index.match_circles(agent_itinerary.location, limit=feed_args['limit'])
+
+    # 展示所需字段从物化表一次查询取出
+    circle_ids = [match['circle_id'] for match in matches]
+    rows = {row.circle_id: row for row in OpenDemandFeed.query.filter(OpenDemandFeed.circle_id.in_(circle_ids))} \
+        if circle_ids else {}
+    return {
+        'code': 200,
+        'data': [
+            {
+                'circle_id': match['circle_id'],
+                'buyer_id': match['user_id'],
+                'buyer_name': rows[match['circle_id']].username,
+                'total_price': str(from_cents(rows[match['circle_id']].total_price_cents)),
+                'product_count': rows[match['circle_id']].product_count,
+                'submit_time': rows[match['circle_id']].submit_time.strftime('%Y-%m-%d %H:%M'),
+                'score': match['score']
+            }
+            for match in matches if match['circle_id'] in rows
+        ]
+    }
+
 # 已代购商品页面（普通用户/代购用户都可访问）
 @shopping_bp.route('/purchased_products')
 @login_required
@@ -152,20 +253,29 @@ def purchased_products():
     else:
         bindings = Binding.query.filter_by(buyer_id=current_user.id).all()
 
+    # 代购、买家、行程、购物圈、商品按类型各一次 IN 查询取出，查询次数与绑定数无关
+    agent_ids = [binding.agent_id for binding in bindings]
+    buyer_ids = [binding.buyer_id for binding in bindings]
+    loader = batch_loader()
+    loader.queue(User, agent_ids + buyer_ids)
+    loader.queue(AgentInfo, agent_ids, key='user_id')
+    loader.queue(ShoppingCircle, buyer_ids, key='user_id')
+    loader.queue(ShoppingInfo, buyer_ids, key='user_id', many=True)
+
     enriched_trips = []
     for binding in bindings:
         # 代购信息
         agent_id = binding.agent_id if not current_user.is_agent else current_user.id
-        agent_itinerary = AgentInfo.query.filter_by(user_id=agent_id).first()
-        agent_user = User.query.filter_by(id=agent_id).first()
+        agent_itinerary = loader.get(AgentInfo, agent_id, key='user_id')
+        agent_user = loader.get(User, agent_id)
 
         # 买家信息
         buyer_id = binding.buyer_id if current_user.is_agent else current_user.id
-        buyer = User.query.filter_by(id=buyer_id).first()
+        buyer = loader.get(User, buyer_id)
 
         # 购物信息
-        buyer_circle = ShoppingCircle.query.filter_by(user_id=buyer_id).first()
-        buyer_products = ShoppingInfo.query.filter_by(user_id=buyer_id).all() if buyer_circle else []
+        buyer_circle = loader.get(ShoppingCircle, buyer_id, key='user_id')
+        buyer_products = loader.get_many(ShoppingInfo, buyer_id, key='user_id') if buyer_circle else []
 
         enriched_trips.append({
             "binding": binding,
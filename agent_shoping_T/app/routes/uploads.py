@@ -0,0 +1,155 @@
+import logging
+import os
+from flask import Blueprint, request, current_app, abort
+from flask_login import login_required, current_user
+from app import db
+from app.models import ShoppingInfo
+from app.utils.chunked_upload import chunked_uploads, UploadError
+
+logger = logging.getLogger(__name__)
+
+uploads_bp = Blueprint('uploads', __name__)
+
+
+def _error(e: UploadError):
+    body = {'code': e.status, 'msg': e.message}
+    if e.offset is not None:
+        body['offset'] = e.offset
+    return body, e.status
+
+
+def _session_body(state):
+    return {
+        'upload_id': state['upload_id'],
+        'filename': state['filename'],
+        'size': state['size'],
+        'offset': state['offset'],
+        'chunk_size': state['chunk_size']
+    }
+
+
+# 创建分块上传会话：JSON {filename, size}
+@uploads_bp.route('/chunked', methods=['POST'])
+@login_required
+def create_upload():
+    payload = request.get_json(silent=True) or {}
+    try:
+        state = chunked_uploads.create(current_user.id, payload.get('filename'), payload.get('size'))
+    except UploadError as e:
+        return _error(e)
+    return {'code': 201, 'data': _session_body(state)}, 201
+
+
+# 查询会话（断线续传前取服务端已收到的偏移量）
+@uploads_bp.route('/chunked/<upload_id>', methods=['GET'])
+@login_required
+def upload_status(upload_id):
+    try:
+        state = chunked_uploads.status(upload_id, current_user.id)
+    except UploadError as e:
+        return _error(e)
+    return {'code': 200, 'data': _session_body(state)}
+
+
+# 追加一块：请求头 Upload-Offset，请求体为原始字节（application/offset+octet-stream）
+@uploads_bp.route('/chunked/<upload_id>', methods=['PATCH'])
+@login_required
+def upload_chunk(upload_id):
+    try:
+        state = chunked_uploads.append(
+            upload_id, current_user.id,
+            request.headers.get('Upload-Offset'),
+            request.stream,
+            request.content_length
+        )
+    except UploadError as e:
+        return _error(e)
+    return {'code': 200, 'data': _session_body(state)}
+
+
+# 上传完成后关联到已有商品：JSON {item_id}（原图片引用数 -1）
+@uploads_bp.route('/chunked/<upload_id>/attach', methods=['POST'])
+@login_required
+def attach_upload(upload_id):
+    from app.utils.demand_feed import refresh_buyer_feed
+    from app.utils.image_store import image_store
+
+    payload = request.get_json(silent=True) or {}
+    item = ShoppingInfo.query.filter_by(id=payload.get('item_id'), user_id=current_user.id).first()
+    if item is None:
+        return {'code': 404, 'msg': '商品不存在或无权修改'}, 404
+
+    try:
+        filename = chunked_uploads.finish(upload_id, current_user.id)
+    except UploadError as e:
+        return _error(e)
+
+    old_image = item.product_image
+    old_unreferenced = image_store.release(old_image) if old_image else False
+    item.product_image = filename
+    refresh_buyer_feed([current_user.id])
+    db.session.commit()
+
+    if old_unreferenced:
+        try:
+            image_store.remove_files([old_image])
+        except Exception:
+            logger.exception('商品图片替换后旧图清理失败')
+    return {'code': 200, 'data': {'item_id': item.id, 'product_image': filename,
+                                  'url': image_store.url(filename, 'thumb')}}
+
+
+# 商品图片：强 ETag + Last-Modified（条件请求返回 304）、Range（206）、按内容寻址的文件永久缓存
+# UPLOAD_OFFLOAD=x-sendfile / x-accel-redirect 时只返回响应头，由 Apache / Nginx 发送文件内容
+# Content-Type 取自文件内容识别出的图片格式（不看扩展名）；不是 JPEG/PNG/GIF/WebP 的文件（如旧版本上传的 .html）
+# 以附件下载并加 CSP sandbox，始终带 nosniff，避免在站点源下被浏览器当作页面渲染
+@uploads_bp.route('/<path:filename>', methods=['GET', 'HEAD'])
+def serve_upload(filename):
+    from werkzeug.security import safe_join
+    from werkzeug.utils import send_file
+    from app.utils.image_store import image_store
+
+    # 临时目录（分块上传的半成品）等隐藏路径不对外提供
+    if any(part.startswith('.') for part in filename.split('/')):
+        abort(404)
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    path = safe_join(upload_folder, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    etag = image_store.content_etag(filename)
+    mimetype = image_store.content_type(filename)
+    offload = current_app.config.get('UPLOAD_OFFLOAD', '')
+    if offload == 'x-accel-redirect':
+        response = current_app.response_class()
+        response.headers['X-Accel-Redirect'] = current_app.config.get('UPLOAD_ACCEL_PREFIX', '/protected-uploads/') + filename
+        response.mimetype = mimetype or 'application/octet-stream'
+        if mimetype is None:
+            response.headers['Content-Disposition'] = 'attachment'
+        if etag:
+            response.set_etag(etag)
+    else:
+        response = send_file(
+            path, request.environ,
+            mimetype=mimetype or 'application/octet-stream',
+            as_attachment=mimetype is None,
+            conditional=True,
+            etag=etag or True,
+            use_x_sendfile=(offload == 'x-sendfile'),
+            response_class=current_app.response_class
+        )
+
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    if mimetype is None:
+        response.headers['Content-Security-Policy'] = 'sandbox'
+
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    if etag:
+        # 文件名即内容哈希，内容永不改变：浏览器/CDN 缓存一年且不再验证
+        response.cache_control.max_age = 365 * 24 * 3600
+        response.cache_control.immutable = True
+    else:
+        # 旧的时间戳文件名：短期缓存，过期后用 ETag / Last-Modified 验证
+        response.cache_control.max_age = current_app.config.get('UPLOAD_LEGACY_MAX_AGE', 3600)
+    return response
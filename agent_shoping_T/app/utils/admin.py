@@ -0,0 +1,33 @@
+# app/utils/admin.py
+"""
+管理员权限：用户名在 ADMIN_USERNAMES（逗号分隔）中的已登录用户
+
+运维/诊断接口（/ops/*）暴露内部运行数据和请求路径，仅管理员可访问。
+"""
+from functools import wraps
+
+from flask import current_app
+from flask_login import current_user, login_required
+
+
+def admin_usernames():
+    value = current_app.config.get('ADMIN_USERNAMES', '')
+    if isinstance(value, str):
+        value = value.split(',')
+    return {name.strip() for name in value if name and name.strip()}
+
+
+def is_admin(user=None):
+    user = user if user is not None else current_user
+    return bool(user and user.is_authenticated and user.username in admin_usernames())
+
+
+def admin_required(view):
+    """仅管理员可访问（JSON 接口：非管理员返回 403）"""
+    @wraps(view)
+    @login_required
+    def wrapper(*args, **kwargs):
+        if not is_admin():
+            return {'code': 403, 'msg': '仅管理员可访问'}, 403
+        return view(*args, **kwargs)
+    return wrapper
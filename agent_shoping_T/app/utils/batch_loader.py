@@ -0,0 +1,85 @@
+# app/utils/batch_loader.py
+"""
+请求内批量加载（消除列表页的 N+1 查询）
+
+列表页逐条绑定查 User / AgentInfo / ShoppingCircle / ShoppingInfo，200 条绑定就是上千次查询。
+这里先登记所有需要的 id（queue），第一次取值（get / get_many）时按「模型 + 字段」各用一条
+IN (...) 查询一次取回，页面的查询次数与绑定数无关。
+
+    loader = batch_loader()
+    loader.queue(User, buyer_ids)
+    loader.queue(ShoppingInfo, buyer_ids, key='user_id', many=True)
+    buyer = loader.get(User, buyer_id)
+    products = loader.get_many(ShoppingInfo, buyer_id, key='user_id')
+
+- 加载器保存在 flask.g 上，只在当前请求内有效，不跨请求缓存（数据不会过期）
+- 同一请求内已取回（或确认不存在）的 id 不会重复查询
+- id 较多时按 BATCH_LOADER_CHUNK_SIZE 分批，避免超过 SQLite 的参数个数上限
+"""
+from collections import defaultdict
+
+from flask import g, current_app
+
+
+class BatchLoader:
+    """按 (模型, 字段, 是否一对多) 分组收集 id，取值时一次查询解析"""
+
+    def __init__(self, chunk_size=500):
+        self.chunk_size = chunk_size
+        self.queries = 0
+        self._pending = defaultdict(set)    # (模型, 字段, many) -> 待加载的 id
+        self._loaded = defaultdict(dict)    # (模型, 字段, many) -> {id: 实例 / 实例列表 / None}
+
+    def queue(self, model, ids, key='id', many=False):
+        """登记待加载的 id（不查询）；many=True 表示一个 id 对应多行（如某用户的全部商品）"""
+        group = (model, key, many)
+        loaded = self._loaded[group]
+        self._pending[group].update(i for i in ids if i is not None and i not in loaded)
+        return self
+
+    def get(self, model, id_, key='id'):
+        """按唯一字段取一行，不存在返回 None"""
+        return self._resolve((model, key, False), id_)
+
+    def get_many(self, model, id_, key):
+        """按非唯一字段取多行（按主键排序），没有返回空列表"""
+        return self._resolve((model, key, True), id_) or []
+
+    def _resolve(self, group, id_):
+        if id_ is None:
+            return None
+        loaded = self._loaded[group]
+        if id_ not in loaded:
+            # 未登记的 id 与本组其余待加载的 id 一起查询
+            self._pending[group].add(id_)
+            self._load(group)
+        return loaded.get(id_)
+
+    def _load(self, group):
+        model, key, many = group
+        ids = sorted(self._pending.pop(group, ()))
+        if not ids:
+            return
+        loaded = self._loaded[group]
+        column = getattr(model, key)
+        for start in range(0, len(ids), self.chunk_size):
+            chunk = ids[start:start + self.chunk_size]
+            rows = model.query.filter(column.in_(chunk)).order_by(model.id).all()
+            self.queries += 1
+            for i in chunk:
+                loaded[i] = [] if many else None
+            for row in rows:
+                value = getattr(row, key)
+                if many:
+                    loaded[value].append(row)
+                else:
+                    loaded[value] = row
+
+
+def batch_loader():
+    """当前请求的批量加载器（不存在则创建）"""
+    loader = g.get('batch_loader')
+    if loader is None:
+        loader = BatchLoader(chunk_size=int(current_app.config.get('BATCH_LOADER_CHUNK_SIZE', 500)))
+        g.batch_loader = loader
+    return loader
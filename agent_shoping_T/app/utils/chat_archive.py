@@ -0,0 +1,177 @@
+# app/utils/chat_archive.py
+"""
+聊天归档：把冷消息从 chat_message 热表移到压缩归档块（ChatArchive）
+
+- 归档条件：发送时间早于 CHAT_ARCHIVE_AFTER_DAYS 天，或所属绑定已删除/已取消
+- 每个房间的冷消息按 id 顺序切成最多 CHAT_ARCHIVE_CHUNK_SIZE 条一块，JSON + zlib 压缩后存入 ChatArchive，
+  同一事务内删除热表中的原消息（全文索引由触发器同步删除，归档消息不再参与搜索）
+- 历史查询翻页超出热表范围时，由 load_archived_before / load_archived_since 透明读取归档块
+- 命令行：flask chat-archive [--days N]，输出移动条数和节省的字节数
+"""
+import json
+import zlib
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func, or_, select, cast, String
+
+from app import db
+from app.models.binding import Binding
+from app.models.chat import ChatMessage, ChatArchive
+
+
+def _pack(messages):
+    """消息列表 -> (压缩数据, 压缩前字节数)"""
+    raw = json.dumps([
+        [msg.id, msg.sender_id, msg.sender_name, msg.content, msg.created_at.isoformat()]
+        for msg in messages
+    ], ensure_ascii=False).encode('utf-8')
+    return zlib.compress(raw, 9), len(raw)
+
+
+def _unpack(archive):
+    """归档块 -> 不加入会话的 ChatMessage 列表（按 id 升序）"""
+    rows = json.loads(zlib.decompress(archive.payload).decode('utf-8'))
+    return [ChatMessage(
+        id=msg_id,
+        room_id=archive.room_id,
+        sender_id=sender_id,
+        sender_name=sender_name,
+        content=content,
+        created_at=datetime.fromisoformat(created_at)
+    ) for msg_id, sender_id, sender_name, content, created_at in rows]
+
+
+# --------------------------
+# 读取（供 chat_history 调用）
+# --------------------------
+def load_archived_before(room_id, before_id=None, limit=50):
+    """读取归档中 id < before_id 的最新 limit 条消息（按 id 降序）"""
+    query = ChatArchive.query.filter(ChatArchive.room_id == room_id)
+    if before_id is not None:
+        query = query.filter(ChatArchive.first_message_id < before_id)
+
+    collected = []
+    for archive in query.order_by(ChatArchive.last_message_id.desc()):
+        collected.extend(msg for msg in _unpack(archive) if before_id is None or msg.id < before_id)
+        if len(collected) >= limit:
+            break
+    collected.sort(key=lambda msg: msg.id, reverse=True)
+    return collected[:limit]
+
+
+def load_archived_since(room_id, since_id, limit=50):
+    """读取归档中 id > since_id 的最早 limit 条消息（按 id 升序）"""
+    query = ChatArchive.query.filter(
+        ChatArchive.room_id == room_id,
+        ChatArchive.last_message_id > since_id
+    ).order_by(ChatArchive.first_message_id.asc())
+
+    collected = []
+    for archive in query:
+        collected.extend(msg for msg in _unpack(archive) if msg.id > since_id)
+        if len(collected) >= limit:
+            break
+    collected.sort(key=lambda msg: msg.id)
+    return collected[:limit]
+
+
+# --------------------------
+# 归档任务
+# --------------------------
+def archive_cold_messages(older_than_days=None, chunk_size=None):
+    """
+    执行一次归档
+
+    Returns:
+        dict: {rooms, chunks, rows_moved, raw_bytes, compressed_bytes, bytes_saved}
+    """
+    from app.utils.chat_writer import chat_writer
+    from app.utils.chat_cache import invalidate_chat_room
+
+    if older_than_days is None:
+        older_than_days = current_app.config.get('CHAT_ARCHIVE_AFTER_DAYS', 90)
+    if chunk_size is None:
+        chunk_size = current_app.config.get('CHAT_ARCHIVE_CHUNK_SIZE', 500)
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+
+    # 先把写后队列落库，保证归档看到的是完整数据
+    chat_writer.flush()
+
+    # 仍然有效的绑定对应的房间；不在其中的房间（绑定已删除/已取消）整体归档
+    live_rooms = select(cast(Binding.id, String)).where(Binding.status != 'canceled')
+    is_cold = or_(ChatMessage.created_at < cutoff, ChatMessage.room_id.not_in(live_rooms))
+
+    room_ids = [room_id for (room_id,) in
+                db.session.query(ChatMessage.room_id).filter(is_cold).distinct().all()]
+
+    stats = {'rooms': 0, 'chunks': 0, 'rows_moved': 0, 'raw_bytes': 0, 'compressed_bytes': 0}
+    for room_id in room_ids:
+        while True:
+            messages = ChatMessage.query.filter(ChatMessage.room_id == room_id, is_cold) \
+                .order_by(ChatMessage.id.asc()).limit(chunk_size).all()
+            if not messages:
+                break
+
+            payload, raw_bytes = _pack(messages)
+            db.session.add(ChatArchive(
+                room_id=room_id,
+                first_message_id=messages[0].id,
+                last_message_id=messages[-1].id,
+                message_count=len(messages),
+                raw_bytes=raw_bytes,
+                compressed_bytes=len(payload),
+                payload=payload
+            ))
+            ChatMessage.query.filter(ChatMessage.id.in_([msg.id for msg in messages])) \
+                .delete(synchronize_session=False)
+            try:
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+            stats['chunks'] += 1
+            stats['rows_moved'] += len(messages)
+            stats['raw_bytes'] += raw_bytes
+            stats['compressed_bytes'] += len(payload)
+            if len(messages) < chunk_size:
+                break
+
+        stats['rooms'] += 1
+        invalidate_chat_room(room_id)
+
+    stats['bytes_saved'] = stats['raw_bytes'] - stats['compressed_bytes']
+    return stats
+
+
+def archive_totals() -> dict:
+    """归档表累计统计"""
+    chunks, messages, raw_bytes, compressed_bytes = db.session.query(
+        func.count(ChatArchive.id),
+        func.coalesce(func.sum(ChatArchive.message_count), 0),
+        func.coalesce(func.sum(ChatArchive.raw_bytes), 0),
+        func.coalesce(func.sum(ChatArchive.compressed_bytes), 0)
+    ).one()
+    return {
+        'chunks': chunks,
+        'messages': messages,
+        'raw_bytes': raw_bytes,
+        'compressed_bytes': compressed_bytes,
+        'bytes_saved': raw_bytes - compressed_bytes
+    }
+
+
+@click.command('chat-archive')
+@click.option('--days', type=int, default=None, help='归档早于多少天的消息（默认 CHAT_ARCHIVE_AFTER_DAYS）')
+@with_appcontext
+def archive_chat_command(days):
+    """把冷聊天消息归档为压缩块"""
+    stats = archive_cold_messages(older_than_days=days)
+    click.echo(
+        f"归档完成：{stats['rooms']} 个房间，{stats['chunks']} 个归档块，移动 {stats['rows_moved']} 条消息，"
+        f"原始 {stats['raw_bytes']} 字节 -> 压缩后 {stats['compressed_bytes']} 字节，"
+        f"节省 {stats['bytes_saved']} 字节"
+    )
@@ -0,0 +1,283 @@
+# app/utils/chat_cache.py
+"""
+聊天房间进程内缓存
+
+1. RecentMessageBuffer：每个房间最近 N 条消息的环形缓冲
+2. RoomMembershipCache：房间成员（绑定的代购/买家）缓存，Socket 事件鉴权只需一次字典查找
+
+最近消息缓冲：
+- 发送消息时追加到缓冲；房间首次访问（未命中）时从 ChatMessage 懒加载最近 N 条
+- 缓冲中保存的是已序列化的消息字典，load_history 的首页/重连增量可直接返回，不查 SQLite
+- 房间按 LRU 淘汰，所有房间合计占用受全局内存上限约束
+- 绑定被删除（解绑、删除代购行程）时需调用 invalidate_chat_room 清除对应房间
+- 多 worker 部署时其他 worker 发出的消息不会进入本进程缓冲，因此自动关闭
+
+房间成员缓存：
+- room_id（=绑定ID）-> {agent_id, buyer_id}，未命中时查一次 Binding
+- 解绑、删除代购行程、确认绑定后通过 invalidate_chat_room 清除；
+  另设 TTL，多 worker 部署时其他进程的变更最迟在 TTL 后生效
+- 最多缓存 CHAT_ROOM_AUTH_MAX_ROOMS 个房间，按 LRU 淘汰
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+# 单条消息的估算固定开销（字典及各字段对象），用于内存上限控制
+_MESSAGE_OVERHEAD_BYTES = 400
+
+
+def _estimate_size(message):
+    return _MESSAGE_OVERHEAD_BYTES + len(message.get('content', '')) * 4 + len(message.get('sender', '')) * 4
+
+
+class _RoomBuffer:
+    """单个房间的最近消息（按 id 升序，且与数据库中最新的消息连续）"""
+
+    def __init__(self, capacity):
+        self.messages = deque(maxlen=capacity)
+        # complete=True 表示缓冲中就是该房间的全部消息（没有更早的了）
+        self.complete = True
+        self.size = 0
+
+    def append(self, message):
+        if len(self.messages) == self.messages.maxlen:
+            self.size -= _estimate_size(self.messages[0])
+            self.complete = False
+        self.messages.append(message)
+        self.size += _estimate_size(message)
+
+    @property
+    def last_id(self):
+        return self.messages[-1]['id'] if self.messages else 0
+
+
+class RecentMessageBuffer:
+    """按房间缓存最近消息，LRU 淘汰 + 全局内存上限"""
+
+    def __init__(self):
+        self.enabled = False
+        self.per_room = 100
+        self.max_bytes = 16 * 1024 * 1024
+
+        self._rooms = OrderedDict()   # room_id -> _RoomBuffer（末尾为最近使用）
+        self._loading = {}            # room_id -> 加载期间追加的消息
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('CHAT_RECENT_CACHE_ENABLED', True))
+        self.per_room = max(1, int(app.config.get('CHAT_RECENT_CACHE_PER_ROOM', 100)))
+        self.max_bytes = int(app.config.get('CHAT_RECENT_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+        if self.enabled and app.config.get('SOCKETIO_WORKERS', 1) > 1:
+            logger.info('多进程部署下最近消息缓冲无法看到其他 worker 的消息，已关闭')
+            self.enabled = False
+        app.extensions['chat_recent_cache'] = self
+
+    # --------------------------
+    # 写入
+    # --------------------------
+    def append(self, room_id, message):
+        """发送消息后追加到房间缓冲（房间未缓存时忽略，下次访问时懒加载）"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if room_id in self._loading:
+                self._loading[room_id].append(message)
+                return
+            buffer = self._rooms.get(room_id)
+            if buffer is None or message['id'] <= buffer.last_id:
+                return
+            self._total_bytes -= buffer.size
+            buffer.append(message)
+            self._total_bytes += buffer.size
+            self._rooms.move_to_end(room_id)
+            self._evict()
+
+    def invalidate(self, room_id):
+        """清除房间缓冲（绑定删除/变更时调用）"""
+        with self._lock:
+            buffer = self._rooms.pop(room_id, None)
+            if buffer is not None:
+                self._total_bytes -= buffer.size
+            # 正在加载的结果作废
+            self._loading.pop(room_id, None)
+
+    # --------------------------
+    # 读取
+    # --------------------------
+    def latest_page(self, room_id, limit):
+        """
+        最新一页消息，返回 (messages, has_more)；无法由缓冲回答时返回 None
+        """
+        if not self.enabled or limit > self.per_room:
+            return None
+        buffer = self._get_or_load(room_id)
+        if buffer is None:
+            return None
+        messages = list(buffer.messages)
+        has_more = len(messages) > limit or not buffer.complete
+        return messages[-limit:], has_more
+
+    def messages_since(self, room_id, since_id, limit):
+        """
+        id > since_id 的消息，返回 (messages, has_more)；缓冲不能覆盖 since_id 之后的全部消息时返回 None
+        """
+        if not self.enabled:
+            return None
+        buffer = self._get_or_load(room_id)
+        if buffer is None:
+            return None
+        messages = list(buffer.messages)
+        # 缓冲最早一条 <= since_id（或缓冲即整个房间）时，since_id 之后的消息都在缓冲中
+        if not buffer.complete and (not messages or messages[0]['id'] > since_id):
+            return None
+        newer = [message for message in messages if message['id'] > since_id]
+        return newer[:limit], len(newer) > limit
+
+    def _get_or_load(self, room_id):
+        with self._lock:
+            buffer = self._rooms.get(room_id)
+            if buffer is not None:
+                self._rooms.move_to_end(room_id)
+                self.hits += 1
+                return buffer
+            self.misses += 1
+            appended = []
+            self._loading[room_id] = appended
+
+        from app.utils.chat_history import fetch_history_page, serialize_message
+        try:
+            rows, has_more = fetch_history_page(room_id, before_id=None, limit=self.per_room)
+        except Exception:
+            with self._lock:
+                if self._loading.get(room_id) is appended:
+                    del self._loading[room_id]
+            raise
+
+        buffer = _RoomBuffer(self.per_room)
+        for msg in rows:
+            buffer.append(serialize_message(msg))
+        buffer.complete = not has_more
+
+        with self._lock:
+            # 加载期间被 invalidate 的房间不再写入缓冲
+            if self._loading.get(room_id) is not appended:
+                return buffer
+            del self._loading[room_id]
+            for message in appended:
+                if message['id'] > buffer.last_id:
+                    buffer.append(message)
+            self._rooms[room_id] = buffer
+            self._total_bytes += buffer.size
+            self._evict()
+        return buffer
+
+    def _evict(self):
+        """超过全局内存上限时按 LRU 淘汰房间（至少保留最近使用的一个）"""
+        while self._total_bytes > self.max_bytes and len(self._rooms) > 1:
+            _, buffer = self._rooms.popitem(last=False)
+            self._total_bytes -= buffer.size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            rooms = len(self._rooms)
+            total_bytes = self._total_bytes
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'rooms': rooms,
+            'approx_bytes': total_bytes,
+            'max_bytes': self.max_bytes,
+            'per_room': self.per_room,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions
+        }
+
+
+class RoomMembershipCache:
+    """聊天房间成员缓存：room_id -> {agent_id, buyer_id}，LRU 淘汰 + TTL"""
+
+    def __init__(self):
+        self.ttl = 300
+        self.max_rooms = 10000
+        self._members = OrderedDict()   # room_id -> (成员字典, 过期时间)（末尾为最近使用）
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app):
+        self.ttl = int(app.config.get('CHAT_ROOM_AUTH_TTL', 300))
+        self.max_rooms = max(1, int(app.config.get('CHAT_ROOM_AUTH_MAX_ROOMS', 10000)))
+        app.extensions['chat_room_members'] = self
+
+    def members(self, room_id):
+        """返回房间成员 {agent_id, buyer_id}；房间（绑定）不存在时返回 None（不缓存）"""
+        room_id = str(room_id)
+        with self._lock:
+            cached = self._members.get(room_id)
+            if cached is not None and cached[1] > time.monotonic():
+                self._members.move_to_end(room_id)
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+
+        if not room_id.isdigit():
+            return None
+        from app.models.binding import Binding
+        binding = Binding.query.get(int(room_id))
+        with self._lock:
+            if binding is None:
+                self._members.pop(room_id, None)
+                return None
+            members = {'agent_id': binding.agent_id, 'buyer_id': binding.buyer_id}
+            self._members[room_id] = (members, time.monotonic() + self.ttl)
+            self._members.move_to_end(room_id)
+            while len(self._members) > self.max_rooms:
+                self._members.popitem(last=False)
+                self.evictions += 1
+        return members
+
+    def is_member(self, room_id, user_id):
+        """用户是否为房间（绑定）的代购或买家"""
+        members = self.members(room_id)
+        return members is not None and user_id in (members['agent_id'], members['buyer_id'])
+
+    def invalidate(self, room_id):
+        with self._lock:
+            self._members.pop(str(room_id), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            rooms = len(self._members)
+        lookups = self.hits + self.misses
+        return {
+            'rooms': rooms,
+            'max_rooms': self.max_rooms,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions
+        }
+
+
+# 全局实例（在 create_app 中初始化）
+recent_messages = RecentMessageBuffer()
+room_members = RoomMembershipCache()
+
+
+def invalidate_chat_room(room_id):
+    """绑定被删除/变更后清除该聊天房间的进程内缓存（最近消息 + 成员）"""
+    recent_messages.invalidate(str(room_id))
+    room_members.invalidate(room_id)
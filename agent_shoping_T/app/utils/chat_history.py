@@ -0,0 +1,124 @@
+# app/utils/chat_history.py
+"""
+聊天历史查询：基于消息 id 的游标分页（keyset pagination）
+
+- before_id 为空时返回最新一页，否则返回 id < before_id 的上一页
+- since_id 用于断线重连后的增量同步，只返回 id > since_id 的消息
+- 每页内部按 id 升序排列，便于前端直接按顺序渲染
+- 写后缓冲中尚未落库的消息（见 chat_writer）会合并进查询结果
+- 热表中不足一页时继续读取压缩归档块（见 chat_archive），对调用方透明
+- 依赖 ChatMessage 上的 (room_id, id) 复合索引，翻页成本与房间总消息数无关
+"""
+from flask import current_app
+from app.models.chat import ChatMessage
+from app.utils.chat_writer import chat_writer
+from app.utils.chat_archive import load_archived_before, load_archived_since
+
+
+def serialize_message(msg, time_format="%H:%M:%S"):
+    """将 ChatMessage 转换为前端/Socket 使用的字典"""
+    return {
+        'id': msg.id,
+        'sender': msg.sender_name,
+        'sender_id': msg.sender_id,
+        'content': msg.content,
+        'time': msg.created_at.strftime(time_format),
+        'room_id': msg.room_id
+    }
+
+
+def _parse_message_id(value):
+    """解析消息id游标，非法值或非正数返回 None"""
+    try:
+        value = int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+    if value is not None and value <= 0:
+        return None
+    return value
+
+
+def parse_since_id(since_id=None):
+    """校验增量同步游标（客户端已渲染的最大消息id）"""
+    return _parse_message_id(since_id)
+
+
+def parse_page_args(before_id=None, limit=None):
+    """校验并规范化分页参数（非法值按未传处理）"""
+    default_size = current_app.config.get('CHAT_HISTORY_PAGE_SIZE', 50)
+    max_size = current_app.config.get('CHAT_HISTORY_MAX_PAGE_SIZE', 200)
+
+    before_id = _parse_message_id(before_id)
+
+    try:
+        limit = int(limit) if limit not in (None, '') else default_size
+    except (TypeError, ValueError):
+        limit = default_size
+    limit = max(1, min(limit, max_size))
+
+    return before_id, limit
+
+
+def _pending_rows(room_id):
+    """写后队列中尚未落库的消息，转换为（不加入会话的）ChatMessage 对象"""
+    return [ChatMessage(**row) for row in chat_writer.pending_messages(room_id)]
+
+
+def _merge(rows, pending, descending):
+    """合并数据库结果与未落库消息，按 id 去重排序"""
+    if not pending:
+        return rows
+    merged = {msg.id: msg for msg in rows}
+    for msg in pending:
+        merged.setdefault(msg.id, msg)
+    return sorted(merged.values(), key=lambda msg: msg.id, reverse=descending)
+
+
+def fetch_history_page(room_id, before_id=None, limit=50):
+    """
+    查询一页历史消息
+
+    Returns:
+        tuple: (messages, has_more)，messages 为按 id 升序的 ChatMessage 列表，
+               has_more 表示是否还有更早的消息
+    """
+    query = ChatMessage.query.filter(ChatMessage.room_id == room_id)
+    if before_id is not None:
+        query = query.filter(ChatMessage.id < before_id)
+
+    # 多取一条用于判断是否还有更早的消息
+    rows = query.order_by(ChatMessage.id.desc()).limit(limit + 1).all()
+    pending = [msg for msg in _pending_rows(room_id) if before_id is None or msg.id < before_id]
+    rows = _merge(rows, pending, descending=True)
+
+    # 热表不足一页：翻到了热表范围之外，继续从归档块补齐
+    if len(rows) <= limit:
+        cursor = rows[-1].id if rows else before_id
+        archived = load_archived_before(room_id, before_id=cursor, limit=limit + 1 - len(rows))
+        rows = _merge(rows, archived, descending=True)
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    return rows, has_more
+
+
+def fetch_messages_since(room_id, since_id, limit=50):
+    """
+    增量同步：查询 id > since_id 的消息（客户端断线期间错过的消息）
+
+    Returns:
+        tuple: (messages, has_more)，messages 按 id 升序，
+               has_more 表示本页之后还有更新的消息，客户端应以最后一条 id 继续拉取
+    """
+    rows = ChatMessage.query.filter(
+        ChatMessage.room_id == room_id,
+        ChatMessage.id > since_id
+    ).order_by(ChatMessage.id.asc()).limit(limit + 1).all()
+    pending = [msg for msg in _pending_rows(room_id) if msg.id > since_id]
+    # since_id 早于热表范围时，中间的消息可能已归档
+    archived = load_archived_since(room_id, since_id, limit=limit + 1)
+    rows = _merge(rows, pending + archived, descending=False)
+
+    has_more = len(rows) > limit
+    return rows[:limit], has_more
@@ -0,0 +1,187 @@
+# app/utils/chat_search.py
+"""
+聊天消息全文检索（SQLite FTS5）
+
+- chat_message_fts 为 chat_message 的外部内容（external content）影子表，
+  由触发器在插入/删除/修改消息时同步，批量写入（executemany）同样生效
+- 优先使用 trigram 分词器：中文没有空格分词，trigram 支持任意子串匹配（至少 3 个字符）；
+  SQLite 版本不支持时退回 unicode61
+- 检索结果只限当前用户参与的房间（绑定），按 bm25 相关度排序，并返回高亮片段
+- 少于 3 个字符的关键词或非 SQLite 数据库退回 LIKE 扫描（同样只扫描用户自己的房间）
+- 只覆盖 chat_message 热表：消息被归档（app.utils.chat_archive）时删除触发器同步移出索引，
+  归档消息不参与检索（LIKE 路径同样只扫描热表），只能通过历史记录翻页查看
+- 已有数据可用 `flask chat-search-rebuild` 重建索引
+"""
+import click
+from flask.cli import with_appcontext
+from markupsafe import escape
+from sqlalchemy import text
+
+FTS_TABLE = 'chat_message_fts'
+
+# 片段高亮的临时标记（转义后再替换为 <mark>，避免消息内容中的 HTML 被执行）
+_HL_START = '\x02'
+_HL_END = '\x03'
+
+_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON chat_message BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON chat_message BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF content ON chat_message BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content);
+    END""",
+)
+
+# 当前用户参与的房间（room_id 为绑定ID的字符串形式）
+_USER_ROOMS_SQL = "SELECT CAST(b.id AS TEXT) FROM binding b WHERE b.agent_id = :user_id OR b.buyer_id = :user_id"
+
+
+def _is_sqlite(engine):
+    return engine.dialect.name == 'sqlite'
+
+
+def _fts_exists(conn):
+    return conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+    ).first() is not None
+
+
+def ensure_search_index(db):
+    """创建 FTS5 影子表及同步触发器；首次创建时用已有消息填充索引"""
+    if not _is_sqlite(db.engine):
+        return False
+
+    with db.engine.begin() as conn:
+        created = False
+        if not _fts_exists(conn):
+            try:
+                conn.exec_driver_sql(
+                    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                    f"content, content='chat_message', content_rowid='id', tokenize='trigram')"
+                )
+            except Exception:
+                # SQLite < 3.34 不支持 trigram
+                conn.exec_driver_sql(
+                    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                    f"content, content='chat_message', content_rowid='id', tokenize='unicode61')"
+                )
+            created = True
+
+        for trigger_sql in _TRIGGERS:
+            conn.exec_driver_sql(trigger_sql)
+
+        if created:
+            conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def rebuild_search_index(db):
+    """按 chat_message 当前内容重建全文索引"""
+    if not ensure_search_index(db):
+        return False
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def _to_match_query(keyword):
+    """把用户输入转换为 FTS5 查询：按空白拆分，每段作为短语（转义双引号），多段取交集"""
+    terms = [term.replace('"', '""') for term in keyword.split()]
+    return ' '.join(f'"{term}"' for term in terms)
+
+
+def _render_snippet(raw):
+    """转义片段中的 HTML，再把高亮标记替换为 <mark>"""
+    return str(escape(raw)).replace(_HL_START, '<mark>').replace(_HL_END, '</mark>')
+
+
+def _like_snippet(content, keyword, width=24):
+    """LIKE 退回路径的简易高亮片段"""
+    pos = content.lower().find(keyword.lower())
+    if pos < 0:
+        return _render_snippet(content[:width * 2])
+    start = max(0, pos - width)
+    end = min(len(content), pos + len(keyword) + width)
+    raw = (
+        ('…' if start > 0 else '')
+        + content[start:pos] + _HL_START + content[pos:pos + len(keyword)] + _HL_END
+        + content[pos + len(keyword):end]
+        + ('…' if end < len(content) else '')
+    )
+    return _render_snippet(raw)
+
+
+def _format_time(value):
+    # 原生 SQL 查询下 SQLite 的时间列返回字符串，截到秒即可
+    return str(value)[:19] if value is not None else ''
+
+
+def search_messages(db, user_id, keyword, limit=20):
+    """
+    在用户参与的房间中检索聊天消息（不含已归档的消息）
+
+    Returns:
+        list: [{id, room_id, sender, time, snippet}]，按相关度（FTS）或时间倒序（LIKE）排列
+    """
+    keyword = (keyword or '').strip()
+    if not keyword:
+        return []
+
+    use_fts = _is_sqlite(db.engine) and min(len(term) for term in keyword.split()) >= 3
+    if use_fts:
+        rows = db.session.execute(text(f"""
+            SELECT m.id, m.room_id, m.sender_name, m.created_at,
+                   snippet({FTS_TABLE}, 0, :hl_start, :hl_end, '…', 16) AS snippet
+            FROM {FTS_TABLE}
+            JOIN chat_message m ON m.id = {FTS_TABLE}.rowid
+            WHERE {FTS_TABLE} MATCH :query
+              AND m.room_id IN ({_USER_ROOMS_SQL})
+            ORDER BY bm25({FTS_TABLE})
+            LIMIT :limit
+        """), {
+            'hl_start': _HL_START,
+            'hl_end': _HL_END,
+            'query': _to_match_query(keyword),
+            'user_id': user_id,
+            'limit': limit
+        }).all()
+        return [{
+            'id': row.id,
+            'room_id': row.room_id,
+            'sender': row.sender_name,
+            'time': _format_time(row.created_at),
+            'snippet': _render_snippet(row.snippet)
+        } for row in rows]
+
+    # 关键词过短（trigram 无法匹配）或非 SQLite：退回 LIKE，只扫描用户自己的房间
+    escaped = keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    rows = db.session.execute(text(f"""
+        SELECT m.id, m.room_id, m.sender_name, m.created_at, m.content
+        FROM chat_message m
+        WHERE m.room_id IN ({_USER_ROOMS_SQL})
+          AND m.content LIKE :pattern ESCAPE '\\'
+        ORDER BY m.id DESC
+        LIMIT :limit
+    """), {'pattern': f'%{escaped}%', 'user_id': user_id, 'limit': limit}).all()
+    return [{
+        'id': row.id,
+        'room_id': row.room_id,
+        'sender': row.sender_name,
+        'time': _format_time(row.created_at),
+        'snippet': _like_snippet(row.content, keyword)
+    } for row in rows]
+
+
+@click.command('chat-search-rebuild')
+@with_appcontext
+def rebuild_chat_search_command():
+    """重建聊天消息全文索引（FTS5）"""
+    from app import db
+    if rebuild_search_index(db):
+        click.echo('聊天消息全文索引已重建')
+    else:
+        click.echo('当前数据库不是 SQLite，未使用 FTS5 索引')
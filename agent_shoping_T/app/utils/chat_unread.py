@@ -0,0 +1,377 @@
+# app/utils/chat_unread.py
+"""
+聊天未读计数（增量维护，不再对 ChatMessage 做 COUNT(*)）
+
+- ChatReadState 每个用户每个房间一行：unread_count + last_read_message_id + last_message_id（已计入未读的最大消息id）
+- 发送消息时给房间内的对方 +1（bump），客户端看到消息后发 mark_read 清零
+- 同一 (用户, 房间) 在一个时间窗口（CHAT_UNREAD_FLUSH_MS）内的多次变更先在进程内合并，
+  由后台协程用一条 upsert（executemany）批量写入：连续收到 20 条消息只写一次 +20，
+  「+1 后立即已读」合并成一次清零
+- 清零只抵消 id <= 已读消息id 的递增，窗口内晚到的新消息仍计入未读
+- 清零时已读位置覆盖 last_message_id 则直接写入窗口内的未读数，
+  否则（客户端只读到较早的消息，之前窗口落库的未读里还有更新的消息）按已读位置重新统计房间内对方的消息数
+- binding_list / contacted_trips 通过 unread_counts() 一次查询取出所有房间的未读数，
+  并叠加尚未落库的变更
+- 计数在数据库中做原子加法，多 worker 部署下各进程独立合并、互不覆盖；
+  另一进程已先落库了更靠后的已读位置时（本进程的 +1 晚到），递增改为按已读位置重新统计，不会留下已读消息的未读数
+"""
+import atexit
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingState:
+    """某 (用户, 房间) 尚未落库的变更"""
+    __slots__ = ('reset', 'last_read_id', 'bumped_ids')
+
+    def __init__(self):
+        self.reset = False          # True：落库时按 last_read_id 重置未读数；False：在原值上累加
+        self.last_read_id = 0
+        self.bumped_ids = []        # 本窗口内计入未读的消息id
+
+    def merge_older(self, older):
+        """把更早（落库失败放回）的变更合并到当前变更之前"""
+        if self.reset:
+            return
+        self.bumped_ids = older.bumped_ids + self.bumped_ids
+        self.reset = older.reset
+        self.last_read_id = max(self.last_read_id, older.last_read_id)
+
+
+class UnreadCounter:
+    """聊天未读计数：进程内合并 + 后台批量 upsert"""
+
+    def __init__(self):
+        self.app = None
+        self.socketio = None
+        self.flush_interval = 1.0
+
+        self._pending = {}          # (user_id, room_id) -> _PendingState
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._started = False
+        self._atexit_registered = False
+
+        # 统计信息
+        self._bumps = 0
+        self._resets = 0
+        self._flushed_rows = 0
+        self._flush_count = 0
+        self._flush_errors = 0
+        self._last_error = None
+
+    def init_app(self, app, socketio):
+        self.app = app
+        self.socketio = socketio
+        self.flush_interval = app.config.get('CHAT_UNREAD_FLUSH_MS', 1000) / 1000.0
+        self._pending = {}
+        app.extensions['chat_unread'] = self
+        if not self._atexit_registered:
+            # 进程正常退出时把未落库的计数写入数据库（每个实例只注册一次，多次 init_app 不重复）
+            atexit.register(self.flush)
+            self._atexit_registered = True
+
+    # --------------------------
+    # 写入
+    # --------------------------
+    def bump(self, room_id, message_id, recipient_ids):
+        """房间有新消息：给接收方各 +1"""
+        room_id = str(room_id)
+        self._ensure_started()
+        with self._lock:
+            for user_id in recipient_ids:
+                state = self._pending.get((user_id, room_id))
+                if state is None:
+                    state = self._pending[(user_id, room_id)] = _PendingState()
+                state.bumped_ids.append(message_id)
+                self._bumps += 1
+
+    def mark_read(self, user_id, room_id, last_read_id):
+        """用户已读到 last_read_id：清零（窗口内 id 更大的消息仍计为未读）"""
+        room_id = str(room_id)
+        self._ensure_started()
+        with self._lock:
+            state = self._pending.get((user_id, room_id))
+            if state is None:
+                state = self._pending[(user_id, room_id)] = _PendingState()
+            state.reset = True
+            state.last_read_id = max(state.last_read_id, last_read_id)
+            state.bumped_ids = [msg_id for msg_id in state.bumped_ids if msg_id > state.last_read_id]
+            self._resets += 1
+
+    def discard_rooms(self, room_ids):
+        """
+        绑定删除时清理对应房间的已读状态
+
+        只把删除语句加入当前会话，由调用方随绑定删除一起 commit。
+        """
+        from app import db
+        from app.models.chat import ChatReadState
+
+        room_ids = [str(room_id) for room_id in room_ids]
+        if not room_ids:
+            return
+        with self._lock:
+            for key in [key for key in self._pending if key[1] in room_ids]:
+                del self._pending[key]
+        ChatReadState.query.filter(ChatReadState.room_id.in_(room_ids)).delete(synchronize_session=False)
+
+    # --------------------------
+    # 后台批量写入
+    # --------------------------
+    def _ensure_started(self):
+        if self._started or self.socketio is None:
+            return
+        self._started = True
+        self.socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            self.socketio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:  # 后台协程不能因为单次失败退出
+                logger.exception('未读计数批量写入异常')
+
+    def flush(self):
+        """把合并后的变更写入数据库，返回写入行数"""
+        if self.app is None:
+            return 0
+
+        from app import db
+
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+
+            # 清零/递增都可能需要按已读位置重新统计消息数：先把写后队列中的消息落库
+            from app.utils.chat_writer import chat_writer
+            chat_writer.flush()
+
+            try:
+                with self.app.app_context():
+                    try:
+                        self._write(db, batch)
+                        db.session.commit()
+                    except Exception:
+                        db.session.rollback()
+                        raise
+            except Exception as e:
+                # 合并回待写队列（放在落库失败期间新产生的变更之前），下一轮重试
+                with self._lock:
+                    for key, older in batch.items():
+                        newer = self._pending.get(key)
+                        if newer is None:
+                            self._pending[key] = older
+                        else:
+                            newer.merge_older(older)
+                self._flush_errors += 1
+                self._last_error = str(e)
+                logger.warning('未读计数批量写入失败，%d 行将重试：%s', len(batch), e)
+                return 0
+
+            self._flush_count += 1
+            self._flushed_rows += len(batch)
+            return len(batch)
+
+    def _write(self, db, batch):
+        from sqlalchemy import bindparam, case, func, literal_column, select
+        from app.models.chat import ChatMessage, ChatReadState
+
+        now = datetime.now()
+        resets, increments = [], []
+        for (user_id, room_id), state in batch.items():
+            row = {
+                'user_id': user_id,
+                'room_id': room_id,
+                'unread_count': len(state.bumped_ids),
+                'last_read_message_id': state.last_read_id,
+                'last_message_id': max(state.bumped_ids, default=0),
+                'updated_at': now
+            }
+            if state.reset:
+                resets.append(row)
+            else:
+                # 本窗口最早的递增：已读位置不小于它时（其他进程先落库了已读）需要重新统计
+                increments.append(dict(row, first_bumped_id=min(state.bumped_ids, default=0)))
+
+        dialect = db.engine.dialect.name
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        elif dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            self._write_fallback(db, resets, increments)
+            return
+
+        table = ChatReadState.__table__
+        stmt = insert(table)
+        excluded = stmt.excluded
+        last_message_id = case(
+            (excluded.last_message_id > table.c.last_message_id, excluded.last_message_id),
+            else_=table.c.last_message_id
+        )
+
+        def recount(use_excluded_read_id):
+            """
+            房间内对方发送的、id 大于已读位置的消息数（已读位置取 upsert 后的值）
+
+            子查询直接按列名引用正在 upsert 的行：用 Column 对象会被当成子查询自己的 FROM，
+            统计成整张表的交叉连接。
+            """
+            stored = literal_column(f'{table.name}.last_read_message_id')
+            read_id = stored
+            if use_excluded_read_id:
+                incoming = literal_column('excluded.last_read_message_id')
+                read_id = case((incoming > stored, incoming), else_=stored)
+            return select(func.count()).where(
+                ChatMessage.room_id == literal_column('excluded.room_id'),
+                ChatMessage.sender_id != literal_column('excluded.user_id'),
+                ChatMessage.id > read_id
+            ).scalar_subquery()
+
+        if resets:
+            last_read_id = case(
+                (excluded.last_read_message_id > table.c.last_read_message_id, excluded.last_read_message_id),
+                else_=table.c.last_read_message_id
+            )
+            # 已读位置没有覆盖之前落库的未读：按已读位置重新统计房间内对方的消息数
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['user_id', 'room_id'],
+                set_={
+                    'unread_count': case(
+                        (last_read_id >= table.c.last_message_id, excluded.unread_count),
+                        else_=recount(use_excluded_read_id=True)
+                    ),
+                    'last_read_message_id': last_read_id,
+                    'last_message_id': last_message_id,
+                    'updated_at': excluded.updated_at
+                }
+            ), resets)
+        if increments:
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['user_id', 'room_id'],
+                set_={
+                    # 已读位置已越过本窗口的递增（其他进程的 mark_read 先落库）：按已读位置重新统计
+                    'unread_count': case(
+                        (table.c.last_read_message_id < bindparam('first_bumped_id'),
+                         table.c.unread_count + excluded.unread_count),
+                        else_=recount(use_excluded_read_id=False)
+                    ),
+                    'last_message_id': last_message_id,
+                    'updated_at': excluded.updated_at
+                }
+            ), increments)
+
+    def _write_fallback(self, db, resets, increments):
+        """不支持 upsert 的数据库：逐行读改写（同一事务内）"""
+        from app.models.chat import ChatReadState
+
+        for row, is_reset in [(row, True) for row in resets] + [(row, False) for row in increments]:
+            first_bumped_id = row.pop('first_bumped_id', None)
+            state = ChatReadState.query.filter_by(user_id=row['user_id'], room_id=row['room_id']).first()
+            if state is None:
+                db.session.add(ChatReadState(**row))
+            elif is_reset:
+                state.last_read_message_id = max(state.last_read_message_id, row['last_read_message_id'])
+                if state.last_read_message_id >= state.last_message_id:
+                    state.unread_count = row['unread_count']
+                else:
+                    state.unread_count = self._count_after(db, row['user_id'], row['room_id'],
+                                                           state.last_read_message_id)
+                state.last_message_id = max(state.last_message_id, row['last_message_id'])
+                state.updated_at = row['updated_at']
+            else:
+                if state.last_read_message_id < first_bumped_id:
+                    state.unread_count += row['unread_count']
+                else:
+                    state.unread_count = self._count_after(db, row['user_id'], row['room_id'],
+                                                           state.last_read_message_id)
+                state.last_message_id = max(state.last_message_id, row['last_message_id'])
+                state.updated_at = row['updated_at']
+
+    @staticmethod
+    def _count_after(db, user_id, room_id, last_read_id):
+        """房间内对方发送的、id 大于 last_read_id 的已落库消息数"""
+        from sqlalchemy import func
+        from app.models.chat import ChatMessage
+
+        return db.session.query(func.count(ChatMessage.id)).filter(
+            ChatMessage.room_id == room_id,
+            ChatMessage.sender_id != user_id,
+            ChatMessage.id > last_read_id
+        ).scalar()
+
+    # --------------------------
+    # 读取 / 统计
+    # --------------------------
+    def unread_counts(self, user_id, room_ids) -> dict:
+        """
+        一次查询取出用户在多个房间的未读数（叠加尚未落库的变更）
+
+        Returns:
+            dict: {room_id(str): unread_count}，没有未读的房间为 0
+        """
+        from app import db
+        from app.models.chat import ChatReadState
+
+        room_ids = [str(room_id) for room_id in room_ids]
+        if not room_ids:
+            return {}
+        counts = dict.fromkeys(room_ids, 0)
+        rows = db.session.query(
+            ChatReadState.room_id, ChatReadState.unread_count, ChatReadState.last_message_id
+        ).filter(
+            ChatReadState.user_id == user_id,
+            ChatReadState.room_id.in_(room_ids)
+        ).all()
+        counts.update({room_id: unread for room_id, unread, _ in rows})
+        flushed_ids = {room_id: last_message_id for room_id, _, last_message_id in rows}
+
+        recounts = {}
+        with self._lock:
+            for room_id in room_ids:
+                state = self._pending.get((user_id, room_id))
+                if state is None:
+                    continue
+                if not state.reset:
+                    counts[room_id] += len(state.bumped_ids)
+                elif state.last_read_id >= flushed_ids.get(room_id, 0):
+                    counts[room_id] = len(state.bumped_ids)
+                else:
+                    recounts[room_id] = state.last_read_id
+
+        # 待落库的清零没有覆盖已落库的未读（少见）：按已读位置重新统计，含写后队列中尚未落库的消息
+        if recounts:
+            from app.utils.chat_writer import chat_writer
+            for room_id, last_read_id in recounts.items():
+                counts[room_id] = self._count_after(db, user_id, room_id, last_read_id) + sum(
+                    1 for row in chat_writer.pending_messages(room_id)
+                    if row['id'] > last_read_id and row['sender_id'] != user_id
+                )
+        return counts
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending_rows = len(self._pending)
+        return {
+            'pending_rows': pending_rows,
+            'flush_interval_ms': self.flush_interval * 1000,
+            'bumps': self._bumps,
+            'resets': self._resets,
+            'flushed_rows': self._flushed_rows,
+            'flush_count': self._flush_count,
+            'coalesce_ratio': round((self._bumps + self._resets) / self._flushed_rows, 2)
+            if self._flushed_rows else 0.0,
+            'flush_errors': self._flush_errors,
+            'last_error': self._last_error
+        }
+
+
+# 全局实例（在 create_app 中初始化）
+chat_unread = UnreadCounter()
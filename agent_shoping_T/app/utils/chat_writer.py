@@ -0,0 +1,282 @@
+# app/utils/chat_writer.py
+"""
+聊天消息写后缓冲（write-behind）
+
+send_message 不再每条消息单独 commit（SQLite 每次 commit 都是一次 fsync，且会串行化所有发送者），
+而是先在进程内分配消息id、立即广播，再由后台协程按「每 N 毫秒 或 每 M 条」批量写入一个事务。
+
+- CHAT_WRITE_BEHIND=False 时退回同步模式（每条消息立即 commit）
+- 尚未落库的消息通过 pending_messages() 对历史查询可见，重连/翻页不会漏消息
+- 进程退出时（atexit / run.py 的 finally）会把队列中剩余消息全部写入
+- 批量写入失败时整批放回队首重试；连续失败 CHAT_FLUSH_MAX_RETRIES 次后对半拆分写入，
+  定位出无法写入的单条消息并丢弃（记录日志），其余消息照常落库
+- 多 worker 部署（SOCKETIO_WORKERS > 1）一律同步写入，由数据库分配id：各 worker 独立攒批提交时，
+  较大的id可能先于较小的id落库，客户端按 since_id 增量同步会永久跳过较小的那条；
+  同步写入保证消息广播时已提交、且已提交的id连续递增
+- 消息id取热表与归档表（ChatArchive.last_message_id）中最大已用id + 1：归档会删除热表中的消息，
+  若只看热表（或依赖 SQLite rowid 的 max+1），最新消息被归档后新消息会复用旧id
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+
+from flask_socketio import SocketIO
+
+logger = logging.getLogger(__name__)
+
+
+def _next_message_id():
+    """下一个消息id：热表与归档表中最大已用id + 1（两边都走索引取最大值）"""
+    from sqlalchemy import case, func, select
+    from app.models.chat import ChatMessage, ChatArchive
+
+    live = select(func.coalesce(func.max(ChatMessage.id), 0)).scalar_subquery()
+    archived = select(func.coalesce(func.max(ChatArchive.last_message_id), 0)).scalar_subquery()
+    return case((live > archived, live), else_=archived) + 1
+
+
+class ChatWriteBehind:
+    """聊天消息批量持久化队列"""
+
+    def __init__(self):
+        self.app = None
+        self.socketio = None
+        self.enabled = False
+        self.flush_interval = 0.2
+        self.batch_size = 100
+        self.max_retries = 3
+
+        self._pending = deque()     # 等待写入的消息
+        self._inflight = []         # 正在写入（尚未 commit）的消息，对读仍可见
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._next_id = None
+        self._retries = 0           # 队首批次已连续失败的次数
+        self._started = False
+        self._atexit_registered = False
+
+        # 统计信息
+        self._flushed_messages = 0
+        self._flush_count = 0
+        self._flush_errors = 0
+        self._dropped_messages = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+        self._last_error = None
+
+    def init_app(self, app, socketio: SocketIO):
+        self.app = app
+        self.socketio = socketio
+        self.enabled = bool(app.config.get('CHAT_WRITE_BEHIND', True))
+        self.flush_interval = app.config.get('CHAT_FLUSH_INTERVAL_MS', 200) / 1000.0
+        self.batch_size = max(1, int(app.config.get('CHAT_FLUSH_BATCH_SIZE', 100)))
+        self.max_retries = max(0, int(app.config.get('CHAT_FLUSH_MAX_RETRIES', 3)))
+        self._next_id = None        # 下次分配时按当前数据库重新取起点
+        self._retries = 0
+        app.extensions['chat_writer'] = self
+
+        if self.enabled and app.config.get('SOCKETIO_WORKERS', 1) > 1:
+            # 多进程下各自攒批提交，已广播的较大id可能先于较小id落库，增量同步会漏消息
+            logger.info('多进程部署下写后缓冲无法保证消息按id顺序落库，已退回同步写入')
+            self.enabled = False
+
+        if self.enabled and not self._atexit_registered:
+            # 进程正常退出时把队列中剩余的消息写入数据库（每个实例只注册一次，多次 init_app 不重复）
+            atexit.register(self.flush)
+            self._atexit_registered = True
+
+    # --------------------------
+    # 写入
+    # --------------------------
+    def save(self, room_id, sender_id, sender_name, content, created_at) -> dict:
+        """
+        保存一条聊天消息，返回带 id 的消息行（dict）
+
+        同步模式下立即 commit；写后模式下只入队，由后台协程批量写入。
+        同步模式的数据库异常会直接抛出，由调用方回滚并提示。
+        """
+        row = {
+            'room_id': room_id,
+            'sender_id': sender_id,
+            'sender_name': sender_name,
+            'content': content,
+            'created_at': created_at
+        }
+
+        if not self.enabled:
+            return self._save_now(row)
+
+        self._ensure_started()
+        with self._lock:
+            row['id'] = self._allocate_id()
+            self._pending.append(row)
+            queue_depth = len(self._pending)
+
+        # 攒够一批立即唤醒后台协程，不必等到下一个时间窗口
+        if queue_depth >= self.batch_size:
+            self._wakeup.set()
+        return row
+
+    def _save_now(self, row):
+        """INSERT ... SELECT 在一条语句内取下一个id并写入，多进程并发写入也不会分到同一个id"""
+        from sqlalchemy import insert, literal, select
+        from app import db
+        from app.models.chat import ChatMessage
+
+        columns = ChatMessage.__table__.c
+        stmt = insert(ChatMessage).from_select(
+            ['id', *row],
+            select(_next_message_id(), *[literal(value, columns[key].type) for key, value in row.items()])
+        ).returning(ChatMessage.id)
+        new_id = db.session.execute(stmt).scalar_one()
+        db.session.commit()
+        row['id'] = new_id
+        return row
+
+    def _allocate_id(self):
+        """分配消息id（首次从数据库当前最大已用id开始递增，调用方需持有 _lock）"""
+        if self._next_id is None:
+            from sqlalchemy import select
+            from app import db
+
+            with self.app.app_context():
+                self._next_id = db.session.execute(select(_next_message_id())).scalar_one()
+
+        new_id = self._next_id
+        self._next_id += 1
+        return new_id
+
+    # --------------------------
+    # 后台批量写入
+    # --------------------------
+    def _ensure_started(self):
+        if self._started:
+            return
+        self._started = True
+        self.socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:  # 后台协程不能因为单次失败退出
+                logger.exception('聊天消息批量写入异常')
+
+    def flush(self):
+        """把队列中的消息写入数据库，返回本次写入条数"""
+        if self.app is None:
+            return 0
+
+        written = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        break
+                    batch = [self._pending.popleft()
+                             for _ in range(min(self.batch_size, len(self._pending)))]
+                    self._inflight = batch
+
+                started = time.perf_counter()
+                try:
+                    self._insert(batch)
+                    count = len(batch)
+                    self._retries = 0
+                except Exception as e:
+                    self._flush_errors += 1
+                    self._last_error = str(e)
+                    self._retries += 1
+                    if self._retries <= self.max_retries:
+                        # 放回队首，等待下一轮重试
+                        with self._lock:
+                            self._pending.extendleft(reversed(batch))
+                            self._inflight = []
+                        logger.warning('聊天消息批量写入失败，%d 条消息将重试（第 %d/%d 次）：%s',
+                                       len(batch), self._retries, self.max_retries, e)
+                        break
+                    # 重试用尽：二分定位无法写入的消息并丢弃，其余照常写入，避免一条坏数据堵住整个队列
+                    logger.error('聊天消息批量写入连续失败 %d 次，二分定位无法写入的消息：%s', self._retries, e)
+                    self._retries = 0
+                    count = self._insert_bisecting(batch)
+
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                with self._lock:
+                    self._inflight = []
+                self._flush_count += 1
+                self._flushed_messages += count
+                self._last_flush_ms = elapsed_ms
+                self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+                self._total_flush_ms += elapsed_ms
+                written += count
+        return written
+
+    def _insert(self, rows):
+        """一个事务内 executemany 批量插入"""
+        from sqlalchemy import insert
+        from app import db
+        from app.models.chat import ChatMessage
+
+        with self.app.app_context():
+            try:
+                db.session.execute(insert(ChatMessage), rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def _insert_bisecting(self, rows):
+        """对半拆分写入，直到定位出单条无法写入的消息并丢弃（记录日志），返回写入条数"""
+        try:
+            self._insert(rows)
+            return len(rows)
+        except Exception as e:
+            if len(rows) == 1:
+                row = rows[0]
+                self._dropped_messages += 1
+                logger.error('聊天消息无法写入，已丢弃：id=%s 房间=%s 发送者=%s：%s',
+                             row.get('id'), row.get('room_id'), row.get('sender_id'), e)
+                return 0
+        middle = len(rows) // 2
+        return self._insert_bisecting(rows[:middle]) + self._insert_bisecting(rows[middle:])
+
+    # --------------------------
+    # 读取 / 统计
+    # --------------------------
+    def pending_messages(self, room_id):
+        """返回该房间尚未落库的消息（按 id 升序）"""
+        if not self.enabled:
+            return []
+        with self._lock:
+            rows = [row for row in self._inflight if row['room_id'] == room_id]
+            rows.extend(row for row in self._pending if row['room_id'] == room_id)
+        return rows
+
+    def stats(self) -> dict:
+        with self._lock:
+            queue_depth = len(self._pending)
+            inflight = len(self._inflight)
+        return {
+            'mode': 'write_behind' if self.enabled else 'sync',
+            'queue_depth': queue_depth,
+            'inflight': inflight,
+            'flush_interval_ms': self.flush_interval * 1000,
+            'batch_size': self.batch_size,
+            'flushed_messages': self._flushed_messages,
+            'flush_count': self._flush_count,
+            'flush_errors': self._flush_errors,
+            'dropped_messages': self._dropped_messages,
+            'last_flush_ms': round(self._last_flush_ms, 3),
+            'max_flush_ms': round(self._max_flush_ms, 3),
+            'avg_flush_ms': round(self._total_flush_ms / self._flush_count, 3) if self._flush_count else 0.0,
+            'last_error': self._last_error
+        }
+
+
+# 全局实例（在 create_app 中初始化）
+chat_writer = ChatWriteBehind()
@@ -0,0 +1,261 @@
+# app/utils/chunked_upload.py
+"""
+商品图片分块上传（可断点续传）
+
+整文件表单上传会先把请求体整个缓冲下来，移动网络断开后只能从头再传。这里改为：
+1. 创建上传会话（文件名、总大小）-> upload_id
+2. 按偏移量逐块 PATCH 原始字节（请求头 Upload-Offset），每块以 64KB 为单位从请求流直接追加到临时文件，
+   同时增量计算 sha256；请求内存占用与图片大小无关
+3. 断线后 GET 会话取得服务端已收到的偏移量，从该位置继续上传
+4. 全部收到后先按 image_store 的规则校验图片内容（格式不对或已损坏则删除会话，返回 415），
+   再按内容哈希入库（扩展名取自识别出的格式），并关联到 ShoppingInfo
+
+- 已收到的偏移量即临时文件大小，会话元数据是同目录下的一个 JSON 文件，不占数据库
+- 哈希对象保存在进程内；进程重启或续传落到其他 worker 时，从临时文件重新计算一次
+- 超过 CHUNKED_UPLOAD_EXPIRE_HOURS 未完成的会话由 `flask uploads-cleanup` 清理
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import click
+from flask.cli import with_appcontext
+
+_READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """上传会话错误（附带 HTTP 状态码；偏移量不一致时附带服务端当前偏移量）"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.offset = offset
+
+
+class ChunkedUploads:
+    """分块上传会话管理"""
+
+    def __init__(self):
+        self.upload_dir = None
+        self.chunk_size = 1024 * 1024
+        self.max_size = 32 * 1024 * 1024
+        self.expire_seconds = 24 * 3600
+
+        self._hashers = {}          # upload_id -> (已计算到的偏移量, sha256 对象)
+        self._locks = {}            # upload_id -> 追加写锁（同一会话的块串行写入）
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.upload_dir = os.path.join(app.config['UPLOAD_FOLDER'], '.tmp', 'chunked')
+        self.chunk_size = int(app.config.get('CHUNKED_UPLOAD_CHUNK_SIZE', 1024 * 1024))
+        self.max_size = int(app.config.get('CHUNKED_UPLOAD_MAX_SIZE', 32 * 1024 * 1024))
+        self.expire_seconds = int(app.config.get('CHUNKED_UPLOAD_EXPIRE_HOURS', 24)) * 3600
+        app.extensions['chunked_uploads'] = self
+
+    # --------------------------
+    # 会话
+    # --------------------------
+    def _paths(self, upload_id):
+        base = os.path.join(self.upload_dir, upload_id)
+        return base + '.part', base + '.json'
+
+    def _load(self, upload_id, user_id):
+        """读取会话元数据，校验归属（upload_id 必须是 create 生成的 32 位小写十六进制形式）"""
+        try:
+            canonical = uuid.UUID(hex=upload_id).hex == upload_id
+        except (TypeError, ValueError, AttributeError):
+            canonical = False
+        if not canonical:
+            raise UploadError('上传会话不存在', 404)
+        data_path, meta_path = self._paths(upload_id)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            raise UploadError('上传会话不存在或已过期', 404)
+        if meta['user_id'] != user_id:
+            raise UploadError('上传会话不存在', 404)
+        meta['offset'] = os.path.getsize(data_path) if os.path.exists(data_path) else 0
+        return meta
+
+    def create(self, user_id, filename, size):
+        """创建上传会话，返回会话信息"""
+        try:
+            size = int(size)
+        except (TypeError, ValueError):
+            raise UploadError('请提供文件大小')
+        if size <= 0:
+            raise UploadError('文件为空')
+        if size > self.max_size:
+            raise UploadError(f'文件过大（最大 {self.max_size // (1024 * 1024)}MB）', 413)
+
+        os.makedirs(self.upload_dir, exist_ok=True)
+        upload_id = uuid.uuid4().hex
+        data_path, meta_path = self._paths(upload_id)
+        meta = {
+            'upload_id': upload_id,
+            'user_id': user_id,
+            'filename': os.path.basename(filename or '')[:100],
+            'size': size,
+            'created_at': time.time()
+        }
+        open(data_path, 'wb').close()
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        return dict(meta, offset=0, chunk_size=self.chunk_size)
+
+    def status(self, upload_id, user_id):
+        """会话当前状态（续传时据此决定从哪个偏移量继续）"""
+        meta = self._load(upload_id, user_id)
+        return dict(meta, chunk_size=self.chunk_size)
+
+    @contextmanager
+    def _locked_session(self, upload_id, user_id):
+        """
+        持有会话的追加写锁并读取元数据（同一会话的块串行写入）
+
+        先校验会话存在且属于当前用户再创建锁，无效的 upload_id 不会在进程内留下锁；
+        等锁期间会话被完成或清理时，移除该锁。
+        """
+        self._load(upload_id, user_id)
+        with self._lock:
+            lock = self._locks.setdefault(upload_id, threading.Lock())
+        with lock:
+            try:
+                meta = self._load(upload_id, user_id)
+            except UploadError:
+                self._forget(upload_id)
+                raise
+            yield meta
+
+    def append(self, upload_id, user_id, offset, stream, content_length):
+        """
+        在 offset 处追加一块（从请求流边读边写，不整体缓冲）
+
+        Returns:
+            dict: 会话状态（offset 为追加后的偏移量）
+        """
+        try:
+            offset = int(offset)
+        except (TypeError, ValueError):
+            raise UploadError('缺少 Upload-Offset 请求头')
+        if content_length is None:
+            raise UploadError('缺少 Content-Length 请求头', 411)
+        if content_length > self.chunk_size:
+            raise UploadError(f'单块不能超过 {self.chunk_size} 字节', 413)
+
+        with self._locked_session(upload_id, user_id) as meta:
+            if offset != meta['offset']:
+                raise UploadError('偏移量与服务端不一致', 409, offset=meta['offset'])
+            if offset + content_length > meta['size']:
+                raise UploadError('数据超出声明的文件大小', 413, offset=meta['offset'])
+
+            hasher = self._hasher(upload_id, offset)
+            data_path, _ = self._paths(upload_id)
+            written = 0
+            with open(data_path, 'ab') as f:
+                try:
+                    while written < content_length:
+                        chunk = stream.read(min(_READ_SIZE, content_length - written))
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        hasher.update(chunk)
+                        written += len(chunk)
+                finally:
+                    # 连接中断时已写入的部分保留，下次从新的偏移量续传
+                    with self._lock:
+                        self._hashers[upload_id] = (offset + written, hasher)
+            meta['offset'] = offset + written
+            return dict(meta, chunk_size=self.chunk_size)
+
+    def _hasher(self, upload_id, offset):
+        """取得已计算到 offset 的哈希对象；进程内没有时从临时文件重新计算"""
+        with self._lock:
+            cached = self._hashers.get(upload_id)
+        if cached is not None and cached[0] == offset:
+            return cached[1]
+
+        hasher = hashlib.sha256()
+        data_path, _ = self._paths(upload_id)
+        with open(data_path, 'rb') as f:
+            while True:
+                chunk = f.read(_READ_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+        return hasher
+
+    def finish(self, upload_id, user_id):
+        """
+        上传完成：按内容哈希入库（引用数 +1，由调用方随商品一起 commit），删除会话
+
+        Returns:
+            str: 写入 ShoppingInfo.product_image 的文件名
+
+        Raises:
+            UploadError: 未传完（409）；内容不是允许的图片格式（415，会话已删除）
+        """
+        from app.utils.image_store import image_store, InvalidImage, IMAGE_FORMATS
+
+        with self._locked_session(upload_id, user_id) as meta:
+            if meta['offset'] != meta['size']:
+                raise UploadError('文件尚未上传完成', 409, offset=meta['offset'])
+            data_path, meta_path = self._paths(upload_id)
+            try:
+                with open(data_path, 'rb') as f:
+                    image_format = image_store.detect_format(f)
+            except InvalidImage as e:
+                # 内容不是允许的图片：丢弃会话，不进入图片存储
+                os.remove(data_path)
+                os.remove(meta_path)
+                self._forget(upload_id)
+                raise UploadError(str(e), 415)
+            hasher = self._hasher(upload_id, meta['offset'])
+            filename = image_store.store_file(data_path, hasher.hexdigest(), IMAGE_FORMATS[image_format][0])
+            os.remove(meta_path)
+            self._forget(upload_id)
+        return filename
+
+    def _forget(self, upload_id):
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+            self._locks.pop(upload_id, None)
+
+    def cleanup(self):
+        """删除过期未完成的会话，返回删除数"""
+        if not self.upload_dir or not os.path.isdir(self.upload_dir):
+            return 0
+        removed = 0
+        deadline = time.time() - self.expire_seconds
+        for name in os.listdir(self.upload_dir):
+            if not name.endswith('.json'):
+                continue
+            upload_id = name[:-len('.json')]
+            data_path, meta_path = self._paths(upload_id)
+            last_write = max(os.path.getmtime(path) for path in (data_path, meta_path) if os.path.exists(path))
+            if last_write >= deadline:
+                continue
+            for path in (data_path, meta_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._forget(upload_id)
+            removed += 1
+        return removed
+
+
+# 全局实例（在 create_app 中初始化）
+chunked_uploads = ChunkedUploads()
+
+
+@click.command('uploads-cleanup')
+@with_appcontext
+def cleanup_uploads_command():
+    """清理过期未完成的分块上传会话"""
+    click.echo(f'已清理 {chunked_uploads.cleanup()} 个过期上传会话')
@@ -0,0 +1,122 @@
+# app/utils/demand_feed.py
+"""
+购物圈物化表（OpenDemandFeed）维护
+
+购物圈页面的数据只在以下写操作后变化，读远多于写，因此在写时维护一张反范式表：
+- 买家提交/更新购物圈、添加/删除商品（shopping.shopping_info）
+- 绑定创建/删除（binding 路由、删除代购行程时级联删除绑定）
+- 用户切换身份（代购用户的购物圈不展示）
+
+写操作在 commit 之前调用 refresh_buyer_feed(买家ID)，物化行与业务数据在同一事务内提交或回滚。
+物化表只在建表时自动初始化；与源数据不一致时（如直接改库），用 `flask demand-feed-rebuild` 重建。
+"""
+import json
+import logging
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import exists
+
+from app import db
+from app.models.binding import Binding
+from app.models.shopping import ShoppingCircle, ShoppingInfo, OpenDemandFeed
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+def _product_snapshot(products):
+    """商品列表 -> 模板所需字段的快照"""
+    return [
+        {
+            'id': product.id,
+            'serial_number': product.serial_number,
+            'product_name': product.product_name,
+            'price_cents': product.price_cents,
+            'product_image': product.product_image,
+            'description': product.description
+        }
+        for product in products
+    ]
+
+
+def _fill_row(row, user, circle, products):
+    snapshot = _product_snapshot(products)
+    row.circle_id = circle.id
+    row.user_id = user.id
+    row.username = user.username
+    row.phone = user.phone
+    row.submit_time = circle.submit_time or datetime.utcnow()
+    row.total_price_cents = circle.total_price_cents
+    row.product_count = len(snapshot)
+    row.thumbnail = next((item['product_image'] for item in snapshot if item['product_image']), None)
+    row.products_json = json.dumps(snapshot, ensure_ascii=False)
+    row.updated_at = datetime.now()
+
+
+def refresh_buyer_feed(user_ids):
+    """
+    重新计算这些买家在物化表中的行（开放则写入/更新，否则删除）
+
+    只修改当前会话，不提交；由调用方随业务写操作一起 commit。
+    """
+    for user_id in set(user_ids):
+        row = OpenDemandFeed.query.filter_by(user_id=user_id).first()
+        user = db.session.get(User, user_id)
+        circle = ShoppingCircle.query.filter_by(user_id=user_id).first()
+        is_open = (
+            user is not None and user.is_agent == False and circle is not None
+            and not db.session.query(exists().where(Binding.buyer_id == user_id)).scalar()
+        )
+
+        if not is_open:
+            if row is not None:
+                db.session.delete(row)
+            continue
+
+        products = ShoppingInfo.query.filter_by(user_id=user_id).order_by(ShoppingInfo.id).all()
+        if row is None:
+            row = OpenDemandFeed()
+            db.session.add(row)
+        _fill_row(row, user, circle, products)
+
+
+def rebuild_demand_feed():
+    """按源数据全量重建物化表，返回开放购物圈数"""
+    from app.utils.feed_queries import open_circles_query
+
+    try:
+        OpenDemandFeed.query.delete(synchronize_session=False)
+        count = 0
+        for circle in open_circles_query().order_by(ShoppingCircle.id):
+            row = OpenDemandFeed()
+            products = sorted(circle.user.shopping_info, key=lambda product: product.id)
+            _fill_row(row, circle.user, circle, products)
+            db.session.add(row)
+            count += 1
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return count
+
+
+def ensure_demand_feed():
+    """
+    物化表刚创建时（新库，或旧库升级时删除重建）从源数据初始化一次
+
+    由 ensure_schema 在建表后调用；表已存在时不检查、不重建（物化表为空也可能是没有开放的购物圈，
+    每次启动都检查会让多个 worker 同时重建）。其他情况用 `flask demand-feed-rebuild` 重建。
+    """
+    if ShoppingCircle.query.first() is not None:
+        count = rebuild_demand_feed()
+        logger.info('购物圈物化表已初始化：%d 个开放购物圈', count)
+
+
+@click.command('demand-feed-rebuild')
+@with_appcontext
+def rebuild_demand_feed_command():
+    """按源数据重建购物圈物化表（OpenDemandFeed）"""
+    count = rebuild_demand_feed()
+    click.echo(f'购物圈物化表已重建：{count} 个开放购物圈')
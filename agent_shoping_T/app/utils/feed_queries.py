@@ -0,0 +1,223 @@
+# app/utils/feed_queries.py
+"""
+购物圈 / 代购圈列表查询
+
+原实现对每个用户各查一次购物圈、绑定、商品（3N+1 条 SQL），这里改为固定条数的查询：
+- 「未被绑定」用 NOT EXISTS 反连接在 SQL 中过滤
+- 购物圈与买家一次 JOIN 取出，商品用 selectinload 一条 IN 查询批量加载
+- 购物圈页面进一步读取物化表 OpenDemandFeed（见 app.utils.demand_feed），单表索引扫描
+返回的数据结构与模板使用的保持一致。
+
+列表按 (时间, id) 倒序做游标（keyset）分页，不用 OFFSET：
+- 游标是上一页最后一行的 (时间, id)，编码为不透明字符串放在 ?cursor= 中
+- 价格区间、地点（前缀匹配，转换为索引可用的范围条件）、日期窗口全部下推到 SQL
+- 对应索引：OpenDemandFeed(submit_time, circle_id)、AgentInfo(is_submitted, time, id)、AgentInfo(location)
+"""
+import base64
+import json
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import exists, func, tuple_
+from sqlalchemy.orm import contains_eager, selectinload
+
+from app import db
+from app.models.agent import AgentInfo
+from app.models.binding import Binding
+from app.models.shopping import ShoppingCircle, OpenDemandFeed
+from app.models.user import User
+from app.utils.money import to_cents, from_cents
+
+# 地点前缀范围查询的上界后缀（大于任何常用字符）
+_PREFIX_UPPER = '\U0010ffff'
+
+
+# --------------------------
+# 参数解析
+# --------------------------
+def encode_cursor(time_value, row_id):
+    """(时间, id) -> 游标字符串"""
+    raw = f'{time_value.isoformat()}|{row_id}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """游标字符串 -> (时间, id)；非法游标按未传处理，返回 None"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        time_part, id_part = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(time_part), int(id_part)
+    except (ValueError, UnicodeError):
+        return None
+
+
+def _parse_price(value):
+    """价格筛选（元）-> 分"""
+    try:
+        return to_cents(value) if value not in (None, '') else None
+    except ValueError:
+        return None
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d') if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_feed_args(args):
+    """
+    校验列表筛选/分页参数（非法值按未传处理）
+
+    Returns:
+        dict: {min_price, max_price（单位：分）, location, date_from, date_to, cursor, limit}
+    """
+    default_size = current_app.config.get('FEED_PAGE_SIZE', 20)
+    max_size = current_app.config.get('FEED_MAX_PAGE_SIZE', 100)
+    try:
+        limit = int(args.get('limit') or default_size)
+    except (TypeError, ValueError):
+        limit = default_size
+    return {
+        'min_price': _parse_price(args.get('min_price')),
+        'max_price': _parse_price(args.get('max_price')),
+        'location': (args.get('location') or '').strip() or None,
+        'date_from': _parse_date(args.get('date_from')),
+        'date_to': _parse_date(args.get('date_to')),
+        'cursor': decode_cursor(args.get('cursor')),
+        'limit': max(1, min(limit, max_size))
+    }
+
+
+def filter_query_args(feed_args):
+    """筛选条件 -> URL 参数（用于「加载更多」链接和回填筛选表单）"""
+    values = {
+        'min_price': from_cents(feed_args['min_price']) if feed_args.get('min_price') is not None else None,
+        'max_price': from_cents(feed_args['max_price']) if feed_args.get('max_price') is not None else None,
+        'location': feed_args.get('location'),
+        'date_from': feed_args['date_from'].strftime('%Y-%m-%d') if feed_args.get('date_from') else None,
+        'date_to': feed_args['date_to'].strftime('%Y-%m-%d') if feed_args.get('date_to') else None
+    }
+    return {key: value for key, value in values.items() if value is not None}
+
+
+# --------------------------
+# 通用游标分页
+# --------------------------
+def _apply_date_window(query, column, feed_args):
+    if feed_args.get('date_from'):
+        query = query.filter(column >= feed_args['date_from'])
+    if feed_args.get('date_to'):
+        # 结束日期包含当天
+        query = query.filter(column < feed_args['date_to'] + timedelta(days=1))
+    return query
+
+
+def _keyset_page(query, time_column, id_column, feed_args, row_key):
+    """
+    按 (time_column, id_column) 倒序取一页
+
+    Returns:
+        tuple: (本页行列表, 下一页游标；没有更多时为 None)
+    """
+    cursor, limit = feed_args.get('cursor'), feed_args['limit']
+    if cursor is not None:
+        query = query.filter(tuple_(time_column, id_column) < cursor)
+    rows = query.order_by(time_column.desc(), id_column.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*row_key(rows[-1]))
+
+
+# --------------------------
+# 列表查询
+# --------------------------
+def open_circles_query():
+    """
+    开放购物圈：非代购用户已提交、且尚未与任何代购绑定的购物圈（NOT EXISTS 反连接）
+
+    买家随购物圈一次 JOIN 取出，商品用 selectinload 批量加载（共 2 条 SQL，与用户数无关）。
+    购物圈页面读取的是由此计算出的物化表 OpenDemandFeed，本查询用于重建/校对物化表。
+    """
+    has_binding = exists().where(Binding.buyer_id == User.id)
+    return ShoppingCircle.query \
+        .join(ShoppingCircle.user) \
+        .filter(User.is_agent == False, ~has_binding) \
+        .options(contains_eager(ShoppingCircle.user).selectinload(User.shopping_info))
+
+
+def _load_products(products_json):
+    """商品快照 -> 模板使用的字典（价格换算为元）"""
+    products = json.loads(products_json)
+    for product in products:
+        product['price'] = from_cents(product['price_cents'])
+    return products
+
+
+def open_shopping_feed(feed_args):
+    """
+    代购看到的购物圈：读取物化表 OpenDemandFeed，每页 1 条 SQL（按索引扫描，无 JOIN）
+
+    按提交时间倒序，可按总价区间、提交日期筛选。
+
+    Returns:
+        tuple: ([{"user", "circle_info", "products", "product_count", "thumbnail"}], 下一页游标)
+    """
+    query = OpenDemandFeed.query
+    if feed_args.get('min_price') is not None:
+        query = query.filter(OpenDemandFeed.total_price_cents >= feed_args['min_price'])
+    if feed_args.get('max_price') is not None:
+        query = query.filter(OpenDemandFeed.total_price_cents <= feed_args['max_price'])
+    query = _apply_date_window(query, OpenDemandFeed.submit_time, feed_args)
+
+    rows, next_cursor = _keyset_page(
+        query, OpenDemandFeed.submit_time, OpenDemandFeed.circle_id, feed_args,
+        row_key=lambda row: (row.submit_time, row.circle_id)
+    )
+    shopping_data = [
+        {
+            "user": {"id": row.user_id, "username": row.username, "phone": row.phone},
+            "circle_info": {"id": row.circle_id, "submit_time": row.submit_time,
+                            "total_price": from_cents(row.total_price_cents)},
+            "products": _load_products(row.products_json),
+            "product_count": row.product_count,
+            "thumbnail": row.thumbnail,
+        }
+        for row in rows
+    ]
+    return shopping_data, next_cursor
+
+
+def agent_feed(feed_args, require_itinerary=False):
+    """
+    已提交的代购行程（代购圈 / 代购列表）
+
+    按行程时间倒序，可按地点前缀、行程日期筛选。
+
+    Args:
+        require_itinerary: 代购圈只展示代购用户且行程描述非空的记录
+
+    Returns:
+        tuple: ([{"user": User, "agent_info": AgentInfo}], 下一页游标)
+    """
+    query = db.session.query(User, AgentInfo) \
+        .join(AgentInfo, User.id == AgentInfo.user_id) \
+        .filter(AgentInfo.is_submitted == True)
+
+    if require_itinerary:
+        query = query.filter(User.is_agent == True, func.trim(AgentInfo.itinerary, ' \t\r\n') != '')
+    if feed_args.get('location'):
+        # 前缀匹配改写成范围条件，可直接走 location 索引（LIKE 在 SQLite 下默认不走索引）
+        prefix = feed_args['location']
+        query = query.filter(AgentInfo.location >= prefix, AgentInfo.location < prefix + _PREFIX_UPPER)
+    query = _apply_date_window(query, AgentInfo.time, feed_args)
+
+    rows, next_cursor = _keyset_page(
+        query, AgentInfo.time, AgentInfo.id, feed_args,
+        row_key=lambda row: (row[1].time, row[1].id)
+    )
+    return [{"user": user, "agent_info": info} for user, info in rows], next_cursor
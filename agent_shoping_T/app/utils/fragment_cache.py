@@ -0,0 +1,238 @@
+# app/utils/fragment_cache.py
+"""
+页面片段缓存：购物圈/代购圈卡片中与浏览者无关的部分只渲染一次
+
+- 缓存键 = 片段类型 + 实体ID + 版本号；实体变化时版本号 +1，旧键自然失效（无需逐个删除）
+- 版本号由 SQLAlchemy 会话事件维护：after_flush 收集本事务改动的 AgentInfo / ShoppingCircle /
+  ShoppingInfo / Binding / User（以及购物圈物化表），after_commit 时把对应实体的版本号 +1（回滚则丢弃）
+- 一级缓存：进程内 LRU（按条数上限淘汰）
+- 二级缓存（可选）：配置 FRAGMENT_CACHE_REDIS_URL 后，渲染结果和版本号存入 Redis，多 worker 共享；
+  Redis 不可用时退回只用进程内缓存。列表页渲染前用 prefetch 一条 HMGET 取回整页卡片的版本号
+- 多 worker 部署（SOCKETIO_WORKERS > 1）必须配置 Redis：进程内版本号只在写入的 worker 上 +1，
+  其他 worker 会一直返回旧卡片；未配置时关闭片段缓存
+- 模板中调用 cached_fragment(类型, 实体ID, 模板, **上下文)，命中率与节省的渲染时间见 /ops/stats
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+logger = logging.getLogger(__name__)
+
+_REDIS_PREFIX = 'fragment'
+
+
+class FragmentCache:
+    """按 (类型, 实体ID, 版本) 缓存渲染好的 HTML 片段"""
+
+    def __init__(self):
+        self.enabled = False
+        self.max_entries = 2000
+        self.redis_ttl = 3600
+
+        self._entries = OrderedDict()   # 缓存键 -> HTML（末尾为最近使用）
+        self._versions = {}             # (类型, 实体ID) -> 版本号（未配置 Redis 时使用）
+        self._lock = threading.Lock()
+        self._redis = None
+        self._events_registered = False
+
+        # 统计信息
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.redis_errors = 0
+        self._render_ms_total = 0.0
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('FRAGMENT_CACHE_ENABLED', True))
+        self.max_entries = max(1, int(app.config.get('FRAGMENT_CACHE_MAX_ENTRIES', 2000)))
+        self.redis_ttl = int(app.config.get('FRAGMENT_CACHE_REDIS_TTL', 3600))
+
+        redis_url = app.config.get('FRAGMENT_CACHE_REDIS_URL', '')
+        if self.enabled and not redis_url and app.config.get('SOCKETIO_WORKERS', 1) > 1:
+            logger.info('多进程部署下片段缓存的版本号需要 Redis 在 worker 之间共享，未配置 FRAGMENT_CACHE_REDIS_URL，已关闭')
+            self.enabled = False
+        self._redis = None
+        if self.enabled and redis_url:
+            import redis
+            self._redis = redis.Redis.from_url(redis_url, socket_timeout=0.2)
+
+        app.jinja_env.globals['cached_fragment'] = self.render
+        app.extensions['fragment_cache'] = self
+        self._register_session_events()
+
+    # --------------------------
+    # 读取 / 渲染
+    # --------------------------
+    def render(self, kind, entity_id, template_name, **context):
+        """返回片段 HTML：命中缓存直接返回，否则渲染模板并写入缓存"""
+        from flask import render_template
+
+        if not self.enabled:
+            return Markup(render_template(template_name, **context))
+
+        key = f'{kind}:{entity_id}:{self._version(kind, entity_id)}'
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+
+        html = self._redis_get(key)
+        if html is not None:
+            self.redis_hits += 1
+        else:
+            started = time.perf_counter()
+            html = Markup(render_template(template_name, **context))
+            self._render_ms_total += (time.perf_counter() - started) * 1000
+            self.misses += 1
+            self._redis_set(key, html)
+
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return html
+
+    def prefetch(self, kind, entity_ids):
+        """
+        列表页渲染前一次取回本页全部卡片的版本号（一条 HMGET），保存在当前请求上
+
+        未配置 Redis 时版本号就在进程内，无需预取。
+        """
+        from flask import g
+
+        entity_ids = list(entity_ids)
+        if not self.enabled or self._redis is None or not entity_ids:
+            return
+        try:
+            values = self._redis.hmget(f'{_REDIS_PREFIX}:versions:{kind}', entity_ids)
+        except Exception:
+            self.redis_errors += 1
+            return
+        versions = g.setdefault('fragment_versions', {})
+        for entity_id, value in zip(entity_ids, values):
+            versions[(kind, entity_id)] = int(value or 0)
+
+    def _version(self, kind, entity_id):
+        if self._redis is not None:
+            from flask import g, has_request_context
+            if has_request_context():
+                version = g.get('fragment_versions', {}).get((kind, entity_id))
+                if version is not None:
+                    return version
+            try:
+                return int(self._redis.hget(f'{_REDIS_PREFIX}:versions:{kind}', entity_id) or 0)
+            except Exception:
+                self.redis_errors += 1
+        with self._lock:
+            return self._versions.get((kind, entity_id), 0)
+
+    def _redis_get(self, key):
+        if self._redis is None:
+            return None
+        try:
+            value = self._redis.get(f'{_REDIS_PREFIX}:html:{key}')
+        except Exception:
+            self.redis_errors += 1
+            return None
+        return Markup(value.decode('utf-8')) if value is not None else None
+
+    def _redis_set(self, key, html):
+        if self._redis is None:
+            return
+        try:
+            self._redis.set(f'{_REDIS_PREFIX}:html:{key}', str(html).encode('utf-8'), ex=self.redis_ttl)
+        except Exception:
+            self.redis_errors += 1
+
+    # --------------------------
+    # 失效
+    # --------------------------
+    def invalidate(self, kind, entity_id):
+        """实体已变化：版本号 +1（本进程与 Redis 同时更新）"""
+        with self._lock:
+            self._versions[(kind, entity_id)] = self._versions.get((kind, entity_id), 0) + 1
+            self.invalidations += 1
+        if self._redis is not None:
+            from flask import g, has_request_context
+            if has_request_context():
+                g.get('fragment_versions', {}).pop((kind, entity_id), None)
+            try:
+                self._redis.hincrby(f'{_REDIS_PREFIX}:versions:{kind}', entity_id, 1)
+            except Exception:
+                self.redis_errors += 1
+
+    def _register_session_events(self):
+        # 会话事件是全局的，多次 create_app 时只注册一次
+        if self._events_registered:
+            return
+        self._events_registered = True
+
+        from sqlalchemy import event
+        from sqlalchemy.orm import Session
+        from app.models import AgentInfo, Binding, ShoppingCircle, ShoppingInfo, User, OpenDemandFeed
+
+        # 模型 -> [(受影响的片段类型, 实体ID所在属性)]
+        dependencies = {
+            AgentInfo: [('agent_card', 'user_id')],
+            User: [('agent_card', 'id'), ('shopping_card', 'id')],
+            ShoppingCircle: [('shopping_card', 'user_id')],
+            ShoppingInfo: [('shopping_card', 'user_id')],
+            OpenDemandFeed: [('shopping_card', 'user_id')],
+            Binding: [('agent_card', 'agent_id'), ('shopping_card', 'buyer_id')],
+        }
+
+        @event.listens_for(Session, 'after_flush')
+        def _collect_changes(session, flush_context):
+            changed = session.info.setdefault('fragment_changes', set())
+            for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+                for kind, attr in dependencies.get(type(obj), ()):
+                    entity_id = getattr(obj, attr, None)
+                    if entity_id is not None:
+                        changed.add((kind, entity_id))
+
+        @event.listens_for(Session, 'after_commit')
+        def _apply_changes(session):
+            for kind, entity_id in session.info.pop('fragment_changes', ()):
+                self.invalidate(kind, entity_id)
+
+        @event.listens_for(Session, 'after_rollback')
+        def _discard_changes(session):
+            session.info.pop('fragment_changes', None)
+
+    # --------------------------
+    # 统计
+    # --------------------------
+    def stats(self) -> dict:
+        with self._lock:
+            entries = len(self._entries)
+        lookups = self.hits + self.redis_hits + self.misses
+        avg_render_ms = self._render_ms_total / self.misses if self.misses else 0.0
+        return {
+            'enabled': self.enabled,
+            'redis_tier': self._redis is not None,
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'redis_hits': self.redis_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.hits + self.redis_hits) / lookups, 4) if lookups else 0.0,
+            'avg_render_ms': round(avg_render_ms, 3),
+            # 命中次数 × 平均渲染耗时，估算节省的渲染时间
+            'render_ms_saved': round((self.hits + self.redis_hits) * avg_render_ms, 3),
+            'invalidations': self.invalidations,
+            'evictions': self.evictions,
+            'redis_errors': self.redis_errors
+        }
+
+
+# 全局实例（在 create_app 中初始化）
+fragment_cache = FragmentCache()
@@ -0,0 +1,439 @@
+# app/utils/image_store.py
+"""
+商品图片存储：按内容寻址 + 引用计数 + 后台生成缩略图
+
+- 上传时边写临时文件边计算 sha256，文件名为 <哈希前2位>/<sha256>.<扩展名>，
+  内容相同的图片只落盘一份（StoredImage.ref_count 记录引用它的商品数）
+- 写入前先校验内容：只接受 JPEG/PNG/GIF/WebP（魔数 + Pillow verify），扩展名取自识别出的格式，
+  与客户端文件名无关；其他内容抛出 InvalidImage，不落盘
+- 删除商品时引用数 -1，降为 0 才删除原图与缩略图；文件在事务提交后才删除，回滚不会丢图
+- 缩略图（thumb）和中图（medium）由后台线程池生成，写入 _renditions/<规格>/ 下；
+  在 eventlet 下图片编解码通过 tpool 放到真实线程执行，不阻塞协程调度
+- 模板中用 image_url(文件名, 规格) 取最小可用的版本：缩略图尚未生成（或未安装 Pillow）时返回原图
+- 旧的时间戳文件名（未入库）照常显示；`flask image-renditions` 可为已有图片补生成缩略图
+- 图片由 uploads 蓝图的 /uploads/<文件名> 提供（ETag / 304 / Range / 永久缓存，见 app.routes.uploads）；
+  Content-Type 按文件头部识别出的格式设置，不认可的内容一律以附件下载，不在站点源下渲染
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask.cli import with_appcontext
+
+logger = logging.getLogger(__name__)
+
+# 规格 -> 最长边像素
+RENDITIONS = {'thumb': 160, 'medium': 640}
+_RENDITION_DIR = '_renditions'
+_CHUNK_SIZE = 64 * 1024
+# 允许的图片格式（Pillow 格式名）-> (扩展名, MIME 类型)
+IMAGE_FORMATS = {
+    'JPEG': ('.jpg', 'image/jpeg'),
+    'PNG': ('.png', 'image/png'),
+    'GIF': ('.gif', 'image/gif'),
+    'WEBP': ('.webp', 'image/webp'),
+}
+# 按内容寻址的文件名（原图或缩略图），内容与文件名一一对应，可永久缓存
+_CONTENT_NAME_RE = re.compile(
+    r'^(?:' + _RENDITION_DIR + r'/(?P<size>[a-z]+)/)?[0-9a-f]{2}/(?P<sha256>[0-9a-f]{64})(?:\.[a-z0-9]{1,5})?$'
+)
+
+
+def sniff_format(head):
+    """按文件头部的魔数识别图片格式（IMAGE_FORMATS 的键），不认识返回 None"""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'JPEG'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'PNG'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'GIF'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+class InvalidImage(ValueError):
+    """上传内容不是允许的图片格式（或已损坏）"""
+
+
+def _verify_with_pillow(fileobj):
+    from PIL import Image
+
+    with Image.open(fileobj) as image:
+        image.verify()
+
+
+def _run_cpu(func, *args):
+    """CPU 密集的图片处理：eventlet 下放到真实线程（tpool），否则直接执行"""
+    try:
+        from eventlet import patcher, tpool
+        if patcher.is_monkey_patched('thread'):
+            return tpool.execute(func, *args)
+    except ImportError:
+        pass
+    return func(*args)
+
+
+def _render(src_path, dst_path, max_side):
+    """生成一个等比缩放的 JPEG 版本（先写临时文件再原子替换，读取方不会看到半个文件）"""
+    from PIL import Image, ImageOps
+
+    with Image.open(src_path) as image:
+        # JPEG 解码时直接按目标尺寸降采样，大图省掉大部分解码开销
+        image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.thumbnail((max_side, max_side))
+
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dst_path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                image.save(tmp, 'JPEG', quality=82, optimize=True, progressive=True)
+            os.replace(tmp_path, dst_path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+
+class ImageStore:
+    """内容寻址的商品图片存储"""
+
+    def __init__(self):
+        self.app = None
+        self.upload_folder = None
+        self.max_workers = 2
+        self.pillow_available = False
+
+        self._executor = None
+        self._ready = set()         # 已确认存在的缩略图相对路径
+        self._scheduled = set()     # 正在生成缩略图的原图（同一图片并发上传只生成一次）
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.stored = 0
+        self.deduplicated = 0
+        self.removed = 0
+        self.renditions_generated = 0
+        self.rendition_errors = 0
+        self.renditions_pending = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.upload_folder = app.config['UPLOAD_FOLDER']
+        self.max_workers = max(1, int(app.config.get('IMAGE_RENDITION_WORKERS', 2)))
+        try:
+            import PIL  # noqa: F401
+            self.pillow_available = True
+        except ImportError:
+            self.pillow_available = False
+            logger.warning('未安装 Pillow，商品图片不生成缩略图（页面直接使用原图）')
+
+        app.jinja_env.globals['image_url'] = self.url
+        app.extensions['image_store'] = self
+
+    # --------------------------
+    # 路径
+    # --------------------------
+    def path(self, filename):
+        return os.path.join(self.upload_folder, filename)
+
+    @staticmethod
+    def rendition_name(filename, size):
+        stem = os.path.splitext(filename)[0]
+        return f'{_RENDITION_DIR}/{size}/{stem}.jpg'
+
+    @staticmethod
+    def content_etag(filename):
+        """按内容寻址的文件返回强 ETag（内容哈希，缩略图附加规格）；旧文件名返回 None"""
+        match = _CONTENT_NAME_RE.match(filename)
+        if match is None:
+            return None
+        return f"{match.group('sha256')}-{match.group('size')}" if match.group('size') else match.group('sha256')
+
+    def content_type(self, filename):
+        """按文件内容（而非文件名）得到图片的 MIME 类型；不是允许的图片格式返回 None"""
+        try:
+            with open(self.path(filename), 'rb') as f:
+                head = f.read(16)
+        except OSError:
+            return None
+        image_format = sniff_format(head)
+        return IMAGE_FORMATS[image_format][1] if image_format else None
+
+    @staticmethod
+    def detect_format(fileobj):
+        """
+        校验图片内容并返回格式（IMAGE_FORMATS 的键），读取位置复原
+
+        魔数必须是允许的格式；安装了 Pillow 时再做一次完整的结构校验（verify）。
+
+        Raises:
+            InvalidImage: 不是允许的图片格式或文件已损坏
+        """
+        start = fileobj.tell()
+        try:
+            image_format = sniff_format(fileobj.read(16))
+            if image_format is None:
+                raise InvalidImage('仅支持 JPEG、PNG、GIF、WebP 格式的图片')
+            try:
+                import PIL  # noqa: F401
+            except ImportError:
+                return image_format
+            fileobj.seek(start)
+            try:
+                _run_cpu(_verify_with_pillow, fileobj)
+            except Exception:
+                raise InvalidImage('图片文件已损坏或格式不受支持')
+            return image_format
+        finally:
+            fileobj.seek(start)
+
+    # --------------------------
+    # 写入 / 引用计数
+    # --------------------------
+    def store_upload(self, file_storage):
+        """
+        保存上传的图片（流式写临时文件并计算哈希），引用数 +1
+
+        引用数的变更加入当前会话，由调用方随商品一起 commit。
+
+        Returns:
+            str: 写入 ShoppingInfo.product_image 的文件名
+
+        Raises:
+            InvalidImage: 不是允许的图片格式（此时不写任何文件）
+        """
+        image_format = self.detect_format(file_storage.stream)
+        tmp_dir = os.path.join(self.upload_folder, '.tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                while True:
+                    chunk = file_storage.stream.read(_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    tmp.write(chunk)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return self.store_file(tmp_path, digest.hexdigest(), IMAGE_FORMATS[image_format][0])
+
+    def store_file(self, tmp_path, sha256, ext=''):
+        """把已计算好哈希的临时文件移入存储（内容已存在则丢弃临时文件），引用数 +1"""
+        filename = f'{sha256[:2]}/{sha256}{ext}'
+        target = self.path(filename)
+        size_bytes = os.path.getsize(tmp_path)
+        if os.path.exists(target):
+            os.remove(tmp_path)
+            self.deduplicated += 1
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp_path, target)
+            self.stored += 1
+
+        self.acquire(filename, sha256, size_bytes)
+        self.schedule_renditions(filename)
+        return filename
+
+    def acquire(self, filename, sha256, size_bytes=None):
+        """
+        引用数 +1（不存在则建记录）；不提交事务
+
+        SQLite / PostgreSQL 用一条 upsert 完成，同一图片并发首次上传不会撞唯一约束；
+        其他数据库先原子加一，没有记录再插入。
+        """
+        from sqlalchemy import update
+        from app import db
+        from app.models.shopping import StoredImage
+
+        dialect = db.engine.dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            if dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            stmt = insert(StoredImage).values(filename=filename, sha256=sha256, size_bytes=size_bytes, ref_count=1)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['filename'],
+                set_={'ref_count': StoredImage.ref_count + 1}
+            ))
+            return
+
+        result = db.session.execute(
+            update(StoredImage)
+            .where(StoredImage.filename == filename)
+            .values(ref_count=StoredImage.ref_count + 1)
+        )
+        if result.rowcount == 0:
+            db.session.add(StoredImage(filename=filename, sha256=sha256, size_bytes=size_bytes, ref_count=1))
+
+    def release(self, filename):
+        """
+        引用数 -1（数据库内原子减一，并发删除不会互相覆盖）；不提交事务
+
+        Returns:
+            bool: 文件已无引用（commit 后应调用 remove_files 删除）；未入库的旧文件名视为唯一引用
+        """
+        from sqlalchemy import delete, select, update
+        from app import db
+        from app.models.shopping import StoredImage
+
+        stmt = (
+            update(StoredImage)
+            .where(StoredImage.filename == filename)
+            .values(ref_count=StoredImage.ref_count - 1)
+        )
+        if db.engine.dialect.update_returning:
+            ref_count = db.session.execute(stmt.returning(StoredImage.ref_count)).scalar()
+        else:
+            if db.session.execute(stmt).rowcount == 0:
+                return True
+            ref_count = db.session.execute(
+                select(StoredImage.ref_count).where(StoredImage.filename == filename)
+            ).scalar()
+        if ref_count is None:
+            return True
+        if ref_count > 0:
+            return False
+        db.session.execute(
+            delete(StoredImage).where(StoredImage.filename == filename, StoredImage.ref_count <= 0)
+        )
+        return True
+
+    def remove_files(self, filenames):
+        """事务提交后删除无引用的原图和缩略图（期间又被重新上传引用的文件保留）"""
+        from app.models.shopping import StoredImage
+
+        for filename in filenames:
+            if StoredImage.query.filter_by(filename=filename).first() is not None:
+                continue
+            names = [filename] + [self.rendition_name(filename, size) for size in RENDITIONS]
+            for name in names:
+                with self._lock:
+                    self._ready.discard(name)
+                if os.path.exists(self.path(name)):
+                    os.remove(self.path(name))
+            self.removed += 1
+
+    # --------------------------
+    # 缩略图
+    # --------------------------
+    def schedule_renditions(self, filename):
+        """提交后台任务生成各规格缩略图（未安装 Pillow 时跳过）"""
+        if not self.pillow_available:
+            return
+        with self._lock:
+            if filename in self._scheduled:
+                return
+            self._scheduled.add(filename)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='image-renditions')
+            self.renditions_pending += 1
+        self._executor.submit(self._generate, filename)
+
+    def _generate(self, filename):
+        generated = False
+        try:
+            for size, max_side in RENDITIONS.items():
+                name = self.rendition_name(filename, size)
+                if os.path.exists(self.path(name)):
+                    continue
+                _run_cpu(_render, self.path(filename), self.path(name), max_side)
+                self.renditions_generated += 1
+                generated = True
+            if generated:
+                self._invalidate_cards(filename)
+        except Exception:
+            self.rendition_errors += 1
+            logger.exception('生成缩略图失败（%s）', filename)
+        finally:
+            with self._lock:
+                self._scheduled.discard(filename)
+                self.renditions_pending -= 1
+
+    def _invalidate_cards(self, filename):
+        """缩略图生成后，已缓存的购物圈卡片仍引用原图，使其失效"""
+        from app import db
+        from app.models.shopping import ShoppingInfo
+        from app.utils.fragment_cache import fragment_cache
+
+        with self.app.app_context():
+            user_ids = db.session.query(ShoppingInfo.user_id).filter(
+                ShoppingInfo.product_image == filename
+            ).distinct().all()
+        for (user_id,) in user_ids:
+            fragment_cache.invalidate('shopping_card', user_id)
+
+    # --------------------------
+    # 读取
+    # --------------------------
+    def url(self, filename, size=None):
+        """图片地址：优先返回指定规格的缩略图，尚未生成时返回原图"""
+        from flask import url_for
+
+        if not filename:
+            return ''
+        if size in RENDITIONS:
+            name = self.rendition_name(filename, size)
+            ready = name in self._ready
+            if not ready and os.path.exists(self.path(name)):
+                with self._lock:
+                    self._ready.add(name)
+                ready = True
+            if ready:
+                return url_for('uploads.serve_upload', filename=name)
+        return url_for('uploads.serve_upload', filename=filename)
+
+    def stats(self) -> dict:
+        return {
+            'pillow_available': self.pillow_available,
+            'stored': self.stored,
+            'deduplicated': self.deduplicated,
+            'removed': self.removed,
+            'renditions_generated': self.renditions_generated,
+            'renditions_pending': self.renditions_pending,
+            'rendition_errors': self.rendition_errors
+        }
+
+
+# 全局实例（在 create_app 中初始化）
+image_store = ImageStore()
+
+
+@click.command('image-renditions')
+@with_appcontext
+def generate_renditions_command():
+    """为所有商品图片（含旧文件名）补生成缩略图"""
+    from app import db
+    from app.models.shopping import ShoppingInfo
+
+    if not image_store.pillow_available:
+        click.echo('未安装 Pillow，无法生成缩略图')
+        return
+    filenames = [name for (name,) in db.session.query(ShoppingInfo.product_image).filter(
+        ShoppingInfo.product_image.isnot(None)
+    ).distinct()]
+    for filename in filenames:
+        if os.path.exists(image_store.path(filename)):
+            image_store.schedule_renditions(filename)
+    if image_store._executor is not None:
+        image_store._executor.shutdown(wait=True)
+        image_store._executor = None
+    click.echo(f'已处理 {len(filenames)} 张图片，生成 {image_store.renditions_generated} 个缩略图，'
+               f'失败 {image_store.rendition_errors} 个')
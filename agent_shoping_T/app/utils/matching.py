@@ -0,0 +1,392 @@
+# app/utils/matching.py
+"""
+代购行程 / 购物需求匹配（进程内索引）
+
+买家原来只能在代购列表里逐页翻找，代购也只能逐页翻购物圈。这里在内存中维护已提交行程的索引：
+- 地点：归一化（NFKC、小写、去掉「市/省/都/府…」等行政后缀）后切成词元（中文按二字组，英文按单词），
+  词元 -> 地点 的倒排表；相似度用词元集合的 Jaccard 系数
+- 日期：每个地点下按出发日期有序的 (出发日序号, 行程id) 列表，行程时间窗口为 [出发日, 出发日 + MATCHING_TRIP_DAYS]，
+  与查询窗口 [a, b] 相交 <=> 出发日 ∈ [a - 天数, b]，用二分查找定位
+- 购物圈：开放购物圈（OpenDemandFeed）的商品名称/描述文本；某个词元首次被查询时扫描一遍建立倒排表，之后增量维护
+
+查询复杂度与候选地点数和返回条数相关，与行程总数无关（十万级行程下单次查询在 1ms 以内，见 benchmarks/matching.py）。
+
+索引通过 SQLAlchemy 会话事件增量维护：after_flush 记录本事务新增/修改/删除的 AgentInfo 与 OpenDemandFeed，
+after_commit 时应用到索引（回滚则丢弃），代购保存/提交/删除行程（agent.agent_info）及购物圈写操作无需额外调用。
+多 worker 部署时其他进程的写入不会推送过来，按 MATCHING_RELOAD_SECONDS 间隔从数据库重建；
+SOCKETIO_WORKERS > 1 而未设置该间隔（0）时默认每 30 秒重建一次，否则每个 worker 只能匹配到自己处理过的写入。
+"""
+import heapq
+import json
+import logging
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+# 地点末尾的行政区划后缀（「东京都」->「东京」，避免与「京都」的二字组混淆）
+_ADMIN_SUFFIXES = '市省县縣都府州区區'
+_CJK_RE = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯]+')
+_WORD_RE = re.compile(r'[a-z0-9]+')
+# 多 worker 部署未配置 MATCHING_RELOAD_SECONDS 时的重建间隔（秒）
+_MULTI_WORKER_RELOAD_SECONDS = 30
+
+
+def normalize_location(value):
+    """地点归一化：NFKC + 小写 + 去空白"""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFKC', value or '').lower()).strip()
+
+
+def location_tokens(value):
+    """地点 -> 词元集合（中文二字组、英文单词）"""
+    text = normalize_location(value)
+    tokens = set()
+    for run in _CJK_RE.findall(text):
+        if len(run) > 2 and run[-1] in _ADMIN_SUFFIXES:
+            run = run[:-1]
+        if len(run) == 1:
+            tokens.add(run)
+        tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.update(word for word in _WORD_RE.findall(text) if len(word) > 1)
+    return tokens
+
+
+def _day(value):
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    return value
+
+
+class MatchingIndex:
+    """代购行程 / 开放购物圈的内存匹配索引"""
+
+    def __init__(self):
+        self.app = None
+        self.trip_days = 7
+        self.reload_seconds = 0
+
+        # 行程：id -> (user_id, 地点键, 出发日序号, 出发时间)
+        self._trips = {}
+        self._by_location = {}      # 地点键 -> [(出发日序号, 行程id)]（有序）
+        self._location_tokens = {}  # 地点键 -> 词元集合
+        self._token_locations = {}  # 词元 -> {地点键}
+        self._all_trips = []        # 全部 [(出发日序号, 行程id)]（未指定地点时使用）
+
+        # 购物圈：circle_id -> (user_id, 归一化商品文本, 提交时间戳)
+        self._circles = {}
+        self._recent_circles = []   # [(-提交时间戳, circle_id)]（有序，最新在前）
+        self._circle_postings = {}  # 词元 -> {circle_id}（按需建立）
+
+        self._lock = threading.RLock()
+        self._loaded_at = None
+        self._events_registered = False
+
+        # 统计信息
+        self.queries = 0
+        self._query_ms_total = 0.0
+        self.max_query_ms = 0.0
+        self.updates = 0
+        self.last_load_ms = 0.0
+
+    def init_app(self, app):
+        self.app = app
+        self.trip_days = int(app.config.get('MATCHING_TRIP_DAYS', 7))
+        self.reload_seconds = int(app.config.get('MATCHING_RELOAD_SECONDS', 0))
+        if not self.reload_seconds and app.config.get('SOCKETIO_WORKERS', 1) > 1:
+            logger.info('多进程部署下匹配索引看不到其他 worker 的写入，未设置 MATCHING_RELOAD_SECONDS，'
+                        '默认每 %d 秒从数据库重建', _MULTI_WORKER_RELOAD_SECONDS)
+            self.reload_seconds = _MULTI_WORKER_RELOAD_SECONDS
+        app.extensions['matching_index'] = self
+        self._register_session_events()
+
+    # --------------------------
+    # 加载
+    # --------------------------
+    def ensure_loaded(self):
+        """首次查询时从数据库加载；配置了 MATCHING_RELOAD_SECONDS 时到期重建"""
+        if self._loaded_at is not None and not (
+            self.reload_seconds and time.monotonic() - self._loaded_at > self.reload_seconds
+        ):
+            return
+        self.load()
+
+    def load(self):
+        """从数据库全量重建索引（已提交的行程 + 开放购物圈）"""
+        from app import db
+        from app.models import AgentInfo, OpenDemandFeed
+
+        started = time.perf_counter()
+        trips = db.session.query(
+            AgentInfo.id, AgentInfo.user_id, AgentInfo.location, AgentInfo.time
+        ).filter(AgentInfo.is_submitted == True).all()
+        circles = db.session.query(
+            OpenDemandFeed.circle_id, OpenDemandFeed.user_id, OpenDemandFeed.products_json, OpenDemandFeed.submit_time
+        ).all()
+
+        with self._lock:
+            self._reset()
+            for trip_id, user_id, location, trip_time in trips:
+                self.add_trip(trip_id, user_id, location, trip_time)
+            for circle_id, user_id, products_json, submit_time in circles:
+                self.add_circle(circle_id, user_id, products_json, submit_time)
+            self._loaded_at = time.monotonic()
+        self.last_load_ms = (time.perf_counter() - started) * 1000
+
+    def _reset(self):
+        self._trips.clear()
+        self._by_location.clear()
+        self._location_tokens.clear()
+        self._token_locations.clear()
+        self._all_trips = []
+        self._circles.clear()
+        self._recent_circles = []
+        self._circle_postings.clear()
+
+    # --------------------------
+    # 增量维护：行程
+    # --------------------------
+    def add_trip(self, trip_id, user_id, location, trip_time):
+        """新增或更新一条已提交行程"""
+        with self._lock:
+            self.remove_trip(trip_id)
+            key = normalize_location(location)
+            start = _day(trip_time)
+            self._trips[trip_id] = (user_id, key, start, trip_time)
+            if key not in self._by_location:
+                self._by_location[key] = []
+                self._location_tokens[key] = location_tokens(key)
+                for token in self._location_tokens[key]:
+                    self._token_locations.setdefault(token, set()).add(key)
+            insort(self._by_location[key], (start, trip_id))
+            insort(self._all_trips, (start, trip_id))
+
+    def remove_trip(self, trip_id):
+        with self._lock:
+            trip = self._trips.pop(trip_id, None)
+            if trip is None:
+                return
+            _, key, start, _ = trip
+            entries = self._by_location[key]
+            del entries[bisect_left(entries, (start, trip_id))]
+            del self._all_trips[bisect_left(self._all_trips, (start, trip_id))]
+            if not entries:
+                # 地点下已无行程，清理倒排表
+                del self._by_location[key]
+                for token in self._location_tokens.pop(key):
+                    locations = self._token_locations[token]
+                    locations.discard(key)
+                    if not locations:
+                        del self._token_locations[token]
+
+    # --------------------------
+    # 增量维护：购物圈
+    # --------------------------
+    @staticmethod
+    def _circle_text(products_json):
+        try:
+            products = json.loads(products_json or '[]')
+        except ValueError:
+            return ''
+        return normalize_location(' '.join(
+            f"{product.get('product_name') or ''} {product.get('description') or ''}" for product in products
+        ))
+
+    def add_circle(self, circle_id, user_id, products_json, submit_time):
+        """新增或更新一个开放购物圈"""
+        text = self._circle_text(products_json)
+        timestamp = submit_time.timestamp() if submit_time else 0.0
+        with self._lock:
+            self.remove_circle(circle_id)
+            self._circles[circle_id] = (user_id, text, timestamp)
+            insort(self._recent_circles, (-timestamp, circle_id))
+            for token, circle_ids in self._circle_postings.items():
+                if token in text:
+                    circle_ids.add(circle_id)
+
+    def remove_circle(self, circle_id):
+        with self._lock:
+            circle = self._circles.pop(circle_id, None)
+            if circle is None:
+                return
+            del self._recent_circles[bisect_left(self._recent_circles, (-circle[2], circle_id))]
+            for circle_ids in self._circle_postings.values():
+                circle_ids.discard(circle_id)
+
+    def _circles_with(self, token):
+        """包含某词元的购物圈（首次查询该词元时扫描一遍建立倒排表）"""
+        circle_ids = self._circle_postings.get(token)
+        if circle_ids is None:
+            circle_ids = {circle_id for circle_id, (_, text, _) in self._circles.items() if token in text}
+            self._circle_postings[token] = circle_ids
+        return circle_ids
+
+    # --------------------------
+    # 查询
+    # --------------------------
+    def _timed(self, started):
+        elapsed = (time.perf_counter() - started) * 1000
+        self.queries += 1
+        self._query_ms_total += elapsed
+        self.max_query_ms = max(self.max_query_ms, elapsed)
+
+    def match_trips(self, location=None, date_from=None, date_to=None, limit=20, exclude_user_id=None):
+        """
+        为买家匹配代购行程
+
+        排序：地点相似度（Jaccard）降序 -> 距查询开始日期的天数升序 -> 行程id
+        未指定开始日期时从今天开始，只返回尚未结束的行程。
+
+        Returns:
+            list: [{"trip_id", "user_id", "location_key", "time", "score"}]
+        """
+        started = time.perf_counter()
+        window_start = _day(date_from) if date_from else date.today().toordinal()
+        window_end = _day(date_to) if date_to else None
+        query_tokens = location_tokens(location) if location else set()
+
+        with self._lock:
+            if query_tokens:
+                hits = Counter()
+                for token in query_tokens:
+                    hits.update(self._token_locations.get(token, ()))
+                candidates = [
+                    (hits[key] / len(query_tokens | self._location_tokens[key]), self._by_location[key])
+                    for key in hits
+                ]
+            else:
+                candidates = [(0.0, self._all_trips)]
+
+            ranked = []
+            for score, entries in candidates:
+                # 时间窗口 [出发日, 出发日 + trip_days] 与 [window_start, window_end] 相交
+                position = bisect_left(entries, (window_start - self.trip_days,))
+                taken = 0
+                while position < len(entries) and taken < limit:
+                    start, trip_id = entries[position]
+                    position += 1
+                    if window_end is not None and start > window_end:
+                        break
+                    user_id = self._trips[trip_id][0]
+                    if user_id == exclude_user_id:
+                        continue
+                    ranked.append((-score, max(0, start - window_start), trip_id))
+                    taken += 1
+            best = heapq.nsmallest(limit, ranked)
+            result = []
+            for neg_score, _, trip_id in best:
+                user_id, key, _, trip_time = self._trips[trip_id]
+                result.append({'trip_id': trip_id, 'user_id': user_id, 'location_key': key,
+                               'time': trip_time, 'score': round(-neg_score, 4)})
+        self._timed(started)
+        return result
+
+    def match_circles(self, location, limit=20):
+        """
+        为代购匹配开放购物圈
+
+        排序：商品名称/描述命中地点词元的个数降序 -> 提交时间倒序；地点无命中时按提交时间倒序返回。
+
+        Returns:
+            list: [{"circle_id", "user_id", "score"}]
+        """
+        started = time.perf_counter()
+        query_tokens = location_tokens(location) if location else set()
+
+        with self._lock:
+            hits = Counter()
+            for token in query_tokens:
+                hits.update(self._circles_with(token))
+            if hits:
+                best = heapq.nsmallest(
+                    limit, hits.items(),
+                    key=lambda item: (-item[1], -self._circles[item[0]][2], item[0])
+                )
+                result = [{'circle_id': circle_id, 'user_id': self._circles[circle_id][0],
+                           'score': round(count / len(query_tokens), 4)} for circle_id, count in best]
+            else:
+                result = [{'circle_id': circle_id, 'user_id': self._circles[circle_id][0], 'score': 0.0}
+                          for _, circle_id in self._recent_circles[:limit]]
+        self._timed(started)
+        return result
+
+    # --------------------------
+    # 会话事件
+    # --------------------------
+    def _register_session_events(self):
+        # 会话事件是全局的，多次 create_app 时只注册一次
+        if self._events_registered:
+            return
+        self._events_registered = True
+
+        from sqlalchemy import event
+        from sqlalchemy.orm import Session
+        from app.models import AgentInfo, OpenDemandFeed
+
+        @event.listens_for(Session, 'after_flush')
+        def _collect_changes(session, flush_context):
+            changes = session.info.setdefault('matching_changes', [])
+            for obj in list(session.new) + list(session.dirty):
+                if isinstance(obj, AgentInfo):
+                    if obj.is_submitted:
+                        changes.append(('trip', obj.id, (obj.user_id, obj.location, obj.time)))
+                    else:
+                        changes.append(('trip', obj.id, None))
+                elif isinstance(obj, OpenDemandFeed):
+                    changes.append(('circle', obj.circle_id, (obj.user_id, obj.products_json, obj.submit_time)))
+            for obj in session.deleted:
+                if isinstance(obj, AgentInfo):
+                    changes.append(('trip', obj.id, None))
+                elif isinstance(obj, OpenDemandFeed):
+                    changes.append(('circle', obj.circle_id, None))
+
+        @event.listens_for(Session, 'after_commit')
+        def _apply_changes(session):
+            changes = session.info.pop('matching_changes', ())
+            if not changes or self._loaded_at is None:
+                return
+            for kind, entity_id, values in changes:
+                if kind == 'trip' and values:
+                    self.add_trip(entity_id, *values)
+                elif kind == 'trip':
+                    self.remove_trip(entity_id)
+                elif values:
+                    self.add_circle(entity_id, *values)
+                else:
+                    self.remove_circle(entity_id)
+                self.updates += 1
+
+        @event.listens_for(Session, 'after_rollback')
+        def _discard_changes(session):
+            session.info.pop('matching_changes', None)
+
+    # --------------------------
+    # 统计
+    # --------------------------
+    def stats(self) -> dict:
+        with self._lock:
+            sizes = {
+                'trips': len(self._trips),
+                'locations': len(self._by_location),
+                'circles': len(self._circles),
+                'circle_tokens': len(self._circle_postings)
+            }
+        return dict(
+            sizes,
+            loaded=self._loaded_at is not None,
+            last_load_ms=round(self.last_load_ms, 3),
+            queries=self.queries,
+            avg_query_ms=round(self._query_ms_total / self.queries, 4) if self.queries else 0.0,
+            max_query_ms=round(self.max_query_ms, 4),
+            updates=self.updates
+        )
+
+
+# 全局实例（在 create_app 中初始化）
+matching_index = MatchingIndex()
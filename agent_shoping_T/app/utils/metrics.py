@@ -0,0 +1,233 @@
+# app/utils/metrics.py
+"""
+应用指标：按端点 / Socket.IO 事件统计延迟直方图，Prometheus 文本格式从 /metrics 导出
+
+- HTTP：请求钩子在 create_app 中最先注册，记录每个端点（按 endpoint 名，未匹配路由统一记为 unmatched，
+  避免任意路径撑大标签）的延迟直方图、状态码计数和当前处理中的请求数
+- Socket.IO：run.py 中的事件处理函数用 metrics.socket_event(事件名) 包装，记录每个事件的延迟直方图和成功/异常次数；
+  在线连接数、房间数在导出时从 Socket.IO 的房间表读取
+- 每个 worker 进程各自聚合、各自导出（带 worker 标签）：多 worker 部署时 Prometheus 直接抓取每个 worker 端口
+  （run_workers.py 的 base-port 起），不要经过负载均衡
+- 不加锁：worker 内所有协程运行在同一个系统线程上（eventlet），记录过程不会让出，计数不会交错；
+  每次记录只是几次字典查找和整数加法，可以在生产环境常开
+- /metrics 需携带 Authorization: Bearer <METRICS_TOKEN>；未配置 METRICS_TOKEN 时只在调试模式下开放，
+  其他环境返回 404（不对外暴露端点、延迟分布和连接数）
+"""
+import hmac
+import time
+from bisect import bisect_left
+from functools import wraps
+
+# 直方图桶上界（秒），与 Prometheus 客户端默认值一致
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """按标签分组的直方图：每组保存各桶计数（非累计）、总和、次数"""
+
+    def __init__(self, name, help_text, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}   # 标签值元组 -> [桶计数..., +Inf 桶计数, 总和, 次数]
+
+    def observe(self, label_values, value):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def expose(self, extra_names=(), extra_values=()):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        names = tuple(extra_names) + self.label_names
+        for label_values, series in sorted(self._series.items()):
+            values = tuple(extra_values) + label_values
+            labels = _labels(names, values)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-2]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{_number(bound)}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {series[-2]!r}')
+            lines.append(f'{self.name}_count{{{labels}}} {series[-1]}')
+        return lines
+
+
+class Counter:
+    """按标签分组的计数器"""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._series = {}
+
+    def inc(self, label_values, amount=1):
+        self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def expose(self, extra_names=(), extra_values=()):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        names = tuple(extra_names) + self.label_names
+        for label_values, value in sorted(self._series.items()):
+            lines.append(f'{self.name}{{{_labels(names, tuple(extra_values) + label_values)}}} {value}')
+        return lines
+
+
+class Metrics:
+    """HTTP / Socket.IO 指标（进程内聚合）"""
+
+    def __init__(self):
+        self.enabled = False
+        self.token = ''
+        self.worker = '0'
+        self.socketio = None
+        self.started_at = time.time()
+
+        self.in_flight = 0
+        self.http_duration = Histogram('http_request_duration_seconds', 'HTTP 请求处理耗时（秒）',
+                                       ('endpoint', 'method'))
+        self.http_requests = Counter('http_requests_total', 'HTTP 请求数（按状态码）',
+                                     ('endpoint', 'method', 'status'))
+        self.event_duration = Histogram('socketio_event_duration_seconds', 'Socket.IO 事件处理耗时（秒）',
+                                        ('event',))
+        self.events = Counter('socketio_events_total', 'Socket.IO 事件数（ok / error）', ('event', 'result'))
+
+    def init_app(self, app, socketio=None):
+        self.enabled = bool(app.config.get('METRICS_ENABLED', True))
+        app.extensions['metrics'] = self
+        if not self.enabled:
+            return
+        self.token = app.config.get('METRICS_TOKEN', '')
+        self.worker = str(app.config.get('SOCKETIO_WORKER_ID', 0))
+        self.socketio = socketio
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    # --------------------------
+    # HTTP 请求钩子
+    # --------------------------
+    def _start_request(self):
+        from flask import g
+        g.metrics_started = time.perf_counter()
+        self.in_flight += 1
+
+    def _record(self, status):
+        from flask import g, request
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        self.in_flight -= 1
+        endpoint = request.endpoint or 'unmatched'
+        self.http_duration.observe((endpoint, request.method), time.perf_counter() - started)
+        self.http_requests.inc((endpoint, request.method, str(status)))
+
+    def _finish_request(self, response):
+        self._record(response.status_code)
+        return response
+
+    def _teardown_request(self, exc):
+        # 未处理的异常不会经过 after_request，在此按 500 记录
+        self._record(500)
+
+    # --------------------------
+    # Socket.IO 事件
+    # --------------------------
+    def socket_event(self, event):
+        """包装 Socket.IO 事件处理函数，记录耗时和成功/异常次数"""
+        def decorator(handler):
+            @wraps(handler)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return handler(*args, **kwargs)
+                started = time.perf_counter()
+                result = 'error'
+                try:
+                    value = handler(*args, **kwargs)
+                    result = 'ok'
+                    return value
+                finally:
+                    self.event_duration.observe((event,), time.perf_counter() - started)
+                    self.events.inc((event, result))
+            return wrapper
+        return decorator
+
+    def _socket_counts(self):
+        """在线连接数、房间数（不含每个连接自带的同名房间），从 Socket.IO 房间表读取"""
+        try:
+            rooms_by_namespace = self.socketio.server.manager.rooms
+        except AttributeError:
+            return None
+        connected, rooms = 0, 0
+        for namespace_rooms in list(rooms_by_namespace.values()):
+            for room, members in list(namespace_rooms.items()):
+                if room is None:
+                    connected += len(members)
+                elif room not in members:
+                    rooms += 1
+        return connected, rooms
+
+    # --------------------------
+    # 导出
+    # --------------------------
+    def render(self):
+        worker = (('worker',), (self.worker,))
+        labels = _labels(*worker)
+        lines = [
+            '# HELP process_start_time_seconds 进程启动时间（Unix 时间戳）',
+            '# TYPE process_start_time_seconds gauge',
+            f'process_start_time_seconds{{{labels}}} {self.started_at!r}',
+            '# HELP http_requests_in_flight 正在处理的 HTTP 请求数',
+            '# TYPE http_requests_in_flight gauge',
+            f'http_requests_in_flight{{{labels}}} {self.in_flight}',
+        ]
+        lines += self.http_requests.expose(*worker)
+        lines += self.http_duration.expose(*worker)
+        lines += self.events.expose(*worker)
+        lines += self.event_duration.expose(*worker)
+
+        counts = self._socket_counts() if self.socketio is not None else None
+        if counts is not None:
+            lines += [
+                '# HELP socketio_connected_clients 当前 worker 的 Socket.IO 在线连接数',
+                '# TYPE socketio_connected_clients gauge',
+                f'socketio_connected_clients{{{labels}}} {counts[0]}',
+                '# HELP socketio_rooms 当前 worker 的聊天房间数',
+                '# TYPE socketio_rooms gauge',
+                f'socketio_rooms{{{labels}}} {counts[1]}',
+            ]
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        from flask import current_app, request, abort
+        if not self.token:
+            if not current_app.debug:
+                abort(404)
+        elif not hmac.compare_digest(request.headers.get('Authorization', '').encode('utf-8'),
+                                     f'Bearer {self.token}'.encode('utf-8')):
+            # 常量时间比较，响应耗时不泄露令牌前缀
+            abort(403)
+        return self.render(), 200, {'Content-Type': _CONTENT_TYPE}
+
+
+# 全局实例（在 create_app 中初始化）
+metrics = Metrics()
@@ -0,0 +1,28 @@
+# app/utils/money.py
+"""
+金额换算：数据库中统一以「分」为单位的整数存储，边界处（表单输入、页面展示）使用精确的 Decimal
+
+浮点数无法精确表示 0.1 等金额，累加后会出现 0.30000000000000004 之类的误差。
+"""
+from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+
+_CENT = Decimal('0.01')
+
+
+def to_cents(value) -> int:
+    """元（Decimal / str / int / float）-> 分（四舍五入到分）"""
+    if isinstance(value, float):
+        # 先转成字符串，避免 Decimal(0.1) 带出二进制误差
+        value = repr(value)
+    try:
+        amount = Decimal(value)
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError(f'无效的金额：{value!r}')
+    if not amount.is_finite():
+        raise ValueError(f'无效的金额：{value!r}')
+    return int((amount * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents) -> Decimal:
+    """分 -> 元（保留两位小数的 Decimal）"""
+    return (Decimal(cents or 0) / 100).quantize(_CENT)
@@ -0,0 +1,240 @@
+# app/utils/product_import.py
+"""
+买家批量导入商品（CSV / JSON）
+
+字段与「添加商品」表单相同：序号、名称、价格、描述（图片不支持导入）。
+- CSV：首行为表头，支持英文字段名（serial_number, product_name, price, description）或中文（序号, 名称, 价格, 描述）；
+  兼容 Excel 导出的 UTF-8 BOM
+- JSON：对象数组 [{...}, ...]，或每行一个对象的 JSON Lines
+- 逐行流式读取、校验（规则与 ShoppingInfoForm 一致），合法行攒满 PRODUCT_IMPORT_BATCH_SIZE 条后
+  用一条 executemany INSERT 写入并提交；非法行记录行号与原因，不影响其他行
+- 全部写完后只校准一次购物圈总价/商品数并刷新购物圈物化表，而不是每行一次
+"""
+import codecs
+import csv
+import json
+import logging
+import re
+
+from flask import current_app
+from sqlalchemy import insert
+
+from app import db
+from app.forms.shopping_forms import PRICE_PATTERN
+from app.models.shopping import ShoppingInfo
+from app.utils.money import to_cents
+
+logger = logging.getLogger(__name__)
+
+_PRICE_RE = re.compile(PRICE_PATTERN)
+
+# 导入文件中的列名 -> 模型字段
+FIELD_ALIASES = {
+    'serial_number': 'serial_number', '序号': 'serial_number',
+    'product_name': 'product_name', '名称': 'product_name',
+    'price': 'price', '价格': 'price', '价格（元）': 'price',
+    'description': 'description', '描述': 'description',
+}
+
+# 字段长度上限（与模型/表单一致）
+_MAX_LENGTH = {'serial_number': 20, 'product_name': 100}
+
+
+class ImportReport:
+    """导入结果：成功条数与逐行错误"""
+
+    def __init__(self, max_errors=100):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []            # [(行号, 错误信息)]，最多记录 max_errors 条
+        self.max_errors = max_errors
+        self.total_cents = 0        # 导入后购物清单总价（分）
+        self.item_count = 0
+
+    def add_error(self, line_no, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line_no, message))
+
+    def to_dict(self) -> dict:
+        return {
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': [{'line': line_no, 'message': message} for line_no, message in self.errors],
+            'errors_truncated': self.failed > len(self.errors),
+            'total_price_cents': self.total_cents,
+            'item_count': self.item_count
+        }
+
+
+# --------------------------
+# 读取
+# --------------------------
+def _iter_csv(text_stream):
+    reader = csv.DictReader(text_stream)
+    for row in reader:
+        # DictReader 的 line_num 是已读取的物理行数，即当前记录最后一行的行号
+        yield reader.line_num, row
+
+
+def _iter_json(text_stream):
+    first = ''
+    while not first:
+        char = text_stream.read(1)
+        if not char:
+            return
+        first = char.strip()
+
+    if first == '[':
+        # 对象数组：受 MAX_CONTENT_LENGTH 限制，整体解析
+        try:
+            rows = json.loads(first + text_stream.read())
+        except json.JSONDecodeError as e:
+            raise ValueError(f'JSON 格式错误：{e.msg}（第 {e.lineno} 行）')
+        for index, row in enumerate(rows, start=1):
+            yield index, row
+        return
+
+    # JSON Lines：逐行解析（解析失败的行单独报错，不影响其他行）
+    for line_no, line in enumerate(_prepend(first, text_stream), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, ValueError(f'JSON 格式错误：{e.msg}')
+
+
+def _prepend(first, text_stream):
+    """把已读出的首字符拼回第一行"""
+    lines = iter(text_stream)
+    yield first + next(lines, '')
+    yield from lines
+
+
+def iter_import_rows(file_storage):
+    """
+    按文件类型逐行读取上传的导入文件
+
+    Yields:
+        tuple: (行号, dict 原始行 / ValueError 解析错误)
+    """
+    filename = (file_storage.filename or '').lower()
+    mimetype = file_storage.mimetype or ''
+    text_stream = codecs.getreader('utf-8-sig')(file_storage.stream, errors='strict')
+
+    # 优先按扩展名判断，没有扩展名时看 Content-Type
+    if filename.endswith('.csv'):
+        return _iter_csv(text_stream)
+    if filename.endswith(('.json', '.jsonl', '.ndjson')):
+        return _iter_json(text_stream)
+    if mimetype in ('text/csv', 'application/vnd.ms-excel'):
+        return _iter_csv(text_stream)
+    if 'json' in mimetype:
+        return _iter_json(text_stream)
+    raise ValueError('仅支持 CSV 或 JSON 文件')
+
+
+# --------------------------
+# 校验
+# --------------------------
+def validate_row(raw):
+    """
+    原始行 -> 插入参数
+
+    Returns:
+        tuple: (dict 或 None, 错误信息 或 None)
+    """
+    if isinstance(raw, ValueError):
+        return None, str(raw)
+    if not isinstance(raw, dict):
+        return None, '每行必须是一个对象'
+
+    values = {}
+    for key, value in raw.items():
+        field = FIELD_ALIASES.get(str(key).strip()) if key is not None else None
+        if field is not None:
+            values[field] = '' if value is None else str(value).strip()
+
+    for field, label in (('serial_number', '序号'), ('product_name', '名称'), ('price', '价格')):
+        if not values.get(field):
+            return None, f'{label}不能为空'
+    for field, max_length in _MAX_LENGTH.items():
+        if len(values[field]) > max_length:
+            return None, f'{field} 超过 {max_length} 个字符'
+    if not _PRICE_RE.match(values['price']):
+        return None, '请输入有效的价格（最多两位小数）'
+
+    return {
+        'serial_number': values['serial_number'],
+        'product_name': values['product_name'],
+        'price_cents': to_cents(values['price']),
+        'description': values.get('description') or None,
+        'product_image': None
+    }, None
+
+
+# --------------------------
+# 写入
+# --------------------------
+def _write_batch(user_id, batch, report):
+    """一批合法行用一条 executemany INSERT 写入并提交；失败则整批记为错误"""
+    try:
+        db.session.execute(insert(ShoppingInfo), [dict(params, user_id=user_id) for _, params in batch])
+        db.session.commit()
+        report.imported += len(batch)
+    except Exception:
+        db.session.rollback()
+        logger.exception('批量导入写入失败（%d 行）', len(batch))
+        for line_no, _ in batch:
+            report.add_error(line_no, '写入数据库失败')
+
+
+def import_products(user_id, rows):
+    """
+    批量导入商品
+
+    Args:
+        rows: iter_import_rows() 返回的 (行号, 原始行) 迭代器
+
+    Returns:
+        ImportReport
+    """
+    from app.utils.demand_feed import refresh_buyer_feed
+    from app.utils.shopping_totals import cart_totals, sync_circle_totals
+
+    batch_size = max(1, current_app.config.get('PRODUCT_IMPORT_BATCH_SIZE', 500))
+    max_rows = current_app.config.get('PRODUCT_IMPORT_MAX_ROWS', 5000)
+    report = ImportReport()
+
+    batch, seen = [], 0
+    try:
+        for line_no, raw in rows:
+            seen += 1
+            if seen > max_rows:
+                report.add_error(line_no, f'超过单次导入上限 {max_rows} 行，之后的行未导入')
+                break
+            params, error = validate_row(raw)
+            if error:
+                report.add_error(line_no, error)
+                continue
+            batch.append((line_no, params))
+            if len(batch) >= batch_size:
+                _write_batch(user_id, batch, report)
+                batch = []
+    except UnicodeDecodeError:
+        report.add_error(seen + 1, '文件编码错误，请使用 UTF-8 编码')
+    except (ValueError, csv.Error) as e:
+        report.add_error(seen + 1, str(e))
+    if batch:
+        _write_batch(user_id, batch, report)
+
+    # 所有批次写完后只校准一次购物圈总价并刷新物化表
+    if report.imported:
+        report.total_cents, report.item_count = sync_circle_totals(user_id)
+        refresh_buyer_feed([user_id])
+        db.session.commit()
+    else:
+        report.total_cents, report.item_count = cart_totals(user_id)
+    return report
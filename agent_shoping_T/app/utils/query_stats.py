@@ -0,0 +1,188 @@
+# app/utils/query_stats.py
+"""
+请求级 SQL 统计：查询次数、数据库耗时、N+1 检测
+
+- 通过 SQLAlchemy 引擎事件（before/after_cursor_execute）统计当前请求执行的语句条数与耗时
+- 语句按「形状」归并：参数本就是占位符，IN (?, ?, ...) 折叠为 IN (?...)；
+  同一形状在一个请求内执行次数 >= QUERY_STATS_N_PLUS_ONE 时视为疑似 N+1，打印告警
+- 响应头 X-DB-Queries（条数）/ X-DB-Time（毫秒），便于在浏览器开发者工具里直接查看
+- 超过阈值（疑似 N+1、查询条数或数据库耗时超限）的请求放入环形缓冲区（最近 QUERY_STATS_RING_SIZE 条），
+  按端点汇总的次数/平均/最大查询数一并保留，管理员在 /ops/queries 查看（查询最多的排在前面）
+- QUERY_STATS_ENABLED 关闭时不注册任何事件和请求钩子，没有额外开销
+- 只统计 HTTP 请求内的查询；后台协程（聊天写入、未读计数落库等）和 Socket.IO 事件不计入
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST_RE = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def statement_shape(statement):
+    """语句形状：折叠 IN 列表长度与空白，同一处代码循环执行的语句得到相同结果"""
+    return _IN_LIST_RE.sub('(?...)', _SPACE_RE.sub(' ', statement).strip())
+
+
+class _RequestStats:
+    """当前请求的统计（保存在 flask.g 上）"""
+    __slots__ = ('started', 'queries', 'db_ms', 'shapes')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+        self.shapes = Counter()
+
+
+class QueryStats:
+    """请求级 SQL 统计 + 最差请求环形缓冲区"""
+
+    def __init__(self):
+        self.enabled = False
+        self.headers = True
+        self.n_plus_one_threshold = 10
+        self.max_queries = 30
+        self.max_db_ms = 200.0
+
+        self._worst = deque(maxlen=50)      # 超过阈值的请求（最近 N 条）
+        self._endpoints = {}                # 端点 -> [请求数, 查询总数, 最大查询数, 数据库总耗时]
+        self._lock = threading.Lock()
+        self._events_registered = False
+
+        # 统计信息
+        self.requests = 0
+        self.flagged = 0
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('QUERY_STATS_ENABLED', False))
+        app.extensions['query_stats'] = self
+        if not self.enabled:
+            return
+
+        self.headers = bool(app.config.get('QUERY_STATS_HEADERS', True))
+        self.n_plus_one_threshold = max(2, int(app.config.get('QUERY_STATS_N_PLUS_ONE', 10)))
+        self.max_queries = int(app.config.get('QUERY_STATS_MAX_QUERIES', 30))
+        self.max_db_ms = float(app.config.get('QUERY_STATS_MAX_DB_MS', 200))
+        self._worst = deque(self._worst, maxlen=max(1, int(app.config.get('QUERY_STATS_RING_SIZE', 50))))
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        self._register_engine_events()
+
+    # --------------------------
+    # 引擎事件
+    # --------------------------
+    def _register_engine_events(self):
+        # 引擎事件按 Engine 类注册（不依赖应用上下文），多次 create_app 时只注册一次
+        if self._events_registered:
+            return
+        self._events_registered = True
+
+        from flask import g, has_request_context
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        # 开始时间记在本次执行的上下文上：语句执行失败时不会触发 after_cursor_execute，
+        # 记在连接上的计时会一直残留，而执行上下文随语句结束被回收
+        @event.listens_for(Engine, 'before_cursor_execute')
+        def _before_execute(conn, cursor, statement, parameters, context, executemany):
+            if context is not None:
+                context._query_stats_started = time.perf_counter()
+
+        @event.listens_for(Engine, 'after_cursor_execute')
+        def _after_execute(conn, cursor, statement, parameters, context, executemany):
+            started = getattr(context, '_query_stats_started', None)
+            if started is None or not has_request_context():
+                return
+            stats = g.get('query_stats')
+            if stats is None:
+                return
+            stats.queries += 1
+            stats.db_ms += (time.perf_counter() - started) * 1000
+            stats.shapes[statement_shape(statement)] += 1
+
+    # --------------------------
+    # 请求钩子
+    # --------------------------
+    def _start_request(self):
+        from flask import g
+        g.query_stats = _RequestStats()
+
+    def _finish_request(self, response):
+        from flask import g, request
+
+        stats = g.pop('query_stats', None)
+        if stats is None:
+            return response
+        if self.headers:
+            response.headers['X-DB-Queries'] = str(stats.queries)
+            response.headers['X-DB-Time'] = f'{stats.db_ms:.2f}'
+
+        endpoint = request.endpoint or request.path
+        repeated = [(shape, count) for shape, count in stats.shapes.most_common(5)
+                    if count >= self.n_plus_one_threshold]
+        with self._lock:
+            self.requests += 1
+            totals = self._endpoints.setdefault(endpoint, [0, 0, 0, 0.0])
+            totals[0] += 1
+            totals[1] += stats.queries
+            totals[2] = max(totals[2], stats.queries)
+            totals[3] += stats.db_ms
+
+        if repeated or stats.queries >= self.max_queries or stats.db_ms >= self.max_db_ms:
+            record = {
+                'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'method': request.method,
+                'path': request.full_path.rstrip('?'),
+                'endpoint': endpoint,
+                'status': response.status_code,
+                'queries': stats.queries,
+                'db_ms': round(stats.db_ms, 2),
+                'total_ms': round((time.perf_counter() - stats.started) * 1000, 2),
+                'repeated': [{'statement': shape[:500], 'count': count} for shape, count in repeated]
+            }
+            with self._lock:
+                self._worst.append(record)
+                self.flagged += 1
+            for shape, count in repeated:
+                logger.warning('疑似 N+1 查询：%s %s 同一语句执行 %d 次：%s', request.method, request.path, count, shape[:200])
+        return response
+
+    # --------------------------
+    # 报告
+    # --------------------------
+    def report(self, limit=None):
+        """最差请求（按查询条数、数据库耗时倒序）+ 按端点汇总"""
+        with self._lock:
+            worst = sorted(self._worst, key=lambda r: (r['queries'], r['db_ms']), reverse=True)
+            endpoints = [
+                {'endpoint': endpoint, 'requests': count, 'avg_queries': round(queries / count, 2),
+                 'max_queries': max_queries, 'avg_db_ms': round(db_ms / count, 2)}
+                for endpoint, (count, queries, max_queries, db_ms) in self._endpoints.items()
+            ]
+        endpoints.sort(key=lambda e: (e['max_queries'], e['avg_queries']), reverse=True)
+        return {
+            'enabled': self.enabled,
+            'thresholds': {'n_plus_one': self.n_plus_one_threshold, 'max_queries': self.max_queries,
+                           'max_db_ms': self.max_db_ms},
+            'worst_requests': worst[:limit] if limit else worst,
+            'endpoints': endpoints
+        }
+
+    def stats(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'requests': self.requests,
+            'flagged': self.flagged,
+            'buffered': len(self._worst)
+        }
+
+
+# 全局实例（在 create_app 中初始化）
+query_stats = QueryStats()
@@ -0,0 +1,90 @@
+# app/utils/schema.py
+"""
+数据库结构维护：列迁移 + 建表 + 补建新增索引 + 聊天全文索引（FTS5）+ 购物圈物化表初始化
+
+db.create_all() 只会在建表时一并创建索引，已存在的表（如线上 site100.db）
+不会自动补上后续在模型里新增的索引，这里逐个检查并补建。
+已存在的表新增/替换列（如价格由浮点元改为整数分）在建表前原地迁移。
+"""
+import logging
+
+from sqlalchemy import inspect
+
+logger = logging.getLogger(__name__)
+
+
+def _columns(inspector, table):
+    return {column['name'] for column in inspector.get_columns(table)} if inspector.has_table(table) else None
+
+
+def migrate_price_cents(db):
+    """
+    价格列迁移：ShoppingInfo.price / ShoppingCircle.total_price（浮点，元）-> *_cents（整数，分）
+
+    - 新增整数列并按 ROUND(元 * 100) 回填，再删除旧的浮点列（SQLite >= 3.35 支持 DROP COLUMN）
+    - 购物圈总价按当前商品重新求和（此后由添加/删除商品增量维护），并回填商品数
+    - 购物圈物化表是派生数据，旧结构直接删除，随后由 ensure_schema 重新建表并初始化
+    """
+    inspector = inspect(db.engine)
+    info_columns = _columns(inspector, 'shopping_info')
+    circle_columns = _columns(inspector, 'shopping_circle')
+    feed_columns = _columns(inspector, 'open_demand_feed')
+
+    steps = []
+    if info_columns is not None and 'price_cents' not in info_columns:
+        steps += [
+            "ALTER TABLE shopping_info ADD COLUMN price_cents INTEGER NOT NULL DEFAULT 0",
+            "UPDATE shopping_info SET price_cents = CAST(ROUND(price * 100) AS INTEGER)",
+        ]
+    if info_columns is not None and 'price' in info_columns:
+        steps.append("ALTER TABLE shopping_info DROP COLUMN price")
+    if circle_columns is not None and 'total_price_cents' not in circle_columns:
+        steps += [
+            "ALTER TABLE shopping_circle ADD COLUMN total_price_cents INTEGER NOT NULL DEFAULT 0",
+            "ALTER TABLE shopping_circle ADD COLUMN item_count INTEGER NOT NULL DEFAULT 0",
+            "UPDATE shopping_circle SET "
+            "total_price_cents = (SELECT COALESCE(SUM(i.price_cents), 0) FROM shopping_info i "
+            "WHERE i.user_id = shopping_circle.user_id), "
+            "item_count = (SELECT COUNT(*) FROM shopping_info i WHERE i.user_id = shopping_circle.user_id)",
+        ]
+    if circle_columns is not None and 'total_price' in circle_columns:
+        steps.append("ALTER TABLE shopping_circle DROP COLUMN total_price")
+    if feed_columns is not None and 'total_price_cents' not in feed_columns:
+        steps.append("DROP TABLE open_demand_feed")
+
+    if not steps:
+        return False
+    with db.engine.begin() as conn:
+        for sql in steps:
+            conn.exec_driver_sql(sql)
+    logger.info('价格列已迁移为整数分（执行 %d 步）', len(steps))
+    return True
+
+
+def ensure_schema(db):
+    """迁移已有表的列，创建缺失的表，并为已存在的表补建模型中声明的索引"""
+    inspector = inspect(db.engine)
+    is_first_run = not inspector.has_table("user")
+
+    if not is_first_run:
+        migrate_price_cents(db)
+    # 迁移可能删除了旧结构的物化表，重新检查
+    feed_created = not inspect(db.engine).has_table('open_demand_feed')
+
+    # create_all 默认 checkfirst=True，已存在的表会跳过
+    db.create_all()
+
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+    # 聊天消息全文索引（仅 SQLite），首次创建时用已有消息填充
+    from app.utils.chat_search import ensure_search_index
+    ensure_search_index(db)
+
+    # 购物圈物化表只在本次新建时从源数据初始化（已存在的表不在启动时重建）
+    if feed_created:
+        from app.utils.demand_feed import ensure_demand_feed
+        ensure_demand_feed()
+
+    return is_first_run
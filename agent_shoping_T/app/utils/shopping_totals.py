@@ -0,0 +1,44 @@
+# app/utils/shopping_totals.py
+"""
+购物清单合计（金额单位：分）
+
+- 购物页面的合计用一条 SQL 的 SUM/COUNT 计算，不再加载全部商品后在 Python 中求和
+- 已提交的购物圈（ShoppingCircle）的总价与商品数在添加/删除商品时用 SQL 原地增减，
+  提交购物圈、批量导入结束时再按 SUM 校准一次
+"""
+from sqlalchemy import func, update
+
+from app import db
+from app.models.shopping import ShoppingCircle, ShoppingInfo
+
+
+def cart_totals(user_id):
+    """用户当前商品的 (总价（分）, 商品数)，一条 SQL"""
+    total_cents, item_count = db.session.query(
+        func.coalesce(func.sum(ShoppingInfo.price_cents), 0),
+        func.count(ShoppingInfo.id)
+    ).filter(ShoppingInfo.user_id == user_id).one()
+    return int(total_cents), int(item_count)
+
+
+def apply_item_delta(user_id, cents_delta, count_delta):
+    """添加/删除商品后原地增减购物圈的总价与商品数（未提交购物圈时不做任何事）；不提交事务"""
+    db.session.execute(
+        update(ShoppingCircle)
+        .where(ShoppingCircle.user_id == user_id)
+        .values(
+            total_price_cents=ShoppingCircle.total_price_cents + cents_delta,
+            item_count=ShoppingCircle.item_count + count_delta
+        )
+    )
+
+
+def sync_circle_totals(user_id):
+    """按当前商品重新计算购物圈的总价与商品数（批量导入结束后校准一次）；不提交事务"""
+    total_cents, item_count = cart_totals(user_id)
+    db.session.execute(
+        update(ShoppingCircle)
+        .where(ShoppingCircle.user_id == user_id)
+        .values(total_price_cents=total_cents, item_count=item_count)
+    )
+    return total_cents, item_count
@@ -0,0 +1,267 @@
+# app/utils/slow_query_log.py
+"""
+慢查询日志：记录超过阈值的 SQL，并为每种语句形状自动抓取一次执行计划
+
+- 通过 SQLAlchemy 引擎事件计时，耗时 >= SLOW_QUERY_THRESHOLD_MS 的语句追加一行 JSON 到 SLOW_QUERY_LOG_PATH
+- 每行包含：语句形状（IN 列表已折叠）及其短哈希 shape_id、参数形状（只记类型不记值，避免手机号等落盘）、
+  所在路由（HTTP 请求的端点/路径，后台任务记为线程名）、触发查询的应用代码位置、耗时
+- 同一形状首次变慢时执行 EXPLAIN QUERY PLAN（SQLite）或 EXPLAIN（其他数据库）并写入该行的 plan 字段；
+  SQLite 计划中出现不带索引的 SCAN <表> 时标记 full_scan
+- `flask slow-queries` 按 shape_id 汇总（次数、总/最大耗时、路由、是否全表扫描、执行计划），据此决定补哪些索引
+- SLOW_QUERY_LOG_ENABLED 关闭时不注册任何事件；文件超过 SLOW_QUERY_LOG_MAX_BYTES 时轮转为 .1
+"""
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+
+from app.utils.query_stats import statement_shape
+
+logger = logging.getLogger(__name__)
+
+_EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT')
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+
+
+def _type_name(value):
+    return 'null' if value is None else type(value).__name__
+
+
+def parameter_shape(parameters, executemany=False):
+    """参数形状：只保留类型（executemany 记录批量条数）"""
+    if executemany:
+        rows = list(parameters or ())
+        return {'executemany': len(rows), 'row': parameter_shape(rows[0]) if rows else None}
+    if isinstance(parameters, dict):
+        return {key: _type_name(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        types = [_type_name(value) for value in parameters]
+        return types if len(types) <= 20 else types[:20] + [f'...+{len(types) - 20}']
+    return None
+
+
+def _call_site():
+    """触发查询的应用代码位置（调用栈中最近一帧 app/ 下、且不属于本模块的代码）"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(_APP_DIR) and filename != _THIS_FILE:
+            return f'{os.path.relpath(filename, os.path.dirname(_APP_DIR))}:{frame.f_lineno} ({frame.f_code.co_name})'
+        frame = frame.f_back
+    return None
+
+
+def _route():
+    from flask import has_request_context, request
+    if has_request_context():
+        return f'{request.method} {request.endpoint or request.path}'
+    return f'thread:{threading.current_thread().name}'
+
+
+def _is_full_scan(plan):
+    """SQLite 计划中不带索引的 SCAN <表>（按索引顺序扫描、覆盖索引扫描不算）即全表扫描"""
+    for row in plan or ():
+        detail = str(row[-1]) if isinstance(row, (list, tuple)) else str(row)
+        if detail.startswith('SCAN ') and ' USING ' not in detail and detail != 'SCAN CONSTANT ROW':
+            return True
+    return False
+
+
+class SlowQueryLog:
+    """超过阈值的 SQL 写入 JSON Lines 文件，每种形状抓取一次执行计划"""
+
+    def __init__(self):
+        self.enabled = False
+        self.threshold_ms = 100.0
+        self.path = None
+        self.max_bytes = 50 * 1024 * 1024
+        self.explain = True
+
+        self._explained = set()         # 已抓取过执行计划的 shape_id
+        self._lock = threading.Lock()
+        self._events_registered = False
+
+        # 统计信息
+        self.logged = 0
+        self.explained = 0
+        self.errors = 0
+
+    def init_app(self, app):
+        self.enabled = bool(app.config.get('SLOW_QUERY_LOG_ENABLED', False))
+        app.extensions['slow_query_log'] = self
+        self.path = app.config.get('SLOW_QUERY_LOG_PATH')
+        if not self.enabled:
+            return
+
+        self.threshold_ms = float(app.config.get('SLOW_QUERY_THRESHOLD_MS', 100))
+        self.max_bytes = int(app.config.get('SLOW_QUERY_LOG_MAX_BYTES', 50 * 1024 * 1024))
+        self.explain = bool(app.config.get('SLOW_QUERY_EXPLAIN', True))
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._register_engine_events()
+
+    # --------------------------
+    # 引擎事件
+    # --------------------------
+    def _register_engine_events(self):
+        # 按 Engine 类注册（不依赖应用上下文），多次 create_app 时只注册一次
+        if self._events_registered:
+            return
+        self._events_registered = True
+
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        # 开始时间记在本次执行的上下文上（与 query_stats 相同）：失败的语句不会在连接上残留计时
+        @event.listens_for(Engine, 'before_cursor_execute')
+        def _before_execute(conn, cursor, statement, parameters, context, executemany):
+            if context is not None:
+                context._slow_query_started = time.perf_counter()
+
+        @event.listens_for(Engine, 'after_cursor_execute')
+        def _after_execute(conn, cursor, statement, parameters, context, executemany):
+            started = getattr(context, '_slow_query_started', None)
+            if started is None:
+                return
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if elapsed_ms < self.threshold_ms:
+                return
+            try:
+                self._record(conn, statement, parameters, executemany, elapsed_ms)
+            except Exception as e:
+                self.errors += 1
+                logger.warning('慢查询日志写入失败：%s', e)
+
+    def _record(self, conn, statement, parameters, executemany, elapsed_ms):
+        shape = statement_shape(statement)
+        shape_id = hashlib.sha1(shape.encode('utf-8')).hexdigest()[:12]
+        record = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'shape_id': shape_id,
+            'ms': round(elapsed_ms, 3),
+            'route': _route(),
+            'call_site': _call_site(),
+            'statement': shape,
+            'params': parameter_shape(parameters, executemany)
+        }
+
+        with self._lock:
+            first_seen = shape_id not in self._explained
+            self._explained.add(shape_id)
+        if first_seen and self.explain:
+            plan = self._explain(conn, statement, parameters, executemany)
+            if plan is not None:
+                record['plan'] = plan
+                if conn.dialect.name == 'sqlite':
+                    record['full_scan'] = _is_full_scan(plan)
+                self.explained += 1
+        self._write(record)
+
+    @staticmethod
+    def _explain(conn, statement, parameters, executemany):
+        """在同一连接上用 DBAPI 游标执行 EXPLAIN（不经过引擎事件，不会递归记录）"""
+        words = statement.split(None, 1)
+        if not words or words[0].upper() not in _EXPLAINABLE:
+            return None
+        if executemany:
+            parameters = next(iter(parameters), ()) if parameters else ()
+        prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters or ())
+            return [list(row) for row in cursor.fetchall()]
+        except Exception as e:
+            return [f'EXPLAIN 失败：{str(e)}']
+        finally:
+            cursor.close()
+
+    def _write(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        with self._lock:
+            if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                os.replace(self.path, self.path + '.1')
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self.logged += 1
+
+    # --------------------------
+    # 汇总
+    # --------------------------
+    @staticmethod
+    def summarize(path):
+        """按 shape_id 汇总日志文件（总耗时倒序）"""
+        groups = {}
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                group = groups.setdefault(record['shape_id'], {
+                    'shape_id': record['shape_id'], 'statement': record['statement'], 'count': 0,
+                    'total_ms': 0.0, 'max_ms': 0.0, 'routes': {}, 'call_sites': {}, 'plan': None, 'full_scan': None
+                })
+                group['count'] += 1
+                group['total_ms'] += record['ms']
+                group['max_ms'] = max(group['max_ms'], record['ms'])
+                group['routes'][record.get('route')] = group['routes'].get(record.get('route'), 0) + 1
+                if record.get('call_site'):
+                    group['call_sites'][record['call_site']] = group['call_sites'].get(record['call_site'], 0) + 1
+                if 'plan' in record:
+                    group['plan'] = record['plan']
+                    group['full_scan'] = record.get('full_scan')
+        return sorted(groups.values(), key=lambda g: g['total_ms'], reverse=True)
+
+    def stats(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'threshold_ms': self.threshold_ms,
+            'logged': self.logged,
+            'shapes': len(self._explained),
+            'explained': self.explained,
+            'errors': self.errors
+        }
+
+
+# 全局实例（在 create_app 中初始化）
+slow_query_log = SlowQueryLog()
+
+
+@click.command('slow-queries')
+@click.option('--path', default=None, help='日志文件（默认 SLOW_QUERY_LOG_PATH）')
+@click.option('--top', default=20, show_default=True, help='显示前 N 种语句')
+@click.option('--full-scan-only', is_flag=True, help='只显示全表扫描的语句')
+@click.option('--json', 'as_json', is_flag=True, help='以 JSON 输出')
+@with_appcontext
+def slow_queries_command(path, top, full_scan_only, as_json):
+    """按语句形状汇总慢查询日志（次数、耗时、路由、执行计划）"""
+    path = path or slow_query_log.path
+    if not path or not os.path.exists(path):
+        click.echo(f'慢查询日志不存在：{path}')
+        return
+    groups = slow_query_log.summarize(path)
+    if full_scan_only:
+        groups = [group for group in groups if group['full_scan']]
+    groups = groups[:top]
+
+    if as_json:
+        click.echo(json.dumps(groups, ensure_ascii=False, indent=2))
+        return
+    for group in groups:
+        scan = {True: '全表扫描', False: '走索引', None: '无计划'}[group['full_scan']]
+        click.echo(f"[{group['shape_id']}] {group['count']} 次，总 {group['total_ms']:.1f}ms，"
+                   f"最大 {group['max_ms']:.1f}ms，{scan}")
+        click.echo(f"  {group['statement'][:300]}")
+        for route, count in sorted(group['routes'].items(), key=lambda item: -item[1])[:3]:
+            click.echo(f'  路由 {route}：{count} 次')
+        for call_site, count in sorted(group['call_sites'].items(), key=lambda item: -item[1])[:3]:
+            click.echo(f'  代码 {call_site}：{count} 次')
+        for row in group['plan'] or ():
+            click.echo(f'  计划 {row[-1] if isinstance(row, list) else row}')
@@ -0,0 +1,58 @@
+# app/utils/socket_queue.py
+"""
+Socket.IO 消息队列（多进程部署时共享房间广播）
+
+- redis:// / rediss://：使用 python-socketio 自带的 RedisManager，多进程/多机共享房间
+- local://：进程内的发布订阅（LocalPubSubManager），不跨进程，仅用于测试/单机调试
+- 其余 URL（amqp:// 等）交给 Flask-SocketIO 按协议自动选择（Kombu 等）
+- 未配置时保持单进程模式
+"""
+import json
+import queue
+from collections import defaultdict
+
+import socketio
+
+
+class LocalPubSubManager(socketio.PubSubManager):
+    """
+    进程内发布订阅管理器
+
+    同一进程中使用相同 channel 的多个 SocketIO 服务端共享房间广播，
+    行为与 RedisManager 一致（消息以 JSON 字符串在服务端之间传递），用于测试多 worker 场景。
+    """
+    name = 'local'
+
+    # channel -> 订阅该 channel 的各服务端接收队列
+    _subscribers = defaultdict(list)
+
+    def __init__(self, channel='flask-socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self._queue = queue.Queue()
+        if not write_only:
+            self._subscribers[channel].append(self._queue)
+
+    def _publish(self, data):
+        message = json.dumps(data)
+        for subscriber in list(self._subscribers[self.channel]):
+            subscriber.put(message)
+
+    def _listen(self):
+        while True:
+            yield self._queue.get()
+
+
+def is_shared_queue(url):
+    """是否为可跨进程共享的消息队列（local:// 只在进程内有效）"""
+    return bool(url) and not url.startswith('local://')
+
+
+def socketio_queue_options(config) -> dict:
+    """根据配置生成 socketio.init_app 的消息队列参数"""
+    url = config.get('SOCKETIO_MESSAGE_QUEUE')
+    channel = config.get('SOCKETIO_CHANNEL', 'flask-socketio')
+    if not url:
+        return {}
+    if url.startswith('local://'):
+        return {'client_manager': LocalPubSubManager(channel=channel)}
+    return {'message_queue': url, 'channel': channel}
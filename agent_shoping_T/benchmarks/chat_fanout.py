@@ -0,0 +1,198 @@
+"""
+聊天广播压测：模拟 N 个客户端分布在 M 个房间里收发消息
+
+完全离线运行：使用临时 SQLite 数据库和 Flask-SocketIO 测试客户端（不需要 Redis / 网络），
+可在改动前后各跑一次对比结果。
+
+统计指标：
+- 广播延迟 p50/p95/p99（send_message 从发出到房间内所有客户端收到）
+- 吞吐量（消息/秒）
+- 数据库 commit 耗时（会话 commit 事件计时），写后模式下另附批量写入统计
+
+用法：
+    python benchmarks/chat_fanout.py --clients 200 --rooms 20 --messages 5000 --rate 1000
+    python benchmarks/chat_fanout.py --sync          # 对比同步写入模式
+    python benchmarks/chat_fanout.py --json          # 输出 JSON，便于保存对比
+"""
+import eventlet
+
+eventlet.monkey_patch()
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(pct / 100.0 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def summarize(values):
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 50), 3),
+        'p95_ms': round(percentile(values, 95), 3),
+        'p99_ms': round(percentile(values, 99), 3),
+        'max_ms': round(max(values), 3) if values else 0.0
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='聊天广播压测（离线）')
+    parser.add_argument('--clients', type=int, default=100, help='模拟客户端总数')
+    parser.add_argument('--rooms', type=int, default=10, help='房间（绑定）数')
+    parser.add_argument('--messages', type=int, default=2000, help='发送消息总数')
+    parser.add_argument('--rate', type=float, default=0, help='目标发送速率（条/秒），0 表示不限速')
+    parser.add_argument('--sync', action='store_true', help='关闭写后缓冲，每条消息同步 commit')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.clients < args.rooms * 2:
+        sys.exit('客户端数至少为房间数的 2 倍（每个房间至少一个代购、一个买家）')
+
+    # 必须在导入应用之前设置：临时数据库、单进程、无消息队列（测试客户端不支持消息队列）
+    workdir = tempfile.mkdtemp(prefix='chat_bench_')
+    os.environ['DATABASE_URI'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['CHAT_WRITE_BEHIND'] = '0' if args.sync else '1'
+    os.environ['SOCKETIO_MESSAGE_QUEUE'] = ''
+    os.environ['SOCKETIO_WORKERS'] = '1'
+    sys.path.insert(0, BASE_DIR)
+    os.chdir(BASE_DIR)
+
+    import run  # 注册 Socket.IO 事件处理函数并创建 app
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    from app import db, socketio
+    from app.models import User, Binding, ChatMessage
+    from app.utils.chat_writer import chat_writer
+
+    app = run.app
+
+    # 准备数据：每个房间一个代购 + 一个买家
+    rooms = []
+    with app.app_context():
+        for i in range(args.rooms):
+            agent = User(username=f'bench_agent_{i}', phone=f'139{i:08d}', is_agent=True)
+            buyer = User(username=f'bench_buyer_{i}', phone=f'138{i:08d}', is_agent=False)
+            db.session.add_all([agent, buyer])
+            db.session.flush()
+            binding = Binding(agent_id=agent.id, buyer_id=buyer.id, status='confirmed')
+            db.session.add(binding)
+            db.session.flush()
+            rooms.append((str(binding.id), agent.id, buyer.id))
+        db.session.commit()
+
+    # 数据库 commit 计时
+    commit_times = []
+    commit_started = {}
+
+    @event.listens_for(Session, 'before_commit')
+    def _before_commit(session):
+        commit_started[id(session)] = time.perf_counter()
+
+    @event.listens_for(Session, 'after_commit')
+    def _after_commit(session):
+        started = commit_started.pop(id(session), None)
+        if started is not None:
+            commit_times.append((time.perf_counter() - started) * 1000)
+
+    # 建立客户端：轮流分配到各房间，交替以代购/买家身份登录
+    clients_by_room = {room_id: [] for room_id, _, _ in rooms}
+    clients = []
+    for i in range(args.clients):
+        room_id, agent_id, buyer_id = rooms[i % args.rooms]
+        user_id = agent_id if (i // args.rooms) % 2 == 0 else buyer_id
+        http_client = app.test_client()
+        with http_client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        sio_client = socketio.test_client(app, flask_test_client=http_client)
+        sio_client.emit('join_chat', {'room_id': room_id})
+        clients.append((room_id, sio_client))
+        clients_by_room[room_id].append(sio_client)
+    for _, sio_client in clients:
+        sio_client.get_received()
+
+    # 发送消息
+    commit_times.clear()
+    latencies = []
+    deliveries = 0
+    expected_deliveries = 0
+    interval = 1.0 / args.rate if args.rate > 0 else 0
+    started = time.perf_counter()
+    for i in range(args.messages):
+        room_id, sender = clients[i % len(clients)]
+        if interval:
+            # 按目标速率发送，空闲时让出给后台写入协程
+            delay = started + i * interval - time.perf_counter()
+            if delay > 0:
+                eventlet.sleep(delay)
+
+        sent_at = time.perf_counter()
+        sender.emit('send_message', {'room_id': room_id, 'content': f'压测消息 #{i}'})
+        latencies.append((time.perf_counter() - sent_at) * 1000)
+
+        expected_deliveries += len(clients_by_room[room_id])
+        for receiver in clients_by_room[room_id]:
+            deliveries += sum(1 for packet in receiver.get_received() if packet['name'] == 'chat_message')
+        if not interval and i % 100 == 0:
+            eventlet.sleep(0)
+    elapsed = time.perf_counter() - started
+
+    # 落库并校验
+    with app.app_context():
+        chat_writer.flush()
+        persisted = ChatMessage.query.count()
+
+    result = {
+        'config': {
+            'clients': args.clients,
+            'rooms': args.rooms,
+            'messages': args.messages,
+            'rate': args.rate,
+            'mode': chat_writer.stats()['mode']
+        },
+        'elapsed_s': round(elapsed, 3),
+        'messages_per_sec': round(args.messages / elapsed, 1) if elapsed else 0.0,
+        'deliveries': deliveries,
+        'expected_deliveries': expected_deliveries,
+        'persisted_messages': persisted,
+        'broadcast_latency': summarize(latencies),
+        'db_commit': summarize(commit_times),
+        'chat_writer': chat_writer.stats()
+    }
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    cfg = result['config']
+    print('\n==== 聊天广播压测结果 ====')
+    print(f"客户端 {cfg['clients']}，房间 {cfg['rooms']}，消息 {cfg['messages']}，"
+          f"目标速率 {cfg['rate'] or '不限'}，写入模式 {cfg['mode']}")
+    print(f"耗时 {result['elapsed_s']}s，吞吐 {result['messages_per_sec']} 条/秒")
+    print(f"投递 {result['deliveries']}/{result['expected_deliveries']}，落库 {result['persisted_messages']} 条")
+    for title, key in (('广播延迟', 'broadcast_latency'), ('DB commit', 'db_commit')):
+        stats = result[key]
+        print(f"{title}：n={stats['count']} p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms "
+              f"p99={stats['p99_ms']}ms max={stats['max_ms']}ms")
+    writer = result['chat_writer']
+    if writer['mode'] == 'write_behind':
+        print(f"批量写入：{writer['flush_count']} 批 / {writer['flushed_messages']} 条，"
+              f"平均 {writer['avg_flush_ms']}ms，最大 {writer['max_flush_ms']}ms")
+
+
+if __name__ == '__main__':
+    main()
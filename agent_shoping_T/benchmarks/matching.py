@@ -0,0 +1,220 @@
+"""
+行程匹配压测：十万级已提交行程 + 开放购物圈下的匹配查询延迟
+
+完全离线运行：使用临时 SQLite 数据库批量写入测试数据，再从数据库加载匹配索引（同线上路径）。
+
+统计指标：
+- 索引从数据库全量加载耗时
+- 买家匹配代购（地点 + 日期窗口 / 仅地点 / 仅日期）延迟 p50/p95/p99
+- 代购匹配购物圈延迟（某词元首次查询需扫描建立倒排表，单独统计）
+- 增量维护：单条行程新增/删除耗时，以及经会话事件（commit）生效的端到端耗时
+
+用法：
+    python benchmarks/matching.py                              # 默认 10 万行程、2 万购物圈
+    python benchmarks/matching.py --itineraries 100000 --circles 50000 --queries 5000
+    python benchmarks/matching.py --json                       # 输出 JSON，便于保存对比
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 地点：城市 × 区域，组合出数百个不同的地点写法
+CITIES = ['东京都', '大阪', '京都府', '首尔', '釜山', '香港', '澳门', '台北', '曼谷', '新加坡', '吉隆坡', '巴黎',
+          '伦敦', '米兰', '纽约', '洛杉矶', '悉尼', '墨尔本', '札幌', '福冈', '冲绳', 'Tokyo', 'Osaka', 'Seoul',
+          'Paris', 'London', 'New York', 'Sydney', '迪拜', '多伦多']
+AREAS = ['', '', '', '新宿', '银座', '心斋桥', '明洞', '铜锣湾', '市中心', '机场', '奥特莱斯', '免税店']
+PRODUCTS = ['面霜', '精华', '奶粉', '手表', '包', '药妆', '零食', '球鞋', '香水', '耳机', '限定款', '口红']
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(pct / 100.0 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def summarize(values):
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 50), 4),
+        'p95_ms': round(percentile(values, 95), 4),
+        'p99_ms': round(percentile(values, 99), 4),
+        'max_ms': round(max(values), 4) if values else 0.0
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='行程匹配压测（离线）')
+    parser.add_argument('--itineraries', type=int, default=100000, help='已提交行程数')
+    parser.add_argument('--circles', type=int, default=20000, help='开放购物圈数')
+    parser.add_argument('--queries', type=int, default=2000, help='每类查询次数')
+    parser.add_argument('--limit', type=int, default=20, help='每次返回条数')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    return parser.parse_args()
+
+
+def random_location(rng):
+    city = rng.choice(CITIES)
+    area = rng.choice(AREAS)
+    return f'{city}{area}' if area and not city.isascii() else city
+
+
+def seed_database(db, args, rng):
+    """批量写入：代购用户 + 已提交行程、买家 + 购物圈 + 购物圈物化表"""
+    from sqlalchemy import insert
+    from app.models import User, AgentInfo, ShoppingCircle, OpenDemandFeed
+
+    now = datetime.now()
+    today = now.replace(hour=9, minute=0, second=0, microsecond=0)
+    batch = 10000
+
+    for offset in range(0, args.itineraries, batch):
+        count = min(batch, args.itineraries - offset)
+        db.session.execute(insert(User), [
+            {'id': offset + i + 1, 'username': f'agent_{offset + i}', 'phone': f'139{offset + i:08d}',
+             'is_agent': True, 'created_at': now}
+            for i in range(count)
+        ])
+        db.session.execute(insert(AgentInfo), [
+            {'user_id': offset + i + 1, 'location': random_location(rng), 'itinerary': '行程',
+             'time': today + timedelta(days=rng.randint(-30, 365)), 'is_submitted': True, 'created_at': now}
+            for i in range(count)
+        ])
+        db.session.commit()
+
+    base_id = args.itineraries
+    for offset in range(0, args.circles, batch):
+        count = min(batch, args.circles - offset)
+        buyers = [base_id + offset + i + 1 for i in range(count)]
+        db.session.execute(insert(User), [
+            {'id': user_id, 'username': f'buyer_{user_id}', 'phone': f'138{user_id:08d}',
+             'is_agent': False, 'created_at': now}
+            for user_id in buyers
+        ])
+        db.session.execute(insert(ShoppingCircle), [
+            {'id': user_id, 'user_id': user_id, 'total_price_cents': 10000, 'item_count': 3,
+             'submit_time': now - timedelta(minutes=rng.randint(0, 60 * 24 * 30))}
+            for user_id in buyers
+        ])
+        rows = []
+        for user_id in buyers:
+            products = [
+                {'id': user_id * 10 + j, 'serial_number': str(j), 'product_name': f'{rng.choice(CITIES)}{rng.choice(PRODUCTS)}',
+                 'price_cents': 3000, 'product_image': None, 'description': rng.choice(['', '限定', '免税店购买'])}
+                for j in range(3)
+            ]
+            rows.append({'circle_id': user_id, 'user_id': user_id, 'username': f'buyer_{user_id}',
+                         'phone': f'138{user_id:08d}', 'submit_time': now - timedelta(minutes=rng.randint(0, 43200)),
+                         'total_price_cents': 9000, 'product_count': 3, 'thumbnail': None,
+                         'products_json': json.dumps(products, ensure_ascii=False), 'updated_at': now})
+        db.session.execute(insert(OpenDemandFeed), rows)
+        db.session.commit()
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+
+    # 必须在导入应用之前设置临时数据库
+    workdir = tempfile.mkdtemp(prefix='matching_bench_')
+    os.environ['DATABASE_URI'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    sys.path.insert(0, BASE_DIR)
+    os.chdir(BASE_DIR)
+
+    from app import create_app, db
+    from app.models import AgentInfo
+    from app.utils.matching import matching_index, location_tokens
+
+    app = create_app('production')
+    with app.app_context():
+        started = time.perf_counter()
+        seed_database(db, args, rng)
+        seed_s = time.perf_counter() - started
+
+        matching_index.load()
+        load_ms = matching_index.last_load_ms
+
+        today = datetime.now().date()
+        latencies = {'location_and_window': [], 'location_only': [], 'window_only': [],
+                     'circles_cold': [], 'circles_warm': []}
+        returned = []
+        for _ in range(args.queries):
+            location = random_location(rng)
+            date_from = today + timedelta(days=rng.randint(0, 300))
+            date_to = date_from + timedelta(days=rng.randint(3, 30))
+            for kind, kwargs in (
+                ('location_and_window', {'location': location, 'date_from': date_from, 'date_to': date_to}),
+                ('location_only', {'location': location}),
+                ('window_only', {'date_from': date_from, 'date_to': date_to}),
+            ):
+                started = time.perf_counter()
+                matches = matching_index.match_trips(limit=args.limit, **kwargs)
+                latencies[kind].append((time.perf_counter() - started) * 1000)
+                returned.append(len(matches))
+
+            cold = any(token not in matching_index._circle_postings for token in location_tokens(location))
+            started = time.perf_counter()
+            matching_index.match_circles(location, limit=args.limit)
+            latencies['circles_cold' if cold else 'circles_warm'].append((time.perf_counter() - started) * 1000)
+
+        # 增量维护：直接调用
+        update_ms = []
+        for i in range(min(args.queries, 1000)):
+            trip_id = args.itineraries + 10 ** 6 + i
+            started = time.perf_counter()
+            matching_index.add_trip(trip_id, trip_id, random_location(rng), datetime.now() + timedelta(days=i % 90))
+            matching_index.remove_trip(trip_id)
+            update_ms.append((time.perf_counter() - started) * 1000 / 2)
+
+        # 增量维护：经会话事件（保存行程 -> commit -> 索引可查）
+        info = db.session.get(AgentInfo, 1)
+        info.location = '基准测试专用地点'
+        started = time.perf_counter()
+        db.session.commit()
+        visible = bool(matching_index.match_trips(location='基准测试专用地点', date_from=today - timedelta(days=60)))
+        commit_to_visible_ms = (time.perf_counter() - started) * 1000
+
+    result = {
+        'config': {'itineraries': args.itineraries, 'circles': args.circles,
+                   'queries': args.queries, 'limit': args.limit},
+        'seed_s': round(seed_s, 2),
+        'index_load_ms': round(load_ms, 1),
+        'index': matching_index.stats(),
+        'avg_results': round(sum(returned) / len(returned), 1) if returned else 0,
+        'latency': {kind: summarize(values) for kind, values in latencies.items()},
+        'incremental_update': summarize(update_ms),
+        'commit_to_visible_ms': round(commit_to_visible_ms, 3),
+        'update_visible_after_commit': visible
+    }
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    cfg = result['config']
+    print('\n==== 行程匹配压测结果 ====')
+    print(f"行程 {cfg['itineraries']}，购物圈 {cfg['circles']}，每类查询 {cfg['queries']} 次，每次返回 {cfg['limit']} 条")
+    print(f"写入测试数据 {result['seed_s']}s，索引加载 {result['index_load_ms']}ms，"
+          f"不同地点 {result['index']['locations']} 个，平均返回 {result['avg_results']} 条")
+    titles = {'location_and_window': '地点+日期', 'location_only': '仅地点', 'window_only': '仅日期',
+              'circles_cold': '购物圈（冷）', 'circles_warm': '购物圈（热）'}
+    for kind, title in titles.items():
+        stats = result['latency'][kind]
+        print(f"{title}：n={stats['count']} p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms "
+              f"p99={stats['p99_ms']}ms max={stats['max_ms']}ms")
+    stats = result['incremental_update']
+    print(f"增量维护（单条）：p50={stats['p50_ms']}ms p99={stats['p99_ms']}ms；"
+          f"commit 后立即可查：{result['update_visible_after_commit']}（{result['commit_to_visible_ms']}ms）")
+
+
+if __name__ == '__main__':
+    main()
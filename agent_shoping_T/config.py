@@ -15,6 +15,96 @@ class Config:
     # 上传配置
     UPLOAD_FOLDER = os.path.join(BASE_DIR, 'app', 'static', 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 最大上传16MB
+    # 商品图片下发：''（由 Flask 发送）/ 'x-sendfile'（Apache 等）/ 'x-accel-redirect'（Nginx，内部路径前缀见 UPLOAD_ACCEL_PREFIX）
+    UPLOAD_OFFLOAD = os.getenv('UPLOAD_OFFLOAD', '')
+    # Nginx 示例：location /protected-uploads/ { internal; alias <UPLOAD_FOLDER>/; }
+    UPLOAD_ACCEL_PREFIX = os.getenv('UPLOAD_ACCEL_PREFIX', '/protected-uploads/')
+    # 旧文件名（非内容寻址）图片的缓存时间（秒）
+    UPLOAD_LEGACY_MAX_AGE = int(os.getenv('UPLOAD_LEGACY_MAX_AGE', 3600))
+    # 商品图片缩略图生成线程数（需安装 Pillow）
+    IMAGE_RENDITION_WORKERS = int(os.getenv('IMAGE_RENDITION_WORKERS', 2))
+    # 商品图片分块上传：单块上限、单个文件上限、未完成会话保留时间（小时）
+    CHUNKED_UPLOAD_CHUNK_SIZE = int(os.getenv('CHUNKED_UPLOAD_CHUNK_SIZE', 1024 * 1024))
+    CHUNKED_UPLOAD_MAX_SIZE = int(os.getenv('CHUNKED_UPLOAD_MAX_SIZE', 32 * 1024 * 1024))
+    CHUNKED_UPLOAD_EXPIRE_HOURS = int(os.getenv('CHUNKED_UPLOAD_EXPIRE_HOURS', 24))
+
+    # 买家批量导入商品：每批 INSERT 行数、单次导入最多行数
+    PRODUCT_IMPORT_BATCH_SIZE = int(os.getenv('PRODUCT_IMPORT_BATCH_SIZE', 500))
+    PRODUCT_IMPORT_MAX_ROWS = int(os.getenv('PRODUCT_IMPORT_MAX_ROWS', 5000))
+
+    # 购物圈/代购圈列表游标分页：每页默认/最大条数
+    FEED_PAGE_SIZE = 20
+    FEED_MAX_PAGE_SIZE = 100
+
+    # 行程匹配：代购行程视为从出发时间起持续 N 天；按 N 秒间隔从数据库重建索引（0 表示不重建，多 worker 部署时默认 30 秒）
+    MATCHING_TRIP_DAYS = int(os.getenv('MATCHING_TRIP_DAYS', 7))
+    MATCHING_RELOAD_SECONDS = int(os.getenv('MATCHING_RELOAD_SECONDS', 0))
+
+    # 列表页批量加载：单条 IN (...) 查询最多携带的 id 数（SQLite 参数个数有上限）
+    BATCH_LOADER_CHUNK_SIZE = int(os.getenv('BATCH_LOADER_CHUNK_SIZE', 500))
+
+    # Prometheus 指标（/metrics，每个 worker 各自导出）：需携带 Authorization: Bearer <METRICS_TOKEN>；
+    # 未设置 METRICS_TOKEN 时仅调试模式可访问，其他环境返回 404
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+    # 管理员用户名（逗号分隔），可访问 /ops/* 运维诊断接口
+    ADMIN_USERNAMES = os.getenv('ADMIN_USERNAMES', '')
+
+    # 请求级 SQL 统计（X-DB-Queries / X-DB-Time 响应头 + /ops/queries 报告）：
+    # 同一语句单个请求内执行 >= N 次视为疑似 N+1；查询条数或数据库耗时超限的请求进入最差请求缓冲区
+    QUERY_STATS_ENABLED = os.getenv('QUERY_STATS_ENABLED', '0') == '1'
+    QUERY_STATS_HEADERS = os.getenv('QUERY_STATS_HEADERS', '1') == '1'
+    QUERY_STATS_N_PLUS_ONE = int(os.getenv('QUERY_STATS_N_PLUS_ONE', 10))
+    QUERY_STATS_MAX_QUERIES = int(os.getenv('QUERY_STATS_MAX_QUERIES', 30))
+    QUERY_STATS_MAX_DB_MS = float(os.getenv('QUERY_STATS_MAX_DB_MS', 200))
+    QUERY_STATS_RING_SIZE = int(os.getenv('QUERY_STATS_RING_SIZE', 50))
+
+    # 慢查询日志（JSON Lines，每种语句形状首次变慢时附带执行计划；`flask slow-queries` 汇总）
+    SLOW_QUERY_LOG_ENABLED = os.getenv('SLOW_QUERY_LOG_ENABLED', '0') == '1'
+    SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 100))
+    SLOW_QUERY_LOG_PATH = os.getenv('SLOW_QUERY_LOG_PATH', os.path.join(BASE_DIR, 'logs', 'slow_queries.jsonl'))
+    SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv('SLOW_QUERY_LOG_MAX_BYTES', 50 * 1024 * 1024))
+    SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', '1') == '1'
+
+    # 页面片段缓存（购物圈/代购圈卡片）：进程内 LRU 条数上限；配置 Redis 地址后启用共享的二级缓存
+    FRAGMENT_CACHE_ENABLED = os.getenv('FRAGMENT_CACHE_ENABLED', '1') == '1'
+    FRAGMENT_CACHE_MAX_ENTRIES = int(os.getenv('FRAGMENT_CACHE_MAX_ENTRIES', 2000))
+    FRAGMENT_CACHE_REDIS_URL = os.getenv('FRAGMENT_CACHE_REDIS_URL', '')
+    FRAGMENT_CACHE_REDIS_TTL = int(os.getenv('FRAGMENT_CACHE_REDIS_TTL', 3600))
+
+    # 聊天历史分页配置（按消息id游标分页，每页默认/最大条数）
+    CHAT_HISTORY_PAGE_SIZE = 50
+    CHAT_HISTORY_MAX_PAGE_SIZE = 200
+
+    # 聊天消息写后缓冲：后台协程每 N 毫秒或每 M 条批量写入一次；设为 0 退回同步写入（多 worker 部署时总是同步写入）
+    CHAT_WRITE_BEHIND = os.getenv('CHAT_WRITE_BEHIND', '1') == '1'
+    CHAT_FLUSH_INTERVAL_MS = int(os.getenv('CHAT_FLUSH_INTERVAL_MS', 200))
+    CHAT_FLUSH_BATCH_SIZE = int(os.getenv('CHAT_FLUSH_BATCH_SIZE', 100))
+    # 同一批次连续写入失败 N 次后拆分定位并丢弃无法写入的消息
+    CHAT_FLUSH_MAX_RETRIES = int(os.getenv('CHAT_FLUSH_MAX_RETRIES', 3))
+
+    # 聊天热点房间缓存：每房间缓存最近 N 条消息，全部房间合计不超过内存上限（LRU 淘汰）
+    CHAT_RECENT_CACHE_ENABLED = os.getenv('CHAT_RECENT_CACHE_ENABLED', '1') == '1'
+    CHAT_RECENT_CACHE_PER_ROOM = int(os.getenv('CHAT_RECENT_CACHE_PER_ROOM', 100))
+    CHAT_RECENT_CACHE_MAX_BYTES = int(os.getenv('CHAT_RECENT_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+    # 聊天房间成员（鉴权）缓存有效期（秒），多进程部署时其他 worker 的绑定变更最迟在此时间后生效
+    CHAT_ROOM_AUTH_TTL = int(os.getenv('CHAT_ROOM_AUTH_TTL', 300))
+    # 聊天房间成员缓存最多缓存的房间数（LRU 淘汰）
+    CHAT_ROOM_AUTH_MAX_ROOMS = int(os.getenv('CHAT_ROOM_AUTH_MAX_ROOMS', 10000))
+    # 未读计数合并窗口（毫秒）：窗口内同一用户同一房间的多次变更合并为一次数据库写入
+    CHAT_UNREAD_FLUSH_MS = int(os.getenv('CHAT_UNREAD_FLUSH_MS', 1000))
+
+    # 聊天归档：早于 N 天或所属绑定已删除的消息压缩归档，每块最多 M 条
+    CHAT_ARCHIVE_AFTER_DAYS = int(os.getenv('CHAT_ARCHIVE_AFTER_DAYS', 90))
+    CHAT_ARCHIVE_CHUNK_SIZE = int(os.getenv('CHAT_ARCHIVE_CHUNK_SIZE', 500))
+
+    # Socket.IO 多进程部署：消息队列（redis://... 跨进程共享房间广播；local:// 仅进程内，用于测试）
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE', '')
+    SOCKETIO_CHANNEL = os.getenv('SOCKETIO_CHANNEL', 'flask-socketio')
+    # worker 总数及当前 worker 编号（由 run_workers.py 启动时注入）
+    SOCKETIO_WORKERS = int(os.getenv('SOCKETIO_WORKERS', 1))
+    SOCKETIO_WORKER_ID = int(os.getenv('SOCKETIO_WORKER_ID', 0))
 
     # 短信配置（阿里云）
     ALIYUN_ACCESS_KEY_ID = os.getenv('ALIYUN_ACCESS_KEY_ID', '')
@@ -28,6 +118,8 @@ class Config:
 # 开发环境配置（可扩展生产/测试环境）
 class DevelopmentConfig(Config):
     DEBUG = True
+    # 开发环境默认开启 SQL 统计
+    QUERY_STATS_ENABLED = os.getenv('QUERY_STATS_ENABLED', '1') == '1'
 
 
 # 生产环境配置（示例）
@@ -36,9 +128,21 @@ class ProductionConfig(Config):
     # 生产环境建议使用更复杂的SECRET_KEY，通过环境变量传入
 
 
+# 测试环境配置（tests/ 下的用例使用；数据库、上传目录由测试夹具替换为临时路径）
+class TestingConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    # 进程内缓存跨用例共享，关闭以免读到上一个用例数据库的数据
+    FRAGMENT_CACHE_ENABLED = False
+    CHAT_RECENT_CACHE_ENABLED = False
+    CHAT_WRITE_BEHIND = False
+    SOCKETIO_MESSAGE_QUEUE = ''
+
+
 # 配置映射（便于切换环境）
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
+    'testing': TestingConfig,
     'default': DevelopmentConfig
 }
\ No newline at end of file
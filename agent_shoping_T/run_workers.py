@@ -0,0 +1,123 @@
+"""
+多进程启动器：启动 N 个 Socket.IO worker，并在前面挂一个按客户端IP粘滞（sticky session）的 TCP 代理
+
+Socket.IO 的 HTTP 长轮询要求同一客户端的请求始终落到同一个 worker，
+这里按客户端IP做哈希（与 nginx 的 ip_hash 等价）；房间广播通过消息队列在 worker 之间同步。
+
+用法：
+    SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0 python run_workers.py --workers 4 --port 5000
+
+前面已有 nginx 等负载均衡时可加 --no-proxy，只启动 worker（监听 base-port 起的连续端口），
+由 nginx 以 ip_hash 方式转发。
+"""
+import eventlet
+
+eventlet.monkey_patch()
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import zlib
+
+from app.utils.socket_queue import is_shared_queue
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+logger = logging.getLogger('run_workers')
+
+
+def pick_worker(client_ip, worker_ports):
+    """按客户端IP哈希选择 worker（同一IP始终落在同一个 worker 上）"""
+    return worker_ports[zlib.crc32(client_ip.encode()) % len(worker_ports)]
+
+
+def pipe(src, dst):
+    """单向转发数据，源端关闭后半关闭目标端的写方向"""
+    try:
+        while True:
+            data = src.recv(65536)
+            if not data:
+                break
+            dst.sendall(data)
+    except OSError:
+        pass
+    finally:
+        try:
+            dst.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+
+def handle_client(client, address, worker_ports):
+    try:
+        upstream = eventlet.connect(('127.0.0.1', pick_worker(address[0], worker_ports)))
+    except OSError as e:
+        logger.warning('连接 worker 失败：%s', e)
+        client.close()
+        return
+
+    writer = eventlet.spawn(pipe, client, upstream)
+    pipe(upstream, client)
+    writer.wait()
+    upstream.close()
+    client.close()
+
+
+def start_workers(count, base_port):
+    processes = []
+    for worker_id in range(count):
+        env = dict(
+            os.environ,
+            HOST='127.0.0.1',
+            PORT=str(base_port + worker_id),
+            SOCKETIO_WORKERS=str(count),
+            SOCKETIO_WORKER_ID=str(worker_id)
+        )
+        processes.append(subprocess.Popen([sys.executable, 'run.py'], cwd=BASE_DIR, env=env))
+        logger.info('worker %d 已启动，端口 %d', worker_id, base_port + worker_id)
+    return processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多进程启动 Socket.IO 聊天服务')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='worker 进程数')
+    parser.add_argument('--host', default='0.0.0.0', help='对外监听地址')
+    parser.add_argument('--port', type=int, default=5000, help='对外监听端口（粘滞代理）')
+    parser.add_argument('--base-port', type=int, default=5101, help='worker 起始端口')
+    parser.add_argument('--no-proxy', action='store_true', help='不启动内置粘滞代理（由 nginx 等负责）')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    if args.workers > 1 and not is_shared_queue(os.getenv('SOCKETIO_MESSAGE_QUEUE', '')):
+        sys.exit('多进程部署需要设置可跨进程的 SOCKETIO_MESSAGE_QUEUE（如 redis://localhost:6379/0）')
+
+    worker_ports = [args.base_port + i for i in range(args.workers)]
+    processes = start_workers(args.workers, args.base_port)
+
+    # SIGTERM 时正常退出，由 finally 通知各 worker 落库并退出
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        if args.no_proxy:
+            for process in processes:
+                process.wait()
+        else:
+            server = eventlet.listen((args.host, args.port))
+            logger.info('粘滞代理已启动：%s:%d -> %s', args.host, args.port, worker_ports)
+            while True:
+                client, address = server.accept()
+                eventlet.spawn_n(handle_client, client, address, worker_ports)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
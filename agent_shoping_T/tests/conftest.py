@@ -0,0 +1,28 @@
+"""测试夹具：每个用例使用独立的临时 SQLite 数据库和上传目录"""
+import pytest
+
+from config import TestingConfig
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """
+    创建测试应用；同一用例内多次调用共享同一个数据库（模拟多 worker）
+
+    关键字参数覆盖 TestingConfig 中的配置项（用例结束后自动还原）。
+    """
+    from app import create_app
+
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{tmp_path / "test.db"}')
+    monkeypatch.setattr(TestingConfig, 'UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+
+    def factory(**overrides):
+        for key, value in overrides.items():
+            monkeypatch.setattr(TestingConfig, key, value, raising=False)
+        return create_app('testing')
+    return factory
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
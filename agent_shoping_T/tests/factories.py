@@ -0,0 +1,52 @@
+"""测试数据构造"""
+from datetime import datetime, timedelta
+from itertools import count
+
+from app import db
+from app.models import User, Binding, AgentInfo, ShoppingCircle, ShoppingInfo
+from app.utils.demand_feed import refresh_buyer_feed
+
+_phones = count(13800000000)
+
+
+def create_user(username, is_agent):
+    user = User(username=username, phone=str(next(_phones)), is_agent=is_agent)
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+
+def create_binding(agent, buyer, status='confirmed'):
+    binding = Binding(agent_id=agent.id, buyer_id=buyer.id, status=status)
+    db.session.add(binding)
+    db.session.flush()
+    return binding
+
+
+def create_trip(agent, location='东京', days_ahead=7):
+    trip = AgentInfo(user_id=agent.id, location=location, itinerary='行程说明',
+                     time=datetime.now() + timedelta(days=days_ahead), is_submitted=True)
+    db.session.add(trip)
+    db.session.flush()
+    return trip
+
+
+def create_circle(buyer, product_count=2):
+    """买家提交购物圈（含商品），并同步维护购物圈物化表"""
+    products = [ShoppingInfo(user_id=buyer.id, serial_number=str(i + 1), product_name=f'{buyer.username}-商品{i + 1}',
+                             price_cents=100 * (i + 1)) for i in range(product_count)]
+    circle = ShoppingCircle(user_id=buyer.id, total_price_cents=sum(p.price_cents for p in products),
+                            item_count=product_count)
+    db.session.add_all(products + [circle])
+    db.session.flush()
+    refresh_buyer_feed([buyer.id])
+    return circle
+
+
+def login(app, user_id):
+    """返回已登录为该用户的测试客户端（直接写入 Flask-Login 的会话字段）"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
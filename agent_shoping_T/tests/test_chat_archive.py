@@ -0,0 +1,58 @@
+"""聊天归档：最新消息被归档后，新消息不会复用旧id；归档消息不再参与检索"""
+from datetime import datetime, timedelta
+
+from app import db
+from app.utils.chat_archive import archive_cold_messages, load_archived_since
+from app.utils.chat_writer import chat_writer
+from tests.factories import create_user, create_binding
+
+
+def _archive_all(app):
+    with app.app_context():
+        agent = create_user('agent', True)
+        buyer = create_user('buyer', False)
+        room_id = str(create_binding(agent, buyer).id)
+        db.session.commit()
+        sender_id = agent.id
+
+        old = datetime.now() - timedelta(days=100)
+        ids = [chat_writer.save(room_id, sender_id, 'agent', f'old {i}', old)['id'] for i in range(3)]
+        chat_writer.flush()
+        assert archive_cold_messages(older_than_days=90)['rows_moved'] == 3
+    return room_id, sender_id, ids
+
+
+def _assert_not_reused(app, room_id, sender_id, ids):
+    with app.app_context():
+        new_id = chat_writer.save(room_id, sender_id, 'agent', 'new', datetime.now())['id']
+        chat_writer.flush()
+        assert new_id > max(ids)
+        # 按 since_id 增量同步时归档中的旧消息与新消息不会混淆
+        assert [msg.id for msg in load_archived_since(room_id, 0)] == ids
+
+
+def test_sync_save_does_not_reuse_archived_ids(app):
+    room_id, sender_id, ids = _archive_all(app)
+    _assert_not_reused(app, room_id, sender_id, ids)
+
+
+def test_write_behind_does_not_reuse_archived_ids(make_app):
+    app = make_app(CHAT_WRITE_BEHIND=True)
+    room_id, sender_id, ids = _archive_all(app)
+    # 重启后按数据库重新取id起点
+    app = make_app(CHAT_WRITE_BEHIND=True)
+    _assert_not_reused(app, room_id, sender_id, ids)
+
+
+def test_archived_messages_leave_search_but_stay_in_history(app):
+    from app.utils.chat_search import search_messages
+
+    room_id, sender_id, ids = _archive_all(app)
+    with app.app_context():
+        chat_writer.save(room_id, sender_id, 'agent', 'new message', datetime.now())
+        chat_writer.flush()
+        assert [row['snippet'] for row in search_messages(db, sender_id, 'message')] == ['new <mark>message</mark>']
+        # FTS（>= 3 个字符）与 LIKE（短关键词）两条路径都只检索热表
+        assert search_messages(db, sender_id, 'old') == []
+        assert search_messages(db, sender_id, 'ol') == []
+        assert len(load_archived_since(room_id, 0)) == 3
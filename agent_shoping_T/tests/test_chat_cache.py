@@ -0,0 +1,26 @@
+"""聊天房间成员缓存：按 LRU 限制房间数"""
+from app import db
+from app.utils.chat_cache import RoomMembershipCache
+from tests.factories import create_user, create_binding
+
+
+def test_room_members_evicted_lru(make_app):
+    app = make_app(CHAT_ROOM_AUTH_MAX_ROOMS=2)
+    cache = RoomMembershipCache()
+    cache.init_app(app)
+    with app.app_context():
+        agent = create_user('agent', True)
+        rooms = [str(create_binding(agent, create_user(f'buyer{i}', False)).id) for i in range(3)]
+        db.session.commit()
+
+        assert cache.is_member(rooms[0], agent.id)
+        assert cache.is_member(rooms[1], agent.id)
+        cache.members(rooms[0])                 # rooms[0] 变为最近使用
+        assert cache.is_member(rooms[2], agent.id)
+
+        stats = cache.stats()
+        assert (stats['rooms'], stats['evictions'], stats['hits']) == (2, 1, 1)
+        cache.members(rooms[0])
+        assert cache.stats()['hits'] == 2       # 仍在缓存中；被淘汰的是 rooms[1]
+        cache.members(rooms[1])
+        assert cache.stats()['misses'] == 4
@@ -0,0 +1,104 @@
+"""聊天未读计数：清零只抵消已读位置之前的消息"""
+from datetime import datetime
+
+from app import db
+from app.utils.chat_unread import chat_unread, UnreadCounter
+from app.utils.chat_writer import chat_writer
+from tests.factories import create_user, create_binding
+
+
+def _setup(app):
+    with app.app_context():
+        agent = create_user('agent', True)
+        buyer = create_user('buyer', False)
+        binding = create_binding(agent, buyer)
+        db.session.commit()
+        return agent.id, buyer.id, str(binding.id)
+
+
+def _send(app, room_id, sender_id, recipient_id):
+    with app.app_context():
+        saved = chat_writer.save(room_id, sender_id, 'agent', 'hello', datetime.now())
+    chat_unread.bump(room_id, saved['id'], [recipient_id])
+    return saved['id']
+
+
+def _unread(app, user_id, room_id):
+    with app.app_context():
+        return chat_unread.unread_counts(user_id, [room_id])[room_id]
+
+
+def test_mark_read_keeps_unread_flushed_in_earlier_windows(app):
+    agent_id, buyer_id, room_id = _setup(app)
+    ids = [_send(app, room_id, agent_id, buyer_id) for _ in range(3)]
+    chat_unread.flush()
+    assert _unread(app, buyer_id, room_id) == 3
+
+    # 新窗口：又来一条，客户端只读到第 2 条 -> 第 3、4 条仍未读
+    ids.append(_send(app, room_id, agent_id, buyer_id))
+    chat_unread.mark_read(buyer_id, room_id, ids[1])
+    assert _unread(app, buyer_id, room_id) == 2
+    chat_unread.flush()
+    assert _unread(app, buyer_id, room_id) == 2
+
+    # 读到最新一条：清零
+    chat_unread.mark_read(buyer_id, room_id, ids[-1])
+    chat_unread.flush()
+    assert _unread(app, buyer_id, room_id) == 0
+
+
+def test_mark_read_covering_flushed_unread_counts_window_only(app):
+    agent_id, buyer_id, room_id = _setup(app)
+    ids = [_send(app, room_id, agent_id, buyer_id) for _ in range(2)]
+    chat_unread.flush()
+
+    later = [_send(app, room_id, agent_id, buyer_id) for _ in range(3)]
+    chat_unread.mark_read(buyer_id, room_id, later[0])
+    chat_unread.flush()
+    assert _unread(app, buyer_id, room_id) == 2
+
+    # 过期的已读回执不会把未读数算多
+    chat_unread.mark_read(buyer_id, room_id, ids[0])
+    chat_unread.flush()
+    assert _unread(app, buyer_id, room_id) == 2
+
+
+def test_late_bump_from_other_worker_does_not_outlive_read(make_app):
+    # 两个 worker 共用一个数据库，各自合并未读变更
+    app = make_app()
+    agent_id, buyer_id, room_id = _setup(app)
+    with app.app_context():
+        other_buyer = create_user('buyer2', False)
+        other_room = str(create_binding(db.session.get(type(other_buyer), agent_id), other_buyer).id)
+        db.session.commit()
+        other_buyer_id = other_buyer.id
+    other = UnreadCounter()
+    other.init_app(make_app(), None)
+
+    # worker A 持有第 1~3 条的 +1；worker B 先落库了读到第 2 条的清零
+    ids = [_send(app, room_id, agent_id, buyer_id) for _ in range(3)]
+    _send(app, other_room, agent_id, other_buyer_id)
+    other.mark_read(buyer_id, room_id, ids[1])
+    other.flush()
+    chat_unread.flush()
+    assert _unread(app, buyer_id, room_id) == 1
+    assert _unread(app, other_buyer_id, other_room) == 1
+
+    # 晚到的 +1 已全部被读过：不留下未读
+    late = _send(app, room_id, agent_id, buyer_id)
+    other.mark_read(buyer_id, room_id, late)
+    other.flush()
+    chat_unread.flush()
+    assert _unread(app, buyer_id, room_id) == 0
+
+
+def test_atexit_flush_registered_once(make_app, monkeypatch):
+    import atexit
+
+    registered = []
+    monkeypatch.setattr(atexit, 'register', registered.append)
+    counter = UnreadCounter()
+    for _ in range(3):
+        counter.init_app(make_app(), None)
+    # create_app 中全局实例的注册不计入
+    assert [func for func in registered if getattr(func, '__self__', None) is counter] == [counter.flush]
@@ -0,0 +1,120 @@
+"""多 worker 聊天：两个 Socket.IO 服务端经共享消息队列广播，消息在广播前已同步落库"""
+import queue
+import threading
+import uuid
+
+import pytest
+import socketio
+from flask_socketio import SocketIO
+from werkzeug.serving import make_server
+
+from app import db
+from app.models import ChatMessage
+from app.routes.chat_events import register_chat_events
+from app.utils.chat_writer import chat_writer
+from app.utils.socket_queue import LocalPubSubManager
+from tests.factories import create_user, create_binding
+
+
+class ChatClient:
+    """真实的 Socket.IO 客户端，按事件名收集服务端推送"""
+
+    def __init__(self, url, session_cookie):
+        self.events = {}
+        self.sio = socketio.Client()
+        for name in ('chat_message', 'chat_error', 'history_messages'):
+            self.events[name] = queue.Queue()
+            self.sio.on(name, self.events[name].put)
+        self.sio.connect(url, headers={'Cookie': f'session={session_cookie}'}, transports=['polling'])
+
+    def emit(self, event, data):
+        self.sio.emit(event, data)
+
+    def wait_for(self, event, count=1, timeout=5.0):
+        return [self.events[event].get(timeout=timeout) for _ in range(count)]
+
+
+@pytest.fixture
+def workers(make_app):
+    """启动两个 worker：各自的应用 + SocketIO 服务端 + HTTP 服务，经同一个 local:// 频道共享房间广播"""
+    channel = f'test-{uuid.uuid4().hex}'
+    started = []
+    for worker_id in range(2):
+        app = make_app(SOCKETIO_WORKERS=2, SOCKETIO_WORKER_ID=worker_id, CHAT_WRITE_BEHIND=True)
+        server = SocketIO(app, async_mode='threading', client_manager=LocalPubSubManager(channel=channel))
+        register_chat_events(server)
+        http = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=http.serve_forever, daemon=True).start()
+        started.append((app, f'http://127.0.0.1:{http.server_port}', http))
+    clients = []
+
+    def connect(worker_id, user_id):
+        app, url, _ = started[worker_id]
+        cookie = app.session_interface.get_signing_serializer(app).dumps({'_user_id': str(user_id), '_fresh': True})
+        client = ChatClient(url, cookie)
+        clients.append(client)
+        return client
+
+    yield started, connect
+    for client in clients:
+        client.sio.disconnect()
+    for _, _, http in started:
+        http.shutdown()
+
+
+def setup_room(app):
+    with app.app_context():
+        agent = create_user('agent', True)
+        buyer = create_user('buyer', False)
+        binding = create_binding(agent, buyer)
+        db.session.commit()
+        return agent.id, buyer.id, str(binding.id)
+
+
+def join(room_id, *clients):
+    for client in clients:
+        client.emit('join_chat', {'room_id': room_id})
+        # 每个客户端加入后房间内所有人都会收到一条欢迎消息
+        client.wait_for('chat_message')
+    clients[0].wait_for('chat_message', count=len(clients) - 1)
+
+
+def test_broadcast_reaches_client_on_other_worker(workers):
+    started, connect = workers
+    agent_id, buyer_id, room_id = setup_room(started[0][0])
+    agent = connect(0, agent_id)
+    buyer = connect(1, buyer_id)
+    join(room_id, agent, buyer)
+
+    agent.emit('send_message', {'room_id': room_id, 'content': 'hello from worker 0'})
+    [message] = buyer.wait_for('chat_message')
+    assert message['content'] == 'hello from worker 0'
+    assert message['sender_id'] == agent_id
+
+    # 广播时消息已提交
+    with started[1][0].app_context():
+        assert db.session.get(ChatMessage, message['id']).content == 'hello from worker 0'
+
+
+def test_multi_worker_ids_are_committed_in_order(workers):
+    started, connect = workers
+    assert chat_writer.stats()['mode'] == 'sync'
+    agent_id, buyer_id, room_id = setup_room(started[0][0])
+    agent = connect(0, agent_id)
+    buyer = connect(1, buyer_id)
+    join(room_id, agent, buyer)
+
+    # 两个 worker 交替发送，每条等广播回来再发下一条
+    ids = []
+    for i in range(6):
+        sender = agent if i % 2 == 0 else buyer
+        sender.emit('send_message', {'room_id': room_id, 'content': f'message {i}'})
+        [message] = buyer.wait_for('chat_message')
+        assert message['content'] == f'message {i}'
+        ids.append(message['id'])
+    assert ids == sorted(ids)
+
+    # 客户端见过的每个 id 都已落库：从第一条之前做增量同步能取回全部消息，不会跳过
+    buyer.emit('load_history', {'room_id': room_id, 'since_id': ids[0] - 1})
+    [history] = buyer.wait_for('history_messages')
+    assert [message['id'] for message in history['messages']] == ids
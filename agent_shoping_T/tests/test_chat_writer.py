@@ -0,0 +1,49 @@
+"""聊天消息写后缓冲：批量写入失败时的重试与坏数据隔离"""
+from datetime import datetime
+
+from app import db
+from app.models import ChatMessage
+from app.utils.chat_writer import chat_writer
+from tests.factories import create_user
+
+
+def test_bad_row_is_dropped_after_retries(make_app):
+    app = make_app(CHAT_WRITE_BEHIND=True, CHAT_FLUSH_MAX_RETRIES=2, CHAT_FLUSH_BATCH_SIZE=10)
+    with app.app_context():
+        sender = create_user('sender', False)
+        db.session.commit()
+        sender_id = sender.id
+
+    saved = [chat_writer.save('1', sender_id, 'sender', f'message {i}', datetime.now()) for i in range(5)]
+    # content 不可为空：这一条永远写不进去
+    saved[2]['content'] = None
+
+    # 重试次数内整批保留在队列中，仍对历史查询可见
+    for _ in range(2):
+        assert chat_writer.flush() == 0
+        assert len(chat_writer.pending_messages('1')) == 5
+
+    # 重试用尽：二分定位并丢弃坏行，其余照常写入
+    assert chat_writer.flush() == 4
+    assert chat_writer.pending_messages('1') == []
+    assert chat_writer.stats()['dropped_messages'] == 1
+    with app.app_context():
+        stored = [row.id for row in ChatMessage.query.order_by(ChatMessage.id)]
+    assert stored == [row['id'] for i, row in enumerate(saved) if i != 2]
+
+    # 队列恢复正常
+    chat_writer.save('1', sender_id, 'sender', 'after', datetime.now())
+    assert chat_writer.flush() == 1
+
+
+def test_atexit_flush_registered_once(make_app, monkeypatch):
+    import atexit
+    from app.utils.chat_writer import ChatWriteBehind
+
+    registered = []
+    monkeypatch.setattr(atexit, 'register', registered.append)
+    writer = ChatWriteBehind()
+    for _ in range(3):
+        writer.init_app(make_app(CHAT_WRITE_BEHIND=True), None)
+    # create_app 中全局实例的注册不计入
+    assert [func for func in registered if getattr(func, '__self__', None) is writer] == [writer.flush]
@@ -0,0 +1,31 @@
+"""分块上传：无效或他人的会话不会在进程内留下锁"""
+import io
+
+import pytest
+
+from app.utils.chunked_upload import chunked_uploads, UploadError
+
+
+@pytest.mark.parametrize('spell', [
+    lambda upload_id: 'not-a-uuid',
+    lambda upload_id: upload_id.upper(),
+    lambda upload_id: '{%s}' % upload_id,
+    lambda upload_id: 'urn:uuid:' + upload_id,
+])
+def test_invalid_session_does_not_leave_lock(app, spell):
+    # 同一会话的非规范写法（大写、花括号、urn 前缀）也按不存在处理
+    upload_id = spell(chunked_uploads.create(1, 'a.png', 10)['upload_id'])
+    with pytest.raises(UploadError) as exc:
+        chunked_uploads.append(upload_id, 1, 0, io.BytesIO(b'x'), 1)
+    assert exc.value.status == 404
+    assert upload_id not in chunked_uploads._locks
+
+
+def test_other_users_session_does_not_leave_lock(app):
+    upload_id = chunked_uploads.create(1, 'a.png', 10)['upload_id']
+    with pytest.raises(UploadError):
+        chunked_uploads.append(upload_id, 2, 0, io.BytesIO(b'x'), 1)
+    assert upload_id not in chunked_uploads._locks
+
+    chunked_uploads.append(upload_id, 1, 0, io.BytesIO(b'x'), 1)
+    assert chunked_uploads.status(upload_id, 1)['offset'] == 1
@@ -0,0 +1,28 @@
+"""购物圈物化表：只在建表时从源数据初始化，启动时不再因表为空而重建"""
+from app import db
+from app.models.shopping import OpenDemandFeed
+from tests.factories import create_user, create_circle
+
+
+def _feed_rows(app):
+    with app.app_context():
+        return OpenDemandFeed.query.count()
+
+
+def test_feed_initialized_only_when_table_created(make_app):
+    app = make_app()
+    with app.app_context():
+        create_circle(create_user('buyer', False))
+        db.session.commit()
+        OpenDemandFeed.query.delete()
+        db.session.commit()
+
+    # 表已存在：重启不重建（留给 flask demand-feed-rebuild）
+    make_app()
+    assert _feed_rows(app) == 0
+
+    # 表被删除（如旧结构升级）：重启时建表并初始化
+    with app.app_context():
+        OpenDemandFeed.__table__.drop(db.engine)
+    make_app()
+    assert _feed_rows(app) == 1
@@ -0,0 +1,38 @@
+"""商品图片引用计数：在数据库内原子加减"""
+from app import db
+from app.models.shopping import StoredImage
+from app.utils.image_store import image_store
+
+FILENAME = 'ab/' + 'ab' * 32 + '.png'
+
+
+def _ref_count(app):
+    with app.app_context():
+        image = StoredImage.query.filter_by(filename=FILENAME).first()
+        return image.ref_count if image else None
+
+
+def test_acquire_upserts_and_release_deletes_at_zero(make_app):
+    app = make_app()
+    other = make_app()
+    # 两个 worker 先后首次引用同一图片：第二次不撞唯一约束
+    with app.app_context():
+        image_store.acquire(FILENAME, 'ab' * 32, 10)
+        db.session.commit()
+    with other.app_context():
+        image_store.acquire(FILENAME, 'ab' * 32, 10)
+        db.session.commit()
+    assert _ref_count(app) == 2
+
+    with app.app_context():
+        assert image_store.release(FILENAME) is False
+        db.session.commit()
+    assert _ref_count(app) == 1
+    with other.app_context():
+        assert image_store.release(FILENAME) is True
+        db.session.commit()
+    assert _ref_count(app) is None
+
+    # 未入库的旧文件名视为唯一引用
+    with app.app_context():
+        assert image_store.release('legacy.jpg') is True
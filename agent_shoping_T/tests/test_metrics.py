@@ -0,0 +1,23 @@
+"""/metrics 访问控制"""
+
+
+def test_metrics_hidden_without_token(make_app):
+    app = make_app(METRICS_ENABLED=True, METRICS_TOKEN='')
+    assert app.test_client().get('/metrics').status_code == 404
+
+
+def test_metrics_requires_token(make_app):
+    app = make_app(METRICS_ENABLED=True, METRICS_TOKEN='secret')
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer sécret'}).status_code == 403
+
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert 'http_request_duration_seconds' in response.get_data(as_text=True)
+
+
+def test_metrics_open_in_debug_without_token(make_app):
+    app = make_app(METRICS_ENABLED=True, METRICS_TOKEN='', DEBUG=True)
+    assert app.test_client().get('/metrics').status_code == 200
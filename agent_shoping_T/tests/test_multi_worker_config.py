@@ -0,0 +1,66 @@
+"""多 worker 部署下依赖进程内状态的组件：没有共享存储时关闭或改用安全的默认值"""
+from app import db
+from app.utils.fragment_cache import fragment_cache
+from app.utils.matching import matching_index
+from tests.factories import create_user, create_trip, create_circle, login
+
+
+class RecordingRedis:
+    """记录调用的内存版 Redis（只实现片段缓存用到的命令）"""
+
+    def __init__(self):
+        self.calls = []
+        self.hashes = {}
+        self.values = {}
+
+    def hget(self, name, key):
+        self.calls.append('hget')
+        return self.hashes.get(name, {}).get(str(key))
+
+    def hmget(self, name, keys):
+        self.calls.append('hmget')
+        return [self.hashes.get(name, {}).get(str(key)) for key in keys]
+
+    def hincrby(self, name, key, amount):
+        self.calls.append('hincrby')
+        fields = self.hashes.setdefault(name, {})
+        fields[str(key)] = int(fields.get(str(key), 0)) + amount
+        return fields[str(key)]
+
+    def get(self, name):
+        self.calls.append('get')
+        return self.values.get(name)
+
+    def set(self, name, value, ex=None):
+        self.calls.append('set')
+        self.values[name] = value
+
+
+def test_fragment_cache_disabled_without_redis(make_app):
+    make_app(SOCKETIO_WORKERS=2, FRAGMENT_CACHE_ENABLED=True, FRAGMENT_CACHE_REDIS_URL='')
+    assert not fragment_cache.enabled
+
+
+def test_fragment_cache_fetches_page_versions_in_one_call(make_app):
+    app = make_app(FRAGMENT_CACHE_ENABLED=True)
+    fragment_cache._redis = redis = RecordingRedis()
+    with app.app_context():
+        agent = create_user('agent', True)
+        create_trip(agent)
+        for i in range(5):
+            create_circle(create_user(f'buyer{i}', False))
+        db.session.commit()
+        agent_id = agent.id
+
+    redis.calls.clear()
+    response = login(app, agent_id).get('/shopping/shopping-circle')
+    assert response.status_code == 200
+    assert redis.calls.count('hmget') == 1
+    assert redis.calls.count('hget') == 0
+
+
+def test_matching_index_reloads_in_multi_worker_mode(make_app):
+    make_app(SOCKETIO_WORKERS=2, MATCHING_RELOAD_SECONDS=0)
+    assert matching_index.reload_seconds > 0
+    make_app(SOCKETIO_WORKERS=1, MATCHING_RELOAD_SECONDS=0)
+    assert matching_index.reload_seconds == 0
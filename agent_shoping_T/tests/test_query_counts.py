@@ -0,0 +1,104 @@
+"""列表页查询次数与数据量无关"""
+import pytest
+from sqlalchemy import event
+
+from app import db
+from tests.factories import create_user, create_binding, create_trip, create_circle, login
+
+SIZES = (5, 50)
+
+
+def query_count(client, url):
+    """请求 url，返回期间执行的 SQL 条数"""
+    statements = []
+    with client.application.app_context():
+        engine = db.engine
+
+    def count_statement(*args):
+        statements.append(args[2])
+
+    event.listen(engine, 'before_cursor_execute', count_statement)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement)
+    assert response.status_code == 200
+    return len(statements)
+
+
+@pytest.fixture
+def agent_with_bindings(app):
+    """一个代购绑定 n 个买家（每个买家都有购物圈和商品）"""
+    def build(n):
+        with app.app_context():
+            agent = create_user('agent', True)
+            create_trip(agent)
+            buyers = []
+            for i in range(n):
+                buyer = create_user(f'buyer{i}', False)
+                create_circle(buyer)
+                create_binding(agent, buyer, status='confirmed' if i % 2 else 'pending')
+                buyers.append(buyer)
+            db.session.commit()
+            return agent.id, buyers[-1].id
+    return build
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_binding_list(app, agent_with_bindings, n):
+    agent_id, buyer_id = agent_with_bindings(n)
+    assert query_count(login(app, agent_id), '/binding/binding-list') == 3
+    assert query_count(login(app, buyer_id), '/binding/binding-list') == 3
+
+
+def test_binding_detail(app):
+    with app.app_context():
+        agent = create_user('agent', True)
+        buyer = create_user('buyer', False)
+        create_circle(buyer)
+        binding = create_binding(agent, buyer)
+        db.session.commit()
+        agent_id, buyer_id, binding_id = agent.id, buyer.id, binding.id
+    client = login(app, agent_id)
+    assert query_count(client, f'/binding/binding/detail/{buyer_id}') == 2
+    assert query_count(client, f'/binding/binding-detail/{binding_id}') == 2
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_contacted_trips(app, agent_with_bindings, n):
+    agent_id, _ = agent_with_bindings(n)
+    assert query_count(login(app, agent_id), '/agent/contacted_trips') == 6
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_purchased_products(app, agent_with_bindings, n):
+    agent_id, _ = agent_with_bindings(n)
+    assert query_count(login(app, agent_id), '/shopping/purchased_products') == 6
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_shopping_circle(app, n):
+    with app.app_context():
+        agent = create_user('agent', True)
+        create_trip(agent)
+        for i in range(n):
+            create_circle(create_user(f'buyer{i}', False))
+        db.session.commit()
+        agent_id = agent.id
+    client = login(app, agent_id)
+    assert query_count(client, '/shopping/shopping-circle') == 2
+    # 最新提交的购物圈在第一页
+    assert f'buyer{n - 1}' in client.get('/shopping/shopping-circle').get_data(as_text=True)
+
+
+@pytest.mark.parametrize('n', SIZES)
+def test_agent_circle(app, n):
+    with app.app_context():
+        buyer = create_user('buyer', False)
+        for i in range(n):
+            create_trip(create_user(f'agent{i}', True), location=f'城市{i}')
+        db.session.commit()
+        buyer_id = buyer.id
+    client = login(app, buyer_id)
+    assert query_count(client, '/agent/agent-circle') == 2
+    assert f'城市{n - 1}' in client.get('/agent/agent-circle').get_data(as_text=True)
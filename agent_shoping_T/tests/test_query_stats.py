@@ -0,0 +1,25 @@
+"""请求级 SQL 统计：执行失败的语句不在连接上残留计时"""
+import pytest
+from flask import g
+from sqlalchemy import text
+
+from app import db
+from app.utils.query_stats import QueryStats
+
+
+def test_failed_statement_leaves_no_timing_on_connection(make_app):
+    app = make_app()
+    stats = QueryStats()
+    app.config['QUERY_STATS_ENABLED'] = True
+    stats.init_app(app)
+
+    with app.test_request_context('/'):
+        stats._start_request()
+        for _ in range(3):
+            with pytest.raises(Exception):
+                db.session.execute(text('SELECT * FROM no_such_table'))
+            db.session.rollback()
+        db.session.execute(text('SELECT 1'))
+        connection = db.session.connection()
+        assert not [key for key in connection.info if 'started' in key]
+        assert g.query_stats.queries == 1
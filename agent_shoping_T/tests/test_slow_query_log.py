@@ -0,0 +1,31 @@
+"""慢查询日志：执行失败的语句不在连接上残留计时"""
+import json
+
+import pytest
+from sqlalchemy import text
+
+from app import db
+from app.utils.slow_query_log import SlowQueryLog
+
+
+def test_failed_statement_leaves_no_timing_on_connection(make_app, tmp_path):
+    app = make_app()
+    app.config.update(SLOW_QUERY_LOG_ENABLED=True, SLOW_QUERY_THRESHOLD_MS=0,
+                      SLOW_QUERY_LOG_PATH=str(tmp_path / 'slow.jsonl'))
+    slow_log = SlowQueryLog()
+    slow_log.init_app(app)
+    try:
+        with app.app_context():
+            with pytest.raises(Exception):
+                db.session.execute(text('SELECT * FROM no_such_table'))
+            db.session.rollback()
+            db.session.execute(text('SELECT 42'))
+            assert not [key for key in db.session.connection().info if 'started' in key]
+    finally:
+        # 引擎事件按 Engine 类注册、无法注销：用例结束后不再记录
+        slow_log.threshold_ms = float('inf')
+
+    with open(app.config['SLOW_QUERY_LOG_PATH'], encoding='utf-8') as f:
+        statements = [json.loads(line)['statement'] for line in f]
+    assert 'SELECT 42' in statements
+    assert not [statement for statement in statements if 'no_such_table' in statement]